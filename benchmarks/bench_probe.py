@@ -0,0 +1,81 @@
+"""Compare track probing throughput of the native parser and the backends.
+
+Usage::
+
+    python benchmarks/bench_probe.py [--repeat N] FILE_OR_DIR [...]
+
+Every engine probes each file ``--repeat`` times. Engines whose tools are
+not installed are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from core.config import AppConfig
+from core.tracks import query_tracks
+
+
+def collect(paths: list[str]) -> list[Path]:
+    files: list[Path] = []
+    for p in map(Path, paths):
+        if p.is_dir():
+            files.extend(sorted(p.rglob("*.mkv")))
+        else:
+            files.append(p)
+    return files
+
+
+def bench(files: list[Path], cfg: AppConfig, repeat: int) -> tuple[float, int]:
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        for f in files:
+            query_tracks(f, cfg)
+            count += 1
+    return time.perf_counter() - start, count
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    files = collect(args.paths)
+    if not files:
+        parser.error("no .mkv files found")
+
+    base = AppConfig()
+    engines = {
+        "native": (replace(base, probe_backend="native"), None),
+        "ffprobe": (replace(base, backend="ffmpeg"), base.ffprobe_cmd),
+        "mkvmerge": (replace(base, backend="mkvtoolnix"), base.mkvmerge_cmd),
+    }
+    print(f"{len(files)} files x {args.repeat} runs")
+    results = {}
+    for name, (cfg, tool) in engines.items():
+        if tool is not None and shutil.which(tool) is None:
+            print(f"{name:>9}: skipped ({tool} not found)")
+            continue
+        elapsed, count = bench(files, cfg, args.repeat)
+        results[name] = elapsed
+        print(
+            f"{name:>9}: {count / elapsed:10.1f} files/s"
+            f"  {elapsed / count * 1000:8.3f} ms/file"
+        )
+    if "native" in results:
+        for name, elapsed in results.items():
+            if name != "native":
+                print(f"native is {elapsed / results['native']:.1f}x faster than {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare remux throughput of the native remuxer, ffmpeg and mkvmerge.
+
+Usage::
+
+    python benchmarks/bench_remux.py [--drop audio|subtitles] [--out DIR] FILE_OR_DIR [...]
+
+Each file is remuxed once per backend with every track of the ``--drop``
+type removed except the first one. Throughput is reported as source bytes
+read per second, together with the bytes written. Backends whose tools are
+not installed are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import replace
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_probe import collect
+
+from core.config import AppConfig
+from core.remux import remux_file
+from core.tracks import build_cmd, query_tracks, run_command
+
+
+def select(tracks, drop: str):
+    seen = False
+    for t in tracks:
+        if t.type == drop:
+            t.removed = seen
+            seen = True
+    return tracks
+
+
+def bench(files, cfg: AppConfig, out_dir: Path, drop: str) -> tuple[float, int, int]:
+    read = written = 0
+    elapsed = 0.0
+    for f in files:
+        tracks = select(query_tracks(f, replace(cfg, probe_backend="native")), drop)
+        dst = out_dir / f.name
+        start = time.perf_counter()
+        if cfg.backend == "native":
+            remux_file(f, dst, tracks)
+        else:
+            run_command(build_cmd(f, dst, tracks, cfg), capture=False)
+        elapsed += time.perf_counter() - start
+        read += f.stat().st_size
+        written += dst.stat().st_size
+        dst.unlink()
+    return elapsed, read, written
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--drop", choices=["audio", "subtitles"], default="subtitles")
+    parser.add_argument("--out", help="scratch directory, ideally on the source disk")
+    args = parser.parse_args(argv)
+
+    files = collect(args.paths)
+    if not files:
+        parser.error("no .mkv files found")
+
+    base = AppConfig()
+    backends = {
+        "native": (replace(base, backend="native"), None),
+        "ffmpeg": (replace(base, backend="ffmpeg"), base.ffmpeg_cmd),
+        "mkvmerge": (replace(base, backend="mkvtoolnix"), base.mkvmerge_cmd),
+    }
+    total = sum(f.stat().st_size for f in files)
+    print(f"{len(files)} files, {total / 1e9:.2f} GB, dropping extra {args.drop} tracks")
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.out) as tmp:
+        for name, (cfg, tool) in backends.items():
+            if tool is not None and shutil.which(tool) is None:
+                print(f"{name:>9}: skipped ({tool} not found)")
+                continue
+            elapsed, read, written = bench(files, cfg, Path(tmp), args.drop)
+            results[name] = elapsed
+            print(
+                f"{name:>9}: {read / elapsed / 1e6:10.1f} MB/s read"
+                f"  {written / 1e9:8.2f} GB written  {elapsed:8.2f} s"
+            )
+    if "native" in results:
+        for name, elapsed in results.items():
+            if name != "native":
+                print(f"native is {elapsed / results['native']:.1f}x faster than {name}")
+
+
+if __name__ == "__main__":
+    main()
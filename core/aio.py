@@ -0,0 +1,406 @@
+"""Asyncio API for embedding MKV Cleaner in other applications.
+
+:class:`AsyncCleaner` probes, plans and cleans files from coroutines::
+
+    cleaner = AsyncCleaner(cfg, max_jobs=4)
+    tracks = await cleaner.probe(path)
+    entry = await cleaner.plan(path, "audio=jpn;subs=eng")
+    job = await cleaner.clean(path, "audio=jpn;subs=eng")
+    async for job in cleaner.clean_many(paths, "subs=none"):
+        print(job.source, job.state, job.error)
+
+Backends run with :func:`asyncio.create_subprocess_exec`; at most
+``max_jobs`` cleans and ``max_probes`` probes run at once, everything else
+waits on a semaphore, so thousands of queued files cost coroutines rather
+than threads. Short blocking steps (native header reads, probe cache
+lookups, in-place flag patches, clones, the native remuxer) run in the
+default executor.
+
+Cancelling a coroutine kills its backend process, waits for a step running
+in the executor to return and then removes the partial output;
+:meth:`AsyncCleaner.clean_many` cancels all of its pending files
+when it is cancelled or closed early. Failures do not raise: the returned
+:class:`~core.engine.Job` has ``state`` ``"failed"`` and an ``error``.
+
+The module level :func:`probe`, :func:`plan`, :func:`clean` and
+:func:`clean_many` use a cleaner for ``cfg`` with its default limits.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import os
+import subprocess
+import time
+from collections import deque
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable, List, Union
+
+from core.config import AppConfig
+from core.engine import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    RUNNING,
+    Job,
+    JobCancelled,
+    edit_flags,
+    job_checkpoint,
+    plan_job,
+    remove_partial_output,
+    skip_noop,
+)
+from core.matroska import MatroskaError, read_layout
+from core.noop import is_noop
+from core.plan import PlanEntry, entry_for
+from core.probe_cache import CACHE_ERRORS, cache_failed, usable_cache
+from core.progress import JobProgress, make_parser
+from core.remux import remux_file
+from core.replace import replace_original, temp_path
+from core.runner import READ_SIZE, STDERR_TAIL_LINES, LineBuffer
+from core.selection import TrackSpec, apply_spec, parse_spec
+from core.tracks import (
+    CommandNotFoundError,
+    Track,
+    build_cmd,
+    parse_probe,
+    probe_cache_key,
+    probe_command,
+    query_tracks,
+)
+
+logger = logging.getLogger("core.aio")
+
+# A selection: a spec string, a parsed spec or GUI style tracks matched by tid
+Selection = Union[str, TrackSpec, List[Track], None]
+
+# Files of clean_many started ahead of the running ones
+WINDOW_PER_JOB = 64
+
+
+async def run_command_async(
+    cmd: List[str],
+    capture: bool = False,
+    on_line: Callable[[str], None] | None = None,
+    tail_lines: int = STDERR_TAIL_LINES,
+) -> subprocess.CompletedProcess:
+    """Coroutine version of :func:`core.tracks.run_command`.
+
+    With ``capture`` stdout is returned in full; otherwise its lines are
+    passed to ``on_line`` and only a tail of stderr is kept. Raises
+    :class:`~core.tracks.CommandNotFoundError` or
+    ``subprocess.CalledProcessError`` like the synchronous version. The
+    process is killed if the coroutine is cancelled.
+    """
+    cmd = [str(c) for c in cmd]
+    logger.debug("Running: %s", " ".join(cmd))
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+    except FileNotFoundError as exc:
+        msg = f"{cmd[0]} not found on PATH"
+        logger.error(msg)
+        raise CommandNotFoundError(msg) from exc
+    out: list[str] = []
+    tail: deque[str] = deque(maxlen=tail_lines)
+    name = os.path.basename(cmd[0])
+
+    def err_line(line: str) -> None:
+        tail.append(line)
+        logger.debug("%s: %s", name, line)
+
+    async def pump(stream, buf: LineBuffer) -> None:
+        while chunk := await stream.read(READ_SIZE):
+            buf.feed(chunk)
+        buf.close()
+
+    try:
+        if capture:
+            stdout, stderr = await proc.communicate()
+            out.append(stdout.decode("utf-8", "replace"))
+            tail.extend(stderr.decode("utf-8", "replace").splitlines()[-tail_lines:])
+        else:
+            await asyncio.gather(
+                pump(proc.stdout, LineBuffer(on_line or (lambda line: None))),
+                pump(proc.stderr, LineBuffer(err_line)),
+            )
+        rc = await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    err = "\n".join(tail)
+    if rc:
+        logger.error("Command failed: %s\n%s", cmd, err)
+        raise subprocess.CalledProcessError(rc, cmd, "".join(out), err)
+    return subprocess.CompletedProcess(cmd, rc, "".join(out), err)
+
+
+async def _to_thread_to_end(job: Job, func, *args, **kwargs):
+    """Run ``func`` in the default executor and wait for it even if cancelled.
+
+    A thread cannot be stopped, so a cancelled caller asks the job to stop
+    (the native remuxer checks at every checkpoint) and waits for ``func``
+    to return before its cleanup touches the files ``func`` writes.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        job.cancel_requested = True
+        while not task.done():
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                break
+        raise
+
+
+class AsyncCleaner:
+    """Probe, plan and clean files with bounded concurrency.
+
+    ``cfg`` is used for every file; ``max_jobs`` and ``max_probes`` default
+    to its ``max_workers`` and ``probe_workers``.
+    """
+
+    def __init__(
+        self,
+        cfg: AppConfig | None = None,
+        max_jobs: int | None = None,
+        max_probes: int | None = None,
+    ):
+        self.cfg = cfg or AppConfig()
+        self.max_jobs = max(1, max_jobs or self.cfg.max_workers)
+        self._jobs = asyncio.Semaphore(self.max_jobs)
+        self._probes = asyncio.Semaphore(max(1, max_probes or self.cfg.probe_workers))
+
+    async def probe(self, path: str | Path) -> List[Track]:
+        """Return the tracks of ``path``, using the probe cache if configured."""
+        async with self._probes:
+            return await self._probe(Path(path))
+
+    async def _probe(self, source: Path) -> List[Track]:
+        cfg = self.cfg
+        if (cfg.probe_backend or cfg.backend) == "native":
+            # Only the header is read; the synchronous path handles the cache
+            # and the fallback to the external backend
+            return await asyncio.to_thread(query_tracks, source, cfg)
+        engine = "ffmpeg" if cfg.backend == "ffmpeg" else "mkvtoolnix"
+        cache = key = None
+        if cfg.probe_cache:
+            cache = await asyncio.to_thread(usable_cache, cfg.probe_cache, cfg.probe_cache_size)
+        if cache is not None:
+            try:
+                key = await asyncio.to_thread(probe_cache_key, source, cfg, engine)
+            except OSError:
+                cache = None
+        if cache is not None:
+            try:
+                tracks = await asyncio.to_thread(cache.get, key)
+            except CACHE_ERRORS as exc:
+                cache_failed(cfg.probe_cache, exc)
+                cache = None
+            else:
+                if tracks is not None:
+                    return tracks
+        result = await run_command_async(probe_command(source, cfg, engine), capture=True)
+        tracks = parse_probe(result.stdout, engine)
+        if cache is not None:
+            try:
+                await asyncio.to_thread(cache.put, key, tracks)
+            except CACHE_ERRORS as exc:
+                cache_failed(cfg.probe_cache, exc)
+        return tracks
+
+    def _job(self, path, wipe_all: bool) -> Job:
+        return Job(Path(path), [], wipe_all=wipe_all, config=self.cfg)
+
+    @staticmethod
+    def _select(job: Job, real_tracks: List[Track], selection: Selection) -> None:
+        """Set ``job.tracks`` from ``selection`` and the file's ``real_tracks``."""
+        if isinstance(selection, str):
+            selection = parse_spec(selection)
+        if selection is None:
+            job.tracks = copy.deepcopy(real_tracks)
+        elif isinstance(selection, TrackSpec):
+            job.tracks = apply_spec(copy.deepcopy(real_tracks), selection)
+        else:
+            job.tracks = list(selection)
+
+    async def plan(
+        self, path: str | Path, selection: Selection = None, wipe_all: bool = False
+    ) -> PlanEntry:
+        """Return what :meth:`clean` would do with ``path`` (see :mod:`core.plan`)."""
+        job = self._job(path, wipe_all)
+        real_tracks = await self.probe(job.source)
+        self._select(job, real_tracks, selection)
+        return await asyncio.to_thread(entry_for, job, real_tracks, self.cfg)
+
+    async def clean(
+        self,
+        path: str | Path,
+        selection: Selection = None,
+        wipe_all: bool = False,
+        on_progress: Callable[[Job], None] | None = None,
+    ) -> Job:
+        """Clean ``path`` keeping the tracks chosen by ``selection``.
+
+        ``selection`` is a spec string or :class:`~core.selection.TrackSpec`
+        applied to the file's tracks, or a list of tracks matched by ``tid``
+        like the GUI's groups; ``None`` keeps everything. ``on_progress``
+        is called with the job whenever the backend reports progress.
+        """
+        return await self._clean(self._job(path, wipe_all), selection, on_progress)
+
+    async def _clean(self, job: Job, selection: Selection, on_progress=None) -> Job:
+        async with self._jobs:
+            job.state = RUNNING
+            job.started = time.time()
+            try:
+                real_tracks = await self.probe(job.source)
+                self._select(job, real_tracks, selection)
+                tracks = plan_job(job, real_tracks, self.cfg.output_dir, self.cfg.replace_original)
+                await self._execute(job, tracks, on_progress)
+            except (asyncio.CancelledError, JobCancelled):
+                job.cancel_requested = True
+                job.state = CANCELLED
+                job.finished = time.time()
+                remove_partial_output(job)
+                raise
+            except Exception as exc:
+                logger.error("Job %s failed: %s", job.source, exc)
+                job.error = str(exc) or exc.__class__.__name__
+                job.state = FAILED
+                job.finished = time.time()
+                remove_partial_output(job)
+                return job
+            job.state = DONE
+            job.finished = time.time()
+            return job
+
+    async def _execute(self, job: Job, tracks: List[Track], on_progress) -> None:
+        cfg = self.cfg
+        dst = job.destination
+        stamp = await asyncio.to_thread(os.stat, job.source)
+        job.progress = JobProgress(total_bytes=stamp.st_size)
+        if cfg.noop_policy != "remux" and is_noop(tracks):
+            job.method = await _to_thread_to_end(job, skip_noop, job, dst, cfg.noop_policy)
+            return
+        if cfg.inplace_flags and await _to_thread_to_end(job, edit_flags, job, tracks, dst):
+            job.method = "flags"
+            return
+        out = temp_path(dst) if cfg.replace_original else dst
+        try:
+            if cfg.backend == "native":
+                job.method = "native"
+                checkpoint = job_checkpoint(job)
+                await _to_thread_to_end(
+                    job, remux_file, job.source, out, tracks, checkpoint=checkpoint
+                )
+            else:
+                job.method = "remux"
+                await self._run_backend(job, tracks, out, on_progress)
+            if cfg.replace_original:
+                await _to_thread_to_end(job, replace_original, dst, out, cfg.backup_hours > 0)
+        except BaseException:
+            job.cancel_requested = True
+            if out != dst:
+                out.unlink(missing_ok=True)
+            raise
+        job.progress.finish()
+
+    async def _run_backend(self, job: Job, tracks: List[Track], out: Path, on_progress) -> None:
+        cfg = self.cfg
+        try:
+            duration = (await asyncio.to_thread(read_layout, job.source)).duration
+        except (MatroskaError, OSError):
+            duration = None
+        parser = make_parser(cfg.backend, job.progress, duration)
+
+        def feed(line: str) -> None:
+            parser.feed(line)
+            if on_progress is not None:
+                on_progress(job)
+
+        cmd = build_cmd(
+            job.source, out, tracks, cfg, wipe_forced=False, wipe_all=job.wipe_all, progress=True
+        )
+        logger.info("Running: %s", " ".join(map(str, cmd)))
+        await run_command_async(cmd, on_line=feed)
+
+    async def clean_many(
+        self,
+        paths: Iterable,
+        selection: Selection = None,
+        wipe_all: bool = False,
+        window: int | None = None,
+    ) -> AsyncIterator[Job]:
+        """Clean ``paths`` and yield every job as it finishes.
+
+        Items of ``paths`` are paths or ``(path, selection)`` pairs. At most
+        ``window`` files (``WINDOW_PER_JOB`` times ``max_jobs`` by default)
+        are started ahead, so ``paths`` may be a long generator. Leaving the
+        loop early or cancelling it cancels the files still pending.
+        """
+        window = max(1, window or WINDOW_PER_JOB * self.max_jobs)
+        items = iter(paths)
+        pending: set[asyncio.Task] = set()
+
+        def fill() -> None:
+            while len(pending) < window:
+                item = next(items, None)
+                if item is None:
+                    return
+                path, sel = item if isinstance(item, tuple) else (item, selection)
+                job = self._job(path, wipe_all)
+                pending.add(asyncio.ensure_future(self._clean(job, sel)))
+
+        try:
+            fill()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                fill()
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def probe(path: str | Path, cfg: AppConfig | None = None) -> List[Track]:
+    """Return the tracks of ``path``."""
+    return await AsyncCleaner(cfg).probe(path)
+
+
+async def plan(
+    path: str | Path, selection: Selection = None, cfg: AppConfig | None = None, wipe_all=False
+) -> PlanEntry:
+    """Return what :func:`clean` would do with ``path``."""
+    return await AsyncCleaner(cfg).plan(path, selection, wipe_all)
+
+
+async def clean(
+    path: str | Path, selection: Selection = None, cfg: AppConfig | None = None, wipe_all=False
+) -> Job:
+    """Clean ``path``; see :meth:`AsyncCleaner.clean`."""
+    return await AsyncCleaner(cfg).clean(path, selection, wipe_all)
+
+
+async def clean_many(
+    paths: Iterable, selection: Selection = None, cfg: AppConfig | None = None, wipe_all=False
+) -> AsyncIterator[Job]:
+    """Clean ``paths`` yielding jobs as they finish; see :meth:`AsyncCleaner.clean_many`."""
+    async for job in AsyncCleaner(cfg).clean_many(paths, selection, wipe_all):
+        yield job
@@ -0,0 +1,184 @@
+"""Pick the number of concurrent jobs from measured throughput.
+
+:class:`ConcurrencyTuner` starts with few jobs, measures the aggregate
+bytes per second of the jobs finished at each concurrency level and climbs
+up or down one step at a time until more jobs stop paying off. The best
+level and the measured throughput per level are stored in a small JSON
+file so the next batch starts from the learned optimum.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("core.autotune")
+
+# Relative throughput change treated as noise
+TOLERANCE = 0.05
+# Minimum measurement window per concurrency level
+MIN_EPOCH_SECONDS = 2.0
+
+
+def load_history(path: Path | None) -> dict:
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_history(path: Path, data: dict) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class ConcurrencyTuner:
+    """Hill-climb the number of concurrent jobs between 1 and ``max_workers``.
+
+    The climb starts at the best level stored under ``key`` in
+    ``history_path`` (``key`` separates setups such as backends) or at
+    ``min_workers``. A level is measured once at least two jobs per
+    running slot finished and ``min_epoch_seconds`` passed; the tuner
+    settles when the next level gains less than :data:`TOLERANCE`.
+
+    Call :meth:`job_started` and :meth:`job_finished` from the workers;
+    the latter returns the new concurrency whenever the tuner changes it.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        history_path: str | Path | None = None,
+        key: str = "default",
+        min_workers: int = 1,
+        min_epoch_seconds: float = MIN_EPOCH_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.history_path = Path(history_path) if history_path else None
+        self.key = key
+        self.min_epoch_seconds = min_epoch_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        entry = load_history(self.history_path).get(key, {})
+        self.history: dict[int, float] = {
+            int(k): float(v) for k, v in entry.get("throughput", {}).items()
+        }
+        learned = entry.get("best")
+        self.concurrency = self._clamp(int(learned) if learned else self.min_workers)
+        self.settled = False
+        self._direction = 1
+        self._previous: tuple[int, float] | None = None
+        self._steps = 0  # levels measured in the current direction
+        self._reversed = False
+        self._epoch_start: float | None = None
+        self._epoch_bytes = 0
+        self._epoch_jobs = 0
+
+    def _clamp(self, value: int) -> int:
+        return max(self.min_workers, min(self.max_workers, value))
+
+    def reset_epoch(self) -> None:
+        """Start a new measurement, e.g. when a batch starts on an idle engine."""
+        with self._lock:
+            self._epoch_start = None
+            self._epoch_bytes = 0
+            self._epoch_jobs = 0
+
+    def job_started(self) -> None:
+        with self._lock:
+            if self._epoch_start is None:
+                self._epoch_start = self._clock()
+
+    def job_finished(self, size: int) -> int | None:
+        """Account a finished job of ``size`` source bytes.
+
+        Returns the new concurrency if it changed, otherwise ``None``.
+        """
+        with self._lock:
+            now = self._clock()
+            if self._epoch_start is None:
+                self._epoch_start = now
+            self._epoch_bytes += size
+            self._epoch_jobs += 1
+            elapsed = now - self._epoch_start
+            if self._epoch_jobs < 2 * self.concurrency or elapsed < self.min_epoch_seconds:
+                return None
+            rate = self._epoch_bytes / elapsed if elapsed > 0 else 0.0
+            self._epoch_start = now
+            self._epoch_bytes = 0
+            self._epoch_jobs = 0
+            old = self.concurrency
+            self._record(old, rate)
+            if not self.settled:
+                self._step(rate)
+            if self.concurrency != old:
+                logger.info(
+                    "Concurrency %d -> %d (%.1f MB/s)", old, self.concurrency, rate / 1e6
+                )
+                return self.concurrency
+            return None
+
+    def _record(self, level: int, rate: float) -> None:
+        prev = self.history.get(level)
+        # Smooth repeated measurements of the same level
+        self.history[level] = rate if prev is None else 0.5 * prev + 0.5 * rate
+
+    def _step(self, rate: float) -> None:
+        level = self.concurrency
+        prev = self._previous
+        if prev is None or rate > prev[1] * (1 + TOLERANCE):
+            self._previous = (level, rate)
+            self._steps += 1
+            target = self._clamp(level + self._direction)
+            if target == level:
+                self._settle(level)
+            else:
+                self.concurrency = target
+        elif rate < prev[1] * (1 - TOLERANCE):
+            # Worse than before. Past a peak the previous level is the best;
+            # if the very first step was worse, try the other direction once.
+            target = self._clamp(prev[0] - self._direction)
+            if self._steps > 1 or self._reversed or target == prev[0]:
+                self._settle(prev[0])
+                return
+            self._reversed = True
+            self._direction = -self._direction
+            self.concurrency = target
+        else:
+            # Plateau: fewer processes for the same throughput
+            self._settle(min(level, prev[0]))
+
+    def _settle(self, level: int) -> None:
+        self.concurrency = level
+        self.settled = True
+        self.save()
+
+    def save(self) -> None:
+        """Write the learned setting and the history to ``history_path``."""
+        if self.history_path is None:
+            return
+        data = load_history(self.history_path)
+        data[self.key] = {
+            "best": self.concurrency,
+            "throughput": {str(k): v for k, v in sorted(self.history.items())},
+            "updated": time.time(),
+        }
+        try:
+            save_history(self.history_path, data)
+        except OSError as exc:
+            logger.warning("Could not save tuning history %s: %s", self.history_path, exc)
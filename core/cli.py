@@ -0,0 +1,357 @@
+"""Headless batch processing: ``mkv-cleaner batch``.
+
+Only core modules are used, so batches run on machines without a display
+or PySide6. Sources are given as files, directories (searched for
+``*.mkv``) or a JSON Lines manifest, the tracks to keep as a selection
+spec (see :mod:`core.selection`)::
+
+    mkv-cleaner batch --tracks "audio=jpn;subs=eng;forced=eng" /media/anime
+    mkv-cleaner batch --manifest files.jsonl --jobs 4 > results.jsonl
+    mkv-cleaner batch --dry-run /media/anime > plan.jsonl
+    mkv-cleaner batch --plan plan.jsonl
+
+Every line of a manifest is a path string or an object with ``source`` and
+optionally its own ``tracks`` spec and ``wipe_all`` flag. Results are
+written as one JSON object per finished file followed by a ``summary``
+line; ``--dry-run`` writes the plan of :mod:`core.plan` instead. Logging
+goes to stderr. The exit status is 0 if every file succeeded, 1 if some
+failed and 2 for invalid arguments.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List
+
+from core.config import AppConfig, load_config, setup_logging, user_cache_dir
+from core.diskspace import DiskSpace
+from core.engine import DONE, Job, ProcessingEngine, execute_job, plan_job, probe_job
+from core.pipeline import Pipeline
+from core.scheduler import ORDERS, CostModel, DeviceScheduler
+from core.selection import TrackSpec, apply_spec, parse_spec
+from core.tracks import Track, query_tracks
+
+logger = logging.getLogger("core.cli")
+
+SOURCE_SUFFIXES = (".mkv",)
+
+
+def find_sources(paths: Iterable[str | Path], output_dir: str | Path = "") -> Iterator[Path]:
+    """Yield the files in ``paths``, searching directories recursively.
+
+    Directories receiving outputs for ``output_dir`` are not searched.
+    """
+    out = Path(output_dir) if output_dir else None
+
+    def is_output(d: Path) -> bool:
+        if out is None:
+            return False
+        if out.is_absolute():
+            return d.absolute() == out.absolute()
+        return d.parts[-len(out.parts):] == out.parts
+
+    for p in paths:
+        path = Path(p)
+        if not path.is_dir():
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not is_output(Path(root) / d))
+            for name in sorted(files):
+                if name.lower().endswith(SOURCE_SUFFIXES) and not name.startswith("."):
+                    yield Path(root) / name
+
+
+def read_manifest(fh: IO[str], spec: TrackSpec, wipe_all: bool) -> Iterator[tuple]:
+    """Yield ``(source, spec, wipe_all)`` for every line of a JSONL manifest."""
+    for number, line in enumerate(fh, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            if isinstance(item, str):
+                yield Path(item), spec, wipe_all
+                continue
+            item_spec = parse_spec(item["tracks"]) if "tracks" in item else spec
+            yield Path(item["source"]), item_spec, bool(item.get("wipe_all", wipe_all))
+        except (ValueError, KeyError, TypeError) as exc:
+            raise ValueError(f"Manifest line {number}: {exc}") from exc
+
+
+def job_result(job: Job) -> dict:
+    """Return the machine readable result of a finished job."""
+    seconds = None
+    if job.started is not None and job.finished is not None:
+        seconds = round(job.finished - job.started, 3)
+    return {
+        "source": str(job.source),
+        "destination": str(job.destination) if job.destination is not None else None,
+        "state": job.state,
+        "method": job.method,
+        "error": job.error,
+        "seconds": seconds,
+        "bytes_avoided": job.bytes_avoided,
+    }
+
+
+def _emit(out: IO[str], data: dict) -> None:
+    out.write(json.dumps(data) + "\n")
+    out.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mkv-cleaner batch",
+        description="Clean Matroska files without the GUI.",
+    )
+    parser.add_argument("inputs", nargs="*", help="files or directories to process")
+    parser.add_argument("--manifest", help="JSON Lines file with sources, - for stdin")
+    parser.add_argument(
+        "--tracks", default="", help="track selection spec, e.g. 'audio=jpn;subs=eng'"
+    )
+    parser.add_argument("--wipe-subs", action="store_true", help="remove all subtitles")
+    add_config_options(parser)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--dry-run", action="store_true", help="write the plan instead of running it"
+    )
+    mode.add_argument("--plan", help="run a plan written by --dry-run")
+    parser.add_argument("--results", help="write results to this file instead of stdout")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    return parser
+
+
+def add_config_options(parser: argparse.ArgumentParser) -> None:
+    """Add the options read by :func:`config_from_args` to ``parser``."""
+    parser.add_argument("--config", type=Path, help="JSON or TOML configuration file")
+    parser.add_argument("--backend", choices=("ffmpeg", "mkvtoolnix", "native"))
+    parser.add_argument("--output-dir", help="output directory, relative to each source")
+    parser.add_argument("--replace", action="store_true", help="replace the original files")
+    parser.add_argument("--jobs", type=int, help="files processed at once")
+    parser.add_argument("--device-jobs", type=int, help="files processed at once per device")
+    parser.add_argument("--probe-jobs", type=int, help="files probed at once")
+    parser.add_argument("--order", choices=ORDERS)
+    journal = parser.add_mutually_exclusive_group()
+    journal.add_argument("--journal", help="job journal used to skip finished files")
+    journal.add_argument("--no-journal", action="store_true", help="process finished files again")
+
+
+def config_from_args(args) -> AppConfig:
+    """Load the configuration and apply the options of :func:`add_config_options`."""
+    cfg = load_config(args.config) if args.config else AppConfig()
+    if args.backend:
+        cfg.backend = args.backend
+    if args.output_dir is not None:
+        cfg.output_dir = args.output_dir
+    if args.replace:
+        cfg.replace_original = True
+    if args.jobs:
+        cfg.max_workers = args.jobs
+    if args.device_jobs:
+        cfg.device_workers = args.device_jobs
+    if args.probe_jobs:
+        cfg.probe_workers = args.probe_jobs
+    if args.order:
+        cfg.job_order = args.order
+    if args.no_journal:
+        cfg.job_journal = ""
+    elif args.journal:
+        cfg.job_journal = args.journal
+    elif not cfg.job_journal:
+        cfg.job_journal = str(user_cache_dir() / "jobs.sqlite3")
+    return cfg
+
+
+def sources_from_args(args, cfg: AppConfig, spec: TrackSpec) -> Iterator[tuple]:
+    """Yield ``(source, spec, wipe_all)`` for the inputs and manifest of ``args``."""
+    output_dir = "" if cfg.replace_original else cfg.output_dir
+    for path in find_sources(args.inputs, output_dir):
+        yield path, spec, args.wipe_subs
+    if args.manifest == "-":
+        yield from read_manifest(sys.stdin, spec, args.wipe_subs)
+    elif args.manifest:
+        with open(args.manifest, encoding="utf-8") as fh:
+            yield from read_manifest(fh, spec, args.wipe_subs)
+
+
+class _Selector:
+    """Apply each job's spec to its probed tracks to get ``job.tracks``."""
+
+    def __init__(self):
+        self._specs: dict[int, TrackSpec] = {}
+
+    def jobs(self, sources: Iterable[tuple], cfg: AppConfig) -> Iterator[Job]:
+        for path, spec, wipe_all in sources:
+            job = Job(path, [], wipe_all=wipe_all, config=cfg)
+            self._specs[job.id] = spec
+            yield job
+
+    def __call__(self, job: Job, real_tracks: List[Track]) -> None:
+        job.tracks = apply_spec(copy.deepcopy(real_tracks), self._specs.pop(job.id))
+
+
+def make_scheduler(cfg: AppConfig) -> DeviceScheduler:
+    return DeviceScheduler(
+        cfg.device_workers,
+        cfg.device_limits,
+        cfg.output_dir,
+        cfg.job_order,
+        CostModel(cfg.job_costs or None),
+        DiskSpace(cfg.output_dir, cfg.disk_reserve << 20) if cfg.disk_check else None,
+    )
+
+
+def run_batch(args, cfg: AppConfig, out: IO[str]) -> int:
+    spec = parse_spec(args.tracks)
+    selector = _Selector()
+    probe = lambda src: query_tracks(src, cfg)  # noqa: E731
+    execute = execute_job
+    if cfg.job_journal:
+        from core.journal import open_journal
+
+        execute = open_journal(cfg.job_journal).wrap(execute_job)
+    engine = ProcessingEngine(execute, cfg.max_workers, make_scheduler(cfg))
+
+    def plan(job: Job, real_tracks: List[Track]) -> List[Track]:
+        selector(job, real_tracks)
+        return plan_job(job, real_tracks, cfg.output_dir, cfg.replace_original)
+
+    pipeline = Pipeline(
+        engine,
+        lambda job: probe_job(job, probe),
+        plan,
+        probe_workers=cfg.probe_workers,
+    )
+    dirs = set()
+
+    def finished(job: Job) -> None:
+        dirs.add(Path(job.source).parent)
+        _emit(out, job_result(job))
+
+    started = time.monotonic()
+    try:
+        stats = pipeline.run(selector.jobs(sources_from_args(args, cfg, spec), cfg), finished)
+    except KeyboardInterrupt:
+        pipeline.cancel()
+        engine.wait(10)
+        return 130
+    finally:
+        engine.shutdown(wait=False)
+    if cfg.replace_original:
+        from core.replace import prune_backups
+
+        prune_backups(dirs, cfg.backup_hours * 3600)
+    if cfg.job_costs:
+        engine.scheduler.costs.save()
+    summary = {
+        "files": stats.total,
+        "done": stats.done,
+        "failed": stats.failed,
+        "cancelled": stats.cancelled,
+        "seconds": round(time.monotonic() - started, 3),
+    }
+    _emit(out, {"summary": summary})
+    return 1 if stats.failed or stats.cancelled else 0
+
+
+def run_dry(args, cfg: AppConfig, out: IO[str]) -> int:
+    from core.plan import make_plan, summarize, write_plan
+
+    selector = _Selector()
+    jobs = selector.jobs(sources_from_args(args, cfg, parse_spec(args.tracks)), cfg)
+    entries = make_plan(jobs, cfg, cfg.probe_workers, select=selector)
+    write_plan(entries, out)
+    summary = summarize(entries)
+    _emit(out, {"summary": summary})
+    return 1 if summary["errors"] or summary["collisions"] else 0
+
+
+def run_plan(args, cfg: AppConfig, out: IO[str]) -> int:
+    from core.plan import execute_plan_job, plan_to_jobs, read_plan
+
+    with open(args.plan, encoding="utf-8") as fh:
+        entries = read_plan(fh)
+    failed = 0
+    for e in entries:
+        if not e.ok:
+            failed += 1
+            _emit(out, {"source": e.source, "state": "failed", "error": e.error or e.collision})
+    engine = ProcessingEngine(execute_plan_job, cfg.max_workers, make_scheduler(cfg))
+    jobs = engine.submit(plan_to_jobs(entries, cfg))
+    try:
+        while not engine.wait(0.5):
+            for job in engine.clear_finished():
+                _emit(out, job_result(job))
+    except KeyboardInterrupt:
+        engine.cancel_all()
+        engine.wait(10)
+        return 130
+    finally:
+        engine.shutdown(wait=False)
+    for job in engine.clear_finished():
+        _emit(out, job_result(job))
+    done = sum(job.state == DONE for job in jobs)
+    failed += len(jobs) - done
+    _emit(out, {"summary": {"files": len(entries), "done": done, "failed": failed}})
+    return 1 if failed else 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    """Run ``mkv-cleaner batch`` with ``argv`` and return the exit status."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    levels = (logging.WARNING, logging.INFO, logging.DEBUG)
+    setup_logging(levels[min(args.verbose, 2)])
+    if not (args.inputs or args.manifest or args.plan):
+        parser.error("no inputs given")
+    try:
+        parse_spec(args.tracks)
+        cfg = config_from_args(args)
+    except (ValueError, OSError) as exc:
+        parser.error(str(exc))
+    out = open(args.results, "w", encoding="utf-8") if args.results else sys.stdout
+    try:
+        if args.plan:
+            return run_plan(args, cfg, out)
+        if args.dry_run:
+            return run_dry(args, cfg, out)
+        return run_batch(args, cfg, out)
+    except (ValueError, OSError) as exc:
+        logger.error("%s", exc)
+        return 2
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def launch() -> None:
+    """Console script: ``mkv-cleaner batch|serve|worker|engine-host ...`` run
+    headless, anything else opens the GUI."""
+    if sys.argv[1:2] == ["batch"]:
+        sys.exit(main(sys.argv[2:]))
+    if sys.argv[1:2] == ["serve"]:
+        from core.service import main as serve_main
+
+        sys.exit(serve_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["worker"]:
+        from core.worker import main as worker_main
+
+        sys.exit(worker_main(sys.argv[2:]))
+    if sys.argv[1:2] == ["engine-host"]:
+        from core.enginehost import main as host_main
+
+        sys.exit(host_main(sys.argv[2:]))
+    from mkv_cleaner import main as gui_main
+
+    gui_main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
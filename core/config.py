@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import json
 import os
 import sys
@@ -36,17 +36,45 @@ else:
     FFMPEG = f"ffmpeg{EXT}"
     FFPROBE = f"ffprobe{EXT}"
 
+def user_cache_dir() -> Path:
+    """Return the per-user cache directory of the application."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "mkv-cleaner"
+
 @dataclass
 class AppConfig:
     """Application configuration."""
 
-    backend: str = "ffmpeg"  # or "mkvtoolnix"
+    backend: str = "ffmpeg"  # or "mkvtoolnix" or "native"
+    probe_backend: str = ""  # empty to follow ``backend`` or "native"
     mkvmerge_cmd: str = MKVMERGE
     mkvextract_cmd: str = MKVEXTRACT
     ffmpeg_cmd: str = FFMPEG
     ffprobe_cmd: str = FFPROBE
     output_dir: str = "cleaned"
-    max_workers: int = 4
+    inplace_flags: bool = True  # patch flag-only jobs instead of remuxing
+    noop_policy: str = "reflink"  # unchanged files: reflink, hardlink, copy, skip, remux
+    replace_original: bool = False  # write over the source instead of output_dir
+    backup_hours: float = 24.0  # keep replaced originals this long, 0 for none
+    job_journal: str = ""  # SQLite journal used to skip finished jobs, empty disables
+    probe_cache: str = ""  # SQLite file for cached probe results, empty disables
+    probe_cache_size: int = 100_000
+    engine_process: bool = False  # GUI jobs run in a separate, longer lived process
+    max_workers: int = 8  # jobs running at once over all devices
+    autotune: bool = False  # find the best number of jobs up to max_workers
+    autotune_history: str = ""  # JSON file with learned settings, empty to forget
+    device_workers: int = 2  # jobs per block device
+    device_limits: dict[str, int] = field(default_factory=dict)  # path -> jobs
+    job_order: str = "largest"  # or "fifo", "smallest", "mixed"
+    job_costs: str = ""  # JSON file with learned per-byte costs, empty to forget
+    disk_check: bool = True  # hold back jobs whose output does not fit
+    disk_reserve: int = 1024  # MiB left free on every destination device
+    probe_workers: int = 8
     track_font_size: int = 16
     preview_font_size: int = 16
 
@@ -0,0 +1,185 @@
+"""Only start jobs whose output fits on the destination device.
+
+Before a job starts, its output size is estimated and checked against the
+free space of the device it writes to, minus what running jobs on that
+device still have to write and a safety reserve. Jobs that do not fit yet
+wait until running jobs finish; a job that would not fit even on an
+otherwise idle device is rejected instead of failing with ``ENOSPC`` after
+hours of work.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+
+from core.inplace import is_flag_only
+from core.noop import is_noop
+from core.replace import temp_path
+from core.scheduler import device_of, source_size
+
+logger = logging.getLogger("core.diskspace")
+
+# Space left untouched on every destination device
+DEFAULT_RESERVE = 1 << 30
+# Outputs can be a little larger than their source (new cues, seek heads)
+OUTPUT_OVERHEAD = 0.01
+OUTPUT_SLACK = 1 << 20
+
+# Results of DiskSpace.check
+FITS = "fits"
+WAIT = "wait"
+NEVER = "never"
+
+
+def free_space(path: Path) -> int:
+    """Return bytes available to unprivileged users on the device of ``path``.
+
+    ``path`` or its nearest existing parent is queried (``statvfs`` on
+    POSIX systems).
+    """
+    path = Path(path)
+    for p in (path, *path.parents):
+        try:
+            return shutil.disk_usage(p).free
+        except FileNotFoundError:
+            continue
+    raise FileNotFoundError(path)
+
+
+def _format_size(size: int) -> str:
+    return f"{size / 1e9:.1f} GB"
+
+
+class DiskSpace:
+    """Reservations of destination space for the jobs of a scheduler.
+
+    ``output_dir`` is used for jobs without their own configuration;
+    ``reserve`` bytes are kept free on every device.
+    """
+
+    def __init__(self, output_dir: str | Path | None = None, reserve: int = DEFAULT_RESERVE):
+        self.output_dir = output_dir
+        self.reserve = max(0, reserve)
+        self._reserved: dict[int, tuple] = {}  # job id -> (device, path, bytes)
+        self._measured: dict[Path, tuple] | None = None  # directory -> (free, pending)
+
+    def destination(self, job) -> Path:
+        """Return the file ``job`` writes; the temp file when replacing."""
+        src = Path(job.source)
+        if job.config is not None and job.config.replace_original:
+            return temp_path(src)
+        if job.destination is not None:
+            return Path(job.destination)
+        out = job.config.output_dir if job.config is not None else self.output_dir
+        if not out:
+            return src
+        out = Path(out)
+        return (out if out.is_absolute() else src.parent / out) / src.name
+
+    def estimate(self, job) -> int:
+        """Return the bytes ``job`` is expected to write."""
+        dst = self.destination(job)
+        if dst == Path(job.source):
+            return 0  # no output directory, nothing is added
+        cfg = job.config
+        planned = job.planned_tracks
+        if planned is None and job.tracks and not job.wipe_all:
+            planned = job.tracks  # the selection, before probing
+        replace = cfg is not None and cfg.replace_original
+        inplace = cfg is not None and cfg.inplace_flags
+        if planned is not None and replace and inplace and is_flag_only(planned):
+            return 0  # the flags of the source are patched in place
+        policy = cfg.noop_policy if cfg is not None else "remux"
+        if job.planned_tracks is not None and policy in ("hardlink", "skip") and is_noop(
+            job.planned_tracks
+        ):
+            return 0
+        size = source_size(job)
+        return int(size * (1 + OUTPUT_OVERHEAD)) + OUTPUT_SLACK if size else 0
+
+    def pending(self, device) -> int:
+        """Bytes the running jobs on ``device`` have yet to write."""
+        total = 0
+        for dev, path, size in self._reserved.values():
+            if dev != device:
+                continue
+            try:
+                written = os.stat(path).st_size
+            except OSError:
+                written = 0
+            total += max(0, size - written)
+        return total
+
+    @contextmanager
+    def snapshot(self):
+        """Measure every destination directory only once inside the block.
+
+        A scheduler checks all of its queued jobs on every pick; the free
+        space does not need to be queried again for each of them.
+        """
+        self._measured = {}
+        try:
+            yield self
+        finally:
+            self._measured = None
+
+    def _measure(self, directory: Path) -> tuple[int, int] | None:
+        """Return ``(free, pending)`` bytes for ``directory``, ``None`` if unknown."""
+        if self._measured is not None and directory in self._measured:
+            return self._measured[directory]
+        try:
+            result = free_space(directory), self.pending(device_of(directory))
+        except OSError as exc:
+            logger.debug("Cannot check free space for %s: %s", directory, exc)
+            result = None
+        if self._measured is not None:
+            self._measured[directory] = result
+        return result
+
+    def check(self, job) -> str:
+        """Return :data:`FITS`, :data:`WAIT` or :data:`NEVER` for ``job``."""
+        need = self.estimate(job)
+        if not need:
+            return FITS
+        measured = self._measure(self.destination(job).parent)
+        if measured is None:
+            return FITS
+        free, pending = measured
+        if need + pending + self.reserve <= free:
+            return FITS
+        return WAIT if pending else NEVER
+
+    def rejection(self, job) -> str:
+        """Return the error message for a job that :meth:`check` said can never fit."""
+        dst = self.destination(job)
+        try:
+            free = _format_size(free_space(dst.parent))
+        except OSError:
+            free = "unknown"
+        return (
+            f"Not enough space for {dst.name}: needs about "
+            f"{_format_size(self.estimate(job) + self.reserve)}, {free} free"
+        )
+
+    def admit(self, job) -> bool:
+        """Return ``True`` if ``job`` may be picked now.
+
+        Jobs that can never fit are admitted too, with ``job.rejected`` set
+        so the engine fails them instead of running them.
+        """
+        verdict = self.check(job)
+        job.rejected = self.rejection(job) if verdict == NEVER else ""
+        return verdict != WAIT
+
+    def reserve_for(self, job) -> None:
+        need = self.estimate(job)
+        if need:
+            dst = self.destination(job)
+            self._reserved[job.id] = (device_of(dst.parent), dst, need)
+
+    def release(self, job) -> None:
+        self._reserved.pop(job.id, None)
@@ -0,0 +1,171 @@
+"""Minimal EBML reader and writer used by the native Matroska helpers."""
+
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from typing import Iterator
+
+# Size value reported for elements whose length is not known in advance
+UNKNOWN_SIZE = -1
+
+
+class EBMLError(ValueError):
+    """Raised when data is not well-formed EBML."""
+
+
+@dataclass
+class Element:
+    """Location of a single EBML element inside a buffer."""
+
+    id: int
+    offset: int       # position of the first ID byte
+    header_size: int  # length of ID + size fields
+    size: int         # payload length or ``UNKNOWN_SIZE``
+
+    @property
+    def data_start(self) -> int:
+        return self.offset + self.header_size
+
+    @property
+    def end(self) -> int | None:
+        """Position right after the payload or ``None`` for unknown sizes."""
+        if self.size == UNKNOWN_SIZE:
+            return None
+        return self.data_start + self.size
+
+
+def read_vint(buf, pos: int) -> tuple[int, int]:
+    """Decode the variable size integer at ``pos``.
+
+    Returns ``(value, length)`` with the length marker removed. A value with
+    all data bits set is reported as :data:`UNKNOWN_SIZE`.
+    """
+    if pos >= len(buf):
+        raise EBMLError(f"Unexpected end of data at offset {pos}")
+    first = buf[pos]
+    if first == 0:
+        raise EBMLError(f"Invalid variable size integer at offset {pos}")
+    length = 9 - first.bit_length()
+    if pos + length > len(buf):
+        raise EBMLError(f"Truncated variable size integer at offset {pos}")
+    value = first & (0xFF >> length)
+    for b in buf[pos + 1:pos + length]:
+        value = (value << 8) | b
+    if value == (1 << (7 * length)) - 1:
+        return UNKNOWN_SIZE, length
+    return value, length
+
+
+def read_id(buf, pos: int) -> tuple[int, int]:
+    """Return ``(element_id, length)`` for the ID starting at ``pos``."""
+    if pos >= len(buf):
+        raise EBMLError(f"Unexpected end of data at offset {pos}")
+    length = 9 - buf[pos].bit_length()
+    if length > 4 or pos + length > len(buf):
+        raise EBMLError(f"Invalid element ID at offset {pos}")
+    return int.from_bytes(buf[pos:pos + length], "big"), length
+
+
+def read_element(buf, pos: int) -> Element:
+    """Read the element header at ``pos``."""
+    el_id, id_len = read_id(buf, pos)
+    size, size_len = read_vint(buf, pos + id_len)
+    return Element(el_id, pos, id_len + size_len, size)
+
+
+def iter_elements(buf, start: int, end: int | None = None) -> Iterator[Element]:
+    """Yield the elements stored between ``start`` and ``end``.
+
+    Iteration stops after an element of unknown size because its end can
+    only be found by parsing its children.
+    """
+    limit = len(buf) if end is None else min(end, len(buf))
+    pos = start
+    while pos < limit:
+        el = read_element(buf, pos)
+        yield el
+        if el.end is None:
+            return
+        pos = el.end
+
+
+def children(buf, parent: Element) -> Iterator[Element]:
+    """Yield the direct children of ``parent``."""
+    return iter_elements(buf, parent.data_start, parent.end)
+
+
+def read_uint(buf, el: Element) -> int:
+    return int.from_bytes(buf[el.data_start:el.end], "big")
+
+
+def read_float(buf, el: Element) -> float:
+    data = bytes(buf[el.data_start:el.end])
+    if el.size == 4:
+        return struct.unpack(">f", data)[0]
+    if el.size == 8:
+        return struct.unpack(">d", data)[0]
+    if el.size == 0:
+        return 0.0
+    raise EBMLError(f"Invalid float size {el.size} at offset {el.offset}")
+
+
+def read_string(buf, el: Element) -> str:
+    data = bytes(buf[el.data_start:el.end])
+    return data.split(b"\x00", 1)[0].decode("utf-8", errors="replace")
+
+
+def read_bytes(buf, el: Element) -> bytes:
+    return bytes(buf[el.data_start:el.end])
+
+
+def encode_vint(value: int, length: int | None = None) -> bytes:
+    """Encode ``value`` as a variable size integer.
+
+    ``length`` forces a specific width, otherwise the shortest is used.
+    """
+    if length is None:
+        length = 1
+        while value >= (1 << (7 * length)) - 1:
+            length += 1
+    if length > 8 or value >= (1 << (7 * length)) - 1:
+        raise EBMLError(f"Value {value} does not fit in {length} bytes")
+    return ((1 << (7 * length)) | value).to_bytes(length, "big")
+
+
+def encode_id(el_id: int) -> bytes:
+    return el_id.to_bytes((el_id.bit_length() + 7) // 8, "big")
+
+
+def element(el_id: int, payload: bytes, size_length: int | None = None) -> bytes:
+    """Serialize an element with ``payload`` as its data."""
+    return encode_id(el_id) + encode_vint(len(payload), size_length) + payload
+
+
+def uint_element(el_id: int, value: int, width: int | None = None) -> bytes:
+    if width is None:
+        width = max(1, (value.bit_length() + 7) // 8)
+    return element(el_id, value.to_bytes(width, "big"))
+
+
+def float_element(el_id: int, value: float) -> bytes:
+    return element(el_id, struct.pack(">d", value))
+
+
+def string_element(el_id: int, value: str) -> bytes:
+    return element(el_id, value.encode("utf-8"))
+
+
+VOID_ID = 0xEC
+CRC32_ID = 0xBF
+
+
+def void_element(total_size: int) -> bytes:
+    """Return an EbmlVoid element occupying exactly ``total_size`` bytes."""
+    if total_size < 2:
+        raise EBMLError("A Void element needs at least two bytes")
+    if total_size - 2 < 127:
+        return element(VOID_ID, bytes(total_size - 2), 1)
+    if total_size < 9:
+        raise EBMLError(f"Cannot build a Void element of {total_size} bytes")
+    return element(VOID_ID, bytes(total_size - 9), 8)
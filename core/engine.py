@@ -0,0 +1,727 @@
+"""Background processing engine shared by the GUI and batch front ends."""
+
+from __future__ import annotations
+
+import copy
+import itertools
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterable, List
+
+from core.autotune import ConcurrencyTuner
+from core.config import AppConfig
+from core.inplace import apply_patch, is_flag_only, plan_file_patch, recover
+from core.matroska import MatroskaError, read_layout
+from core.noop import clone_file, is_noop
+from core.progress import JobProgress, aggregate_rate, make_parser
+from core.remux import remux_file
+from core.replace import replace_original, temp_path
+from core.scheduler import FifoScheduler
+from core.tracks import (
+    ProbeResult,
+    Track,
+    apply_wipe_all,
+    build_cmd,
+    file_stamp,
+    query_tracks,
+    run_command,
+)
+
+logger = logging.getLogger("core.engine")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+# Suspending a child process needs job control signals
+CAN_SUSPEND = hasattr(signal, "SIGSTOP")
+
+_job_ids = itertools.count(1)
+
+
+@dataclass(eq=False)
+class Job:
+    """A single file waiting to be cleaned."""
+
+    source: Path
+    tracks: List[Track]  # selection of the group, copied when enqueued
+    probe: ProbeResult | None = None
+    wipe_all: bool = False
+    config: AppConfig | None = None  # settings at the time the job was queued
+    id: int = field(default_factory=lambda: next(_job_ids))
+    state: str = QUEUED
+    destination: Path | None = None
+    error: str = ""
+    reused_probe: bool = False
+    method: str = ""  # "remux", "native", "flags" or a no-op method once run
+    bytes_avoided: int = 0  # source bytes not remuxed because of a no-op
+    progress: JobProgress | None = None
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    process: subprocess.Popen | None = field(default=None, repr=False)
+    paused: bool = False
+    cancel_requested: bool = False
+    rejected: str = ""  # set by the scheduler for jobs that must not run
+    # Tracks resolved by a pipeline before the job reached the engine
+    planned_tracks: List[Track] | None = field(default=None, repr=False)
+    plan: object | None = field(default=None, repr=False)  # saved core.plan.PlanEntry
+    # Identity of the destination before the job ran, () if it was missing
+    prior_output: tuple | None = field(default=None, repr=False)
+
+    def set_destination(self, dst: Path) -> None:
+        """Set the output path, remembering the file already there."""
+        self.destination = Path(dst)
+        self.prior_output = file_identity(self.destination)
+
+    def attach_process(self, proc: subprocess.Popen) -> None:
+        """Remember the backend process of this job.
+
+        Passed to ``run_command`` as ``on_start``. A cancel or pause that
+        arrived before the process existed is applied right away.
+        """
+        self.process = proc
+        if self.cancel_requested:
+            kill_process(proc)
+        elif self.paused:
+            suspend_process(proc)
+
+
+def suspend_process(proc: subprocess.Popen) -> bool:
+    """Stop ``proc`` with SIGSTOP; return ``False`` where unsupported."""
+    if not CAN_SUSPEND or proc.poll() is not None:
+        return False
+    try:
+        os.kill(proc.pid, signal.SIGSTOP)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def resume_process(proc: subprocess.Popen) -> bool:
+    """Continue ``proc`` after :func:`suspend_process`."""
+    if not CAN_SUSPEND or proc.poll() is not None:
+        return False
+    try:
+        os.kill(proc.pid, signal.SIGCONT)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def kill_process(proc: subprocess.Popen) -> None:
+    """Kill ``proc``; works for suspended processes too."""
+    if proc.poll() is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+class JobCancelled(Exception):
+    """Raised inside a job that runs in-process when it was cancelled."""
+
+
+def job_checkpoint(job: Job) -> Callable[[int], None]:
+    """Return a callback for in-process work reporting ``bytes_done``.
+
+    The callback updates the job's progress, blocks while the job is
+    paused and raises :class:`JobCancelled` once it was cancelled.
+    """
+
+    def check(bytes_done: int) -> None:
+        if job.progress is not None:
+            job.progress.update(bytes_done=bytes_done)
+        while job.paused and not job.cancel_requested:
+            time.sleep(0.1)
+        if job.cancel_requested:
+            raise JobCancelled(str(job.source))
+
+    return check
+
+
+def file_identity(path: Path) -> tuple:
+    """Return ``(size, mtime_ns, inode)`` of ``path``, ``()`` if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ()
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+def remove_partial_output(job: Job) -> None:
+    """Delete the half-written output of a cancelled or failed job.
+
+    Only a file the job wrote is removed: an output left by an earlier run
+    stays if the job failed before touching it.
+    """
+    dst = job.destination
+    if dst is None or dst == job.source or job.prior_output is None:
+        return
+    if file_identity(dst) == job.prior_output:
+        return
+    try:
+        dst.unlink()
+        logger.info("Removed partial output %s", dst)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        logger.warning("Could not remove partial output %s: %s", dst, exc)
+
+
+def job_size(job: Job) -> int:
+    """Return the number of source bytes ``job`` processed."""
+    if job.progress is not None and job.progress.total_bytes:
+        return job.progress.total_bytes
+    stamp = file_stamp(job.source)
+    return stamp[0] if stamp else 0
+
+
+def destination_for(source: Path, output_dir: str | Path) -> Path:
+    """Return the output path of ``source`` for ``output_dir``.
+
+    Relative output directories are resolved next to the source file.
+    """
+    out = Path(output_dir)
+    dst_dir = out if out.is_absolute() else (source.parent / out)
+    return dst_dir / source.name
+
+
+def apply_selection(real_tracks: List[Track], selected: List[Track]) -> None:
+    """Copy the user's choices from ``selected`` onto ``real_tracks``.
+
+    Tracks are matched by ``tid``; tracks unknown to the selection are kept
+    without default or forced flags.
+    """
+    tid_to_ui = {t.tid: t for t in selected}
+    for t in real_tracks:
+        if t.tid in tid_to_ui:
+            t_ui = tid_to_ui[t.tid]
+            t.removed = t_ui.removed
+            t.forced = t_ui.forced
+            t.default_audio = t_ui.default_audio
+            t.default_subtitle = t_ui.default_subtitle
+        else:
+            t.removed = False
+            t.forced = False
+            t.default_audio = False
+            t.default_subtitle = False
+
+
+def resolve_tracks(src: Path, probe: ProbeResult | None, query_tracks) -> tuple[List[Track], bool]:
+    """Return the real tracks of ``src`` and whether ``probe`` was reused."""
+    if probe is not None and probe.is_current(src):
+        return copy.deepcopy(probe.tracks), True
+    return query_tracks(src), False
+
+
+def edit_flags(job: Job, tracks: List[Track], dst: Path) -> bool:
+    """Produce ``dst`` by patching the flags of ``job.source``.
+
+    The source is cloned to ``dst`` first (see :func:`core.noop.clone_file`)
+    unless ``dst`` is the source itself. Returns ``False`` without touching
+    anything if the job removes tracks or the header cannot be patched, in
+    which case a remux is needed.
+    """
+    if not is_flag_only(tracks):
+        return False
+    try:
+        # A patch interrupted by a crash must not be planned on
+        recover(job.source)
+        patch = plan_file_patch(job.source, tracks)
+    except (MatroskaError, OSError) as exc:
+        logger.info("Cannot patch %s in place (%s), remuxing", job.source, exc)
+        return False
+    if Path(dst).absolute() != Path(job.source).absolute():
+        # Never a hard link: the patch would change the source too
+        clone_file(job.source, dst, "reflink")
+    if patch is not None:
+        apply_patch(dst, patch)
+    logger.info(
+        "Patched %d flag(s) of %s in place", patch.changed if patch else 0, dst
+    )
+    return True
+
+
+def probe_job(job: Job, query_tracks) -> List[Track]:
+    """Return the real tracks of ``job.source``, reusing ``job.probe`` if current.
+
+    A flag edit of the source interrupted by a crash is rolled back first.
+    """
+    recover(job.source)
+    real_tracks, job.reused_probe = resolve_tracks(job.source, job.probe, query_tracks)
+    return real_tracks
+
+
+def plan_job(
+    job: Job,
+    real_tracks: List[Track],
+    output_dir,
+    replace: bool = False,
+    create_dirs: bool = True,
+) -> List[Track]:
+    """Apply the job's selection to ``real_tracks`` and pick its destination.
+
+    With ``replace`` the destination is the source itself. The output
+    directory is created unless ``create_dirs`` is false.
+    """
+    apply_selection(real_tracks, job.tracks)
+    if job.wipe_all:
+        apply_wipe_all(real_tracks)
+    if replace:
+        dst = Path(job.source)
+    else:
+        dst = destination_for(job.source, output_dir)
+        if create_dirs:
+            dst.parent.mkdir(parents=True, exist_ok=True)
+    job.set_destination(dst)
+    return real_tracks
+
+
+def run_job(
+    job: Job,
+    query_tracks,
+    build_cmd,
+    run_command,
+    output_dir,
+    parser=None,
+    inplace=False,
+    remux=None,
+    replace=False,
+    backup=True,
+    noop="remux",
+) -> None:
+    """Build and run the backend command for ``job``.
+
+    With a progress ``parser`` the command is built to report progress and
+    its output lines are fed to ``parser.feed``. With ``inplace`` jobs that
+    only change flags are handled by :func:`edit_flags` instead. ``remux``
+    replaces the external backend with an in-process
+    ``remux(source, destination, tracks)`` call. Exceptions from the
+    backend propagate to the caller.
+
+    With ``replace`` the output is written to a temporary file next to the
+    source and renamed over it once complete, keeping a backup of the
+    original if ``backup`` is set (see :mod:`core.replace`).
+
+    Jobs that would not change the file are handled according to the
+    ``noop`` policy (see :mod:`core.noop`) without running a backend.
+
+    Jobs that were already probed and planned by a pipeline
+    (``job.planned_tracks``) skip straight to running the backend.
+    """
+    real_tracks = job.planned_tracks
+    job.planned_tracks = None
+    if real_tracks is None:
+        real_tracks = plan_job(job, probe_job(job, query_tracks), output_dir, replace)
+    dst = job.destination
+    if noop != "remux" and is_noop(real_tracks):
+        job.method = skip_noop(job, dst, noop)
+        return
+    if inplace and edit_flags(job, real_tracks, dst):
+        job.method = "flags"
+        return
+    if not replace:
+        _write_output(job, real_tracks, dst, build_cmd, run_command, parser, remux)
+        return
+    tmp = temp_path(dst)
+    try:
+        _write_output(job, real_tracks, tmp, build_cmd, run_command, parser, remux)
+        replace_original(dst, tmp, backup)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def skip_noop(job: Job, dst: Path, policy: str) -> str:
+    """Produce the output of a no-op job; return the method used."""
+    stamp = file_stamp(job.source)
+    job.bytes_avoided = stamp[0] if stamp else 0
+    if policy == "skip" or Path(dst).absolute() == Path(job.source).absolute():
+        method = "skipped"
+    else:
+        method = clone_file(job.source, dst, policy)
+    logger.info("%s needs no changes (%s)", job.source, method)
+    return method
+
+
+def _write_output(job, real_tracks, dst, build_cmd, run_command, parser, remux) -> None:
+    """Remux ``job.source`` into ``dst`` with the configured backend."""
+    if remux is not None:
+        job.method = "native"
+        remux(job.source, dst, real_tracks)
+        return
+    job.method = "remux"
+    if parser is None:
+        cmd = build_cmd(job.source, dst, real_tracks, wipe_forced=False, wipe_all=job.wipe_all)
+        logger.info("Running: %s", " ".join(map(str, cmd)))
+        run_command(cmd, capture=False)
+        return
+    cmd = build_cmd(
+        job.source, dst, real_tracks, wipe_forced=False, wipe_all=job.wipe_all, progress=True
+    )
+    logger.info("Running: %s", " ".join(map(str, cmd)))
+    try:
+        run_command(cmd, capture=False, on_line=parser.feed, on_start=job.attach_process)
+    finally:
+        job.process = None
+
+
+def _duration(source: Path) -> float | None:
+    """Return the duration of ``source`` in seconds if its header says so."""
+    try:
+        return read_layout(source).duration
+    except (MatroskaError, OSError):
+        return None
+
+
+def execute_job(job: Job) -> None:
+    """Run ``job`` with the real backends configured by ``job.config``."""
+    cfg = job.config or AppConfig()
+    stamp = file_stamp(job.source)
+    job.progress = JobProgress(total_bytes=stamp[0] if stamp else 0)
+    parser = remux = None
+    if cfg.backend == "native":
+        checkpoint = job_checkpoint(job)
+
+        def remux(src, dst, tracks):
+            remux_file(src, dst, tracks, checkpoint=checkpoint)
+
+    else:
+        parser = make_parser(cfg.backend, job.progress, _duration(job.source))
+    run_job(
+        job,
+        lambda src: query_tracks(src, cfg),
+        lambda s, d, t, wipe_forced=False, wipe_all=False, progress=False: build_cmd(
+            s, d, t, cfg, wipe_forced, wipe_all, progress
+        ),
+        run_command,
+        cfg.output_dir,
+        parser,
+        cfg.inplace_flags,
+        remux,
+        cfg.replace_original,
+        cfg.backup_hours > 0,
+        cfg.noop_policy,
+    )
+    job.progress.finish()
+
+
+class ProcessingEngine:
+    """Long-lived job queue running ``execute(job)`` on worker threads.
+
+    Jobs can be submitted at any time, including while others run. Every
+    state change is recorded so a front end can poll :meth:`take_changes`
+    at its own refresh rate instead of being notified per job.
+
+    Queued jobs can be cancelled or held; running jobs are cancelled by
+    killing their backend process and paused by suspending it. Outputs of
+    cancelled and failed jobs are removed.
+
+    ``max_workers`` caps the number of jobs running at once; which queued
+    job runs next is left to ``scheduler`` (FIFO by default). With a
+    ``tuner`` the cap starts at the tuner's concurrency and follows it as
+    jobs finish.
+    """
+
+    def __init__(
+        self,
+        execute: Callable[[Job], None],
+        max_workers: int = 4,
+        scheduler: FifoScheduler | None = None,
+        tuner: ConcurrencyTuner | None = None,
+    ):
+        self._execute = execute
+        self.tuner = tuner
+        self.max_workers = max(1, tuner.concurrency if tuner else max_workers)
+        self._cond = threading.Condition()
+        self.scheduler = scheduler if scheduler is not None else FifoScheduler()
+        self._pending = self.scheduler
+        self._running: set[Job] = set()
+        self._changed: dict[int, Job] = {}
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+        self._paused = False
+        self._batch_started = 0.0
+        self.jobs: list[Job] = []
+
+    def submit(self, jobs: Iterable[Job]) -> List[Job]:
+        """Queue ``jobs`` and return them."""
+        jobs = list(jobs)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Engine has been shut down")
+            if not self._pending and not self._running:
+                self._batch_started = time.time()
+                if self.tuner is not None:
+                    self.tuner.reset_epoch()
+            for job in jobs:
+                job.state = PAUSED if job.paused else QUEUED
+                self.jobs.append(job)
+                self._pending.append(job)
+                self._changed[job.id] = job
+            self._start_workers()
+            self._cond.notify_all()
+        return jobs
+
+    def set_max_workers(self, count: int) -> None:
+        """Change the number of jobs allowed to run at once.
+
+        Running jobs are not interrupted when the cap drops; fewer new
+        ones are started instead.
+        """
+        with self._cond:
+            self.max_workers = max(1, count)
+            if not self._closed:
+                self._start_workers()
+            self._cond.notify_all()
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.max_workers:
+            t = threading.Thread(
+                target=self._worker, name=f"engine-{len(self._threads)}", daemon=True
+            )
+            self._threads.append(t)
+            t.start()
+
+    def _next_job(self) -> Job | None:
+        """Return the next job to run; called with the lock held."""
+        while not self._closed:
+            if not self._paused and len(self._running) < self.max_workers:
+                job = self._pending.pick()
+                if job is not None:
+                    return job
+            self._cond.wait()
+        return None
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                job = self._next_job()
+                if job is None:
+                    return
+                if job.rejected:
+                    logger.error("Job %s rejected: %s", job.source, job.rejected)
+                    job.error = job.rejected
+                    job.state = FAILED
+                    job.finished = time.time()
+                    self._pending.discard(job)
+                    self._changed[job.id] = job
+                    self._cond.notify_all()
+                    continue
+                job.state = RUNNING
+                job.started = time.time()
+                if job.destination is not None:
+                    # Planned before it was queued; see remove_partial_output
+                    job.set_destination(job.destination)
+                self._pending.started(job)
+                self._running.add(job)
+                self._changed[job.id] = job
+                self._cond.notify_all()  # wakes wait_for_room
+            if self.tuner is not None:
+                self.tuner.job_started()
+            try:
+                self._execute(job)
+            except Exception as exc:
+                if job.cancel_requested:
+                    state = CANCELLED
+                else:
+                    logger.error("Job %s failed: %s", job.source, exc)
+                    job.error = str(exc) or exc.__class__.__name__
+                    state = FAILED
+                remove_partial_output(job)
+            else:
+                state = DONE
+                if self.tuner is not None:
+                    count = self.tuner.job_finished(job_size(job))
+                    if count is not None:
+                        self.set_max_workers(count)
+            with self._cond:
+                job.state = state
+                job.finished = time.time()
+                self._pending.finished(job)
+                self._running.discard(job)
+                self._changed[job.id] = job
+                self._cond.notify_all()
+
+    def take_changes(self) -> List[Job]:
+        """Return jobs whose state changed since the previous call."""
+        with self._cond:
+            changed = list(self._changed.values())
+            self._changed.clear()
+        return changed
+
+    def cancel(self, jobs: Iterable[Job]) -> None:
+        """Cancel ``jobs``: queued ones are dropped, running ones killed."""
+        with self._cond:
+            for job in jobs:
+                if job.state in FINISHED_STATES or job.cancel_requested:
+                    continue
+                job.cancel_requested = True
+                if job in self._pending:
+                    self._pending.remove(job)
+                    job.state = CANCELLED
+                    job.finished = time.time()
+                    self._changed[job.id] = job
+                elif job.process is not None:
+                    kill_process(job.process)
+            self._cond.notify_all()
+
+    def cancel_all(self) -> None:
+        """Drop every queued job and kill the running ones."""
+        with self._cond:
+            jobs = list(self._pending) + list(self._running)
+        self.cancel(jobs)
+
+    def pause(self, jobs: Iterable[Job]) -> None:
+        """Hold queued ``jobs`` and suspend running ones."""
+        self._set_paused(jobs, True)
+
+    def resume(self, jobs: Iterable[Job]) -> None:
+        """Undo :meth:`pause` for ``jobs``."""
+        self._set_paused(jobs, False)
+
+    def _set_paused(self, jobs: Iterable[Job], paused: bool) -> None:
+        with self._cond:
+            for job in jobs:
+                if job.state in FINISHED_STATES or job.paused == paused:
+                    continue
+                if job in self._running:
+                    proc = job.process
+                    if paused and not CAN_SUSPEND and proc is not None:
+                        continue
+                    job.paused = paused
+                    if proc is not None:
+                        (suspend_process if paused else resume_process)(proc)
+                    job.state = PAUSED if paused else RUNNING
+                else:
+                    job.paused = paused
+                    job.state = PAUSED if paused else QUEUED
+                self._changed[job.id] = job
+            self._cond.notify_all()
+
+    def pause_all(self) -> None:
+        """Stop starting new jobs and suspend the running ones."""
+        with self._cond:
+            self._paused = True
+            running = list(self._running)
+        self.pause(running)
+
+    def resume_all(self) -> None:
+        """Resume suspended jobs and continue with the queue."""
+        with self._cond:
+            self._paused = False
+            jobs = [j for j in self.jobs if j.paused]
+        self.resume(jobs)
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def counts(self) -> dict[str, int]:
+        with self._cond:
+            counts = {QUEUED: 0, RUNNING: 0, PAUSED: 0, DONE: 0, FAILED: 0, CANCELLED: 0}
+            for job in self.jobs:
+                counts[job.state] = counts.get(job.state, 0) + 1
+            return counts
+
+    def running(self) -> List[Job]:
+        """Return the jobs currently being processed."""
+        with self._cond:
+            return list(self._running)
+
+    def bytes_avoided(self) -> int:
+        """Source bytes of no-op jobs that did not need a remux."""
+        with self._cond:
+            return sum(j.bytes_avoided for j in self.jobs)
+
+    def throughput(self) -> float:
+        """Aggregate bytes per second of the current batch.
+
+        A batch starts when a job is submitted to an idle engine.
+        """
+        with self._cond:
+            batch = [
+                j.progress
+                for j in self.jobs
+                if j.progress is not None and j.submitted >= self._batch_started
+            ]
+        return aggregate_rate(batch)
+
+    def wait_for_room(self, limit: int, timeout: float | None = None) -> bool:
+        """Block until fewer than ``limit`` jobs are queued.
+
+        Lets a producer feed the engine without queueing a whole batch up
+        front. Returns ``False`` on timeout or once the engine is shut down.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while len(self._pending) >= max(1, limit):
+                if self._closed:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return not self._closed
+
+    @property
+    def idle(self) -> bool:
+        with self._cond:
+            return not self._pending and not self._running
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until no job is queued or running."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._running:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def clear_finished(self) -> List[Job]:
+        """Forget finished jobs and return them."""
+        with self._cond:
+            done = [j for j in self.jobs if j.state in FINISHED_STATES]
+            self.jobs = [j for j in self.jobs if j.state not in FINISHED_STATES]
+        return done
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the workers after their current job."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+def configure_engine(engine: ProcessingEngine, cfg: AppConfig) -> None:
+    """Apply the concurrency settings of ``cfg`` to ``engine``.
+
+    Uses a fixed number of jobs or lets a tuner pick it, as configured.
+    """
+    if not cfg.autotune:
+        engine.tuner = None
+        engine.set_max_workers(cfg.max_workers)
+    else:
+        tuner = engine.tuner
+        if tuner is None or tuner.key != cfg.backend:
+            tuner = ConcurrencyTuner(cfg.max_workers, cfg.autotune_history or None, cfg.backend)
+            engine.tuner = tuner
+            engine.set_max_workers(tuner.concurrency)
+        tuner.max_workers = max(1, cfg.max_workers)
+    engine.scheduler.per_device = max(1, cfg.device_workers)
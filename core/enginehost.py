@@ -0,0 +1,557 @@
+"""Processing engine in a separate process.
+
+:class:`EngineHost` runs a :class:`~core.engine.ProcessingEngine` in its own
+process and serves it over a local socket (a named pipe on Windows). A
+backend that crashes or hangs, or CPU heavy native remuxing, then cannot
+stall the GUI. The process keeps working through its queue when the GUI
+is closed; a GUI started later attaches to it and shows the queue again.
+It exits once its queue is done and no client has been connected for
+``idle_exit`` seconds.
+
+:class:`EngineClient` offers the part of the engine interface the GUI
+uses and keeps a local copy of every job. Requests are tuples
+``(op, *args)`` answered with ``(True, result)`` or ``(False, error)``;
+job updates travel as the compact records of :func:`job_record`, sent for
+changed and running jobs on every :meth:`~EngineClient.take_changes`.
+Connections are authenticated with a key only the user can read.
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import getpass
+import itertools
+import logging
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import Iterable, List
+
+from core.config import AppConfig, setup_logging, user_cache_dir
+from core.engine import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    FINISHED_STATES,
+    PAUSED,
+    QUEUED,
+    RUNNING,
+    Job,
+    ProcessingEngine,
+    configure_engine,
+    execute_job,
+)
+from core.journal import run_journaled
+from core.progress import JobProgress
+
+logger = logging.getLogger("core.enginehost")
+
+IDLE_EXIT = 60.0
+_ROOT = Path(__file__).resolve().parents[1]
+
+
+def engine_address() -> str:
+    """Return the default address of the engine process of this user."""
+    if os.name == "nt":
+        return rf"\\.\pipe\mkv-cleaner-engine-{getpass.getuser()}"
+    return str(user_cache_dir() / "engine.sock")
+
+
+def default_key_file() -> Path:
+    return user_cache_dir() / "engine.key"
+
+
+def read_key(path: Path | str, create: bool = False) -> bytes:
+    """Return the authentication key in ``path``, creating it if asked to."""
+    path = Path(path)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        if not create:
+            raise
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes()
+    key = secrets.token_bytes(32)
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(key)
+    return key
+
+
+def job_record(job: Job) -> tuple:
+    """Return the state and progress of ``job`` as a compact tuple."""
+    p = job.progress
+    return (
+        job.id,
+        job.state,
+        job.method,
+        job.error,
+        str(job.destination) if job.destination is not None else None,
+        job.bytes_avoided,
+        job.started,
+        job.finished,
+        job.paused,
+        (p.total_bytes, p.bytes_done, p.percent, p.started, p.updated, p.finished)
+        if p is not None
+        else None,
+    )
+
+
+def apply_record(job: Job, record: tuple) -> None:
+    """Copy a :func:`job_record` onto the local copy of a job."""
+    (
+        _id,
+        job.state,
+        job.method,
+        job.error,
+        destination,
+        job.bytes_avoided,
+        job.started,
+        job.finished,
+        job.paused,
+        progress,
+    ) = record
+    job.destination = Path(destination) if destination is not None else None
+    if progress is not None:
+        # Monotonic clocks are shared by all processes of a machine
+        p = job.progress = job.progress or JobProgress()
+        p.total_bytes, p.bytes_done, p.percent, p.started, p.updated, p.finished = progress
+
+
+def _execute(job: Job) -> None:
+    run_journaled(job, execute_job)
+
+
+class _Session:
+    """State of one connected client."""
+
+    def __init__(self):
+        self.changed: dict[int, Job] = {}
+
+
+class EngineHost:
+    """Serve one engine to clients connecting to ``address``.
+
+    The engine is created when the first client sends its settings with
+    ``configure``; its scheduler follows those settings.
+    """
+
+    def __init__(self, address: str, authkey: bytes, idle_exit: float = IDLE_EXIT):
+        self.address = address
+        self.authkey = authkey
+        self.idle_exit = idle_exit
+        self.engine: ProcessingEngine | None = None
+        self._lock = threading.Lock()
+        self._sessions: set[_Session] = set()
+        self._ids = itertools.count(1)
+        self._stop = threading.Event()
+        self._listener: Listener | None = None
+
+    def serve_forever(self) -> None:
+        """Accept clients until idle for ``idle_exit`` seconds or :meth:`stop`."""
+        self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept, name="engine-accept", daemon=True).start()
+        logger.info("Engine process %d serving %s", os.getpid(), self.address)
+        idle_since = time.monotonic()
+        was_idle = True
+        try:
+            while not self._stop.wait(min(1.0, self.idle_exit / 4)):
+                with self._lock:
+                    clients = len(self._sessions)
+                idle = self.engine is None or self.engine.idle
+                if idle and not was_idle:
+                    self._save_costs()
+                was_idle = idle
+                if clients or not idle:
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since >= self.idle_exit:
+                    break
+        finally:
+            self.close()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.close()
+        if self.engine is not None:
+            self.engine.cancel_all()
+            self.engine.wait(10)
+            self.engine.shutdown(wait=False)
+            self._save_costs()
+        logger.info("Engine process %d stopped", os.getpid())
+
+    def _save_costs(self) -> None:
+        try:
+            self.engine.scheduler.costs.save()
+        except OSError as exc:
+            logger.warning("Could not save job costs: %s", exc)
+
+    def _accept(self) -> None:
+        while not self._stop.is_set():
+            try:
+                conn = self._listener.accept()
+            except Exception as exc:
+                if self._stop.is_set():
+                    return
+                # failed authentication or a client that went away early
+                logger.warning("Rejected engine client: %s", exc)
+                continue
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        session = _Session()
+        with self._lock:
+            self._sessions.add(session)
+        try:
+            while True:
+                op, *args = conn.recv()
+                try:
+                    reply = (True, getattr(self, f"_op_{op}")(session, *args))
+                except Exception as exc:
+                    logger.exception("Engine request %s failed", op)
+                    reply = (False, f"{exc.__class__.__name__}: {exc}")
+                conn.send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._sessions.discard(session)
+            conn.close()
+
+    def _drain(self) -> None:
+        """Hand the engine's changes to every session; called with the lock held."""
+        for job in self.engine.take_changes():
+            for session in self._sessions:
+                session.changed[job.id] = job
+
+    def _jobs(self, ids: Iterable[int]) -> List[Job]:
+        if self.engine is None:
+            return []
+        wanted = set(ids)
+        return [j for j in list(self.engine.jobs) if j.id in wanted]
+
+    def _op_attach(self, session: _Session) -> tuple:
+        if self.engine is None:
+            return [], False
+        with self._lock:
+            self._drain()
+            session.changed.clear()
+            jobs = [dataclasses.replace(j, process=None) for j in list(self.engine.jobs)]
+        return jobs, self.engine.paused
+
+    def _op_configure(self, session: _Session, cfg: AppConfig) -> None:
+        with self._lock:
+            if self.engine is None:
+                from core.cli import make_scheduler
+
+                self.engine = ProcessingEngine(_execute, cfg.max_workers, make_scheduler(cfg))
+            configure_engine(self.engine, cfg)
+
+    def _op_submit(self, session: _Session, jobs: List[Job]) -> List[int]:
+        if self.engine is None:
+            raise RuntimeError("Engine is not configured")
+        for job in jobs:
+            # Ids of the client are not unique over client restarts
+            job.id = next(self._ids)
+        self.engine.submit(jobs)
+        return [job.id for job in jobs]
+
+    def _op_changes(self, session: _Session) -> tuple:
+        if self.engine is None:
+            return [], []
+        with self._lock:
+            self._drain()
+            changed, session.changed = session.changed, {}
+        running = [j for j in self.engine.running() if j.id not in changed]
+        return [job_record(j) for j in changed.values()], [job_record(j) for j in running]
+
+    def _op_cancel(self, session: _Session, ids: List[int]) -> None:
+        self.engine.cancel(self._jobs(ids))
+
+    def _op_pause(self, session: _Session, ids: List[int]) -> None:
+        self.engine.pause(self._jobs(ids))
+
+    def _op_resume(self, session: _Session, ids: List[int]) -> None:
+        self.engine.resume(self._jobs(ids))
+
+    def _op_cancel_all(self, session: _Session) -> None:
+        if self.engine is not None:
+            self.engine.cancel_all()
+
+    def _op_pause_all(self, session: _Session) -> None:
+        if self.engine is not None:
+            self.engine.pause_all()
+
+    def _op_resume_all(self, session: _Session) -> None:
+        if self.engine is not None:
+            self.engine.resume_all()
+
+    def _op_throughput(self, session: _Session) -> float:
+        return self.engine.throughput() if self.engine is not None else 0.0
+
+    def _op_wait(self, session: _Session, timeout: float | None) -> bool:
+        return self.engine.wait(timeout) if self.engine is not None else True
+
+    def _op_clear_finished(self, session: _Session) -> None:
+        if self.engine is not None:
+            self.engine.clear_finished()
+
+
+def host_command() -> List[str]:
+    """Return the command starting an engine process.
+
+    A frozen build is a single executable that ignores ``-m``; it is
+    started with the ``engine-host`` argument instead.
+    """
+    if getattr(sys, "frozen", False):
+        return [sys.executable, "engine-host"]
+    return [sys.executable, "-m", "core.enginehost"]
+
+
+def start_host(
+    address: str, key_file: Path | str, idle_exit: float = IDLE_EXIT
+) -> subprocess.Popen:
+    """Start an engine process that outlives the calling process."""
+    read_key(key_file, create=True)
+    log = user_cache_dir() / "engine.log"
+    log.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        *host_command(),
+        "--address",
+        address,
+        "--key-file",
+        str(key_file),
+        "--idle-exit",
+        str(idle_exit),
+    ]
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(_ROOT), env.get("PYTHONPATH")]))
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    with open(log, "ab") as fh:
+        return subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=fh, stderr=fh, env=env, **kwargs
+        )
+
+
+class EngineClient:
+    """Engine interface backed by an :class:`EngineHost` in another process.
+
+    If the engine process goes away, its unfinished jobs are reported as
+    failed by the next :meth:`take_changes` and further requests do nothing.
+    """
+
+    def __init__(self, conn: Connection):
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._lost = False
+        self._failed: List[Job] = []
+        self.jobs: List[Job] = []
+        self._by_id: dict[int, Job] = {}
+        jobs, self._paused = self._call("attach", default=([], False))
+        for job in jobs:
+            self._add(job)
+
+    @classmethod
+    def connect(
+        cls,
+        address: str | None = None,
+        key_file: Path | str | None = None,
+        spawn: bool = True,
+        timeout: float = 10.0,
+    ) -> "EngineClient":
+        """Connect to the engine process, starting one first with ``spawn``.
+
+        Raises :class:`OSError` if no engine process answers in time.
+        """
+        address = address or engine_address()
+        key_file = key_file or default_key_file()
+        try:
+            authkey = read_key(key_file, create=spawn)
+        except FileNotFoundError:
+            raise OSError(f"No engine process is running at {address}") from None
+        try:
+            return cls(Client(address, authkey=authkey))
+        except (OSError, EOFError):
+            if not spawn:
+                raise OSError(f"No engine process is running at {address}") from None
+        start_host(address, key_file)
+        deadline = time.monotonic() + timeout
+        while True:
+            time.sleep(0.05)
+            try:
+                return cls(Client(address, authkey=authkey))
+            except (OSError, EOFError):
+                if time.monotonic() > deadline:
+                    raise OSError(f"The engine process did not start at {address}") from None
+
+    def _call(self, op: str, *args, default=None):
+        with self._lock:
+            if self._lost:
+                return default
+            try:
+                self._conn.send((op, *args))
+                ok, result = self._conn.recv()
+            except (EOFError, OSError) as exc:
+                logger.error("Lost the engine process: %s", exc)
+                self._lose()
+                return default
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def _lose(self) -> None:
+        self._lost = True
+        for job in self.jobs:
+            if job.state not in FINISHED_STATES:
+                job.state = FAILED
+                job.error = "The engine process stopped"
+                job.finished = time.time()
+                self._failed.append(job)
+
+    def _add(self, job: Job) -> None:
+        self.jobs.append(job)
+        self._by_id[job.id] = job
+
+    @property
+    def lost(self) -> bool:
+        return self._lost
+
+    def close(self) -> None:
+        """Disconnect; the engine process keeps running its queue."""
+        with self._lock:
+            self._conn.close()
+            self._lost = True
+
+    def configure(self, cfg: AppConfig) -> None:
+        """Apply the scheduling and concurrency settings of ``cfg``."""
+        self._call("configure", cfg)
+
+    def submit(self, jobs: Iterable[Job]) -> List[Job]:
+        jobs = list(jobs)
+        ids = self._call("submit", jobs)
+        if ids is None:
+            raise RuntimeError("The engine process stopped")
+        for job, job_id in zip(jobs, ids):
+            job.id = job_id
+            job.state = PAUSED if job.paused else QUEUED
+            self._add(job)
+        return jobs
+
+    def take_changes(self) -> List[Job]:
+        changed, running = self._call("changes", default=([], []))
+        jobs = [self._apply(r) for r in changed]
+        for record in running:
+            self._apply(record)
+        jobs = [j for j in jobs if j is not None]
+        if self._failed:
+            jobs += self._failed
+            self._failed = []
+        return jobs
+
+    def _apply(self, record: tuple) -> Job | None:
+        job = self._by_id.get(record[0])
+        if job is not None:
+            apply_record(job, record)
+        return job
+
+    def cancel(self, jobs: Iterable[Job]) -> None:
+        self._call("cancel", [j.id for j in jobs])
+
+    def pause(self, jobs: Iterable[Job]) -> None:
+        self._call("pause", [j.id for j in jobs])
+
+    def resume(self, jobs: Iterable[Job]) -> None:
+        self._call("resume", [j.id for j in jobs])
+
+    def cancel_all(self) -> None:
+        self._call("cancel_all")
+
+    def pause_all(self) -> None:
+        self._paused = True
+        self._call("pause_all")
+
+    def resume_all(self) -> None:
+        self._paused = False
+        self._call("resume_all")
+
+    @property
+    def paused(self) -> bool:
+        return self._paused
+
+    def counts(self) -> dict[str, int]:
+        counts = dict.fromkeys((QUEUED, RUNNING, PAUSED, DONE, FAILED, CANCELLED), 0)
+        for job in self.jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    def running(self) -> List[Job]:
+        return [
+            j
+            for j in self.jobs
+            if j.state == RUNNING or j.state == PAUSED and j.started is not None
+        ]
+
+    def bytes_avoided(self) -> int:
+        return sum(j.bytes_avoided for j in self.jobs)
+
+    def throughput(self) -> float:
+        return self._call("throughput", default=0.0)
+
+    @property
+    def idle(self) -> bool:
+        """Whether every job known to this client finished, as of the last update."""
+        return all(j.state in FINISHED_STATES for j in self.jobs)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._call("wait", timeout, default=True)
+
+    def clear_finished(self) -> List[Job]:
+        done = [j for j in self.jobs if j.state in FINISHED_STATES]
+        self.jobs = [j for j in self.jobs if j.state not in FINISHED_STATES]
+        for job in done:
+            self._by_id.pop(job.id, None)
+        self._call("clear_finished")
+        return done
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m core.enginehost")
+    parser.add_argument("--address", default=None)
+    parser.add_argument("--key-file", type=Path, default=None)
+    parser.add_argument("--idle-exit", type=float, default=IDLE_EXIT)
+    args = parser.parse_args(argv)
+    setup_logging()
+    address = args.address or engine_address()
+    authkey = read_key(args.key_file or default_key_file(), create=True)
+    if os.name != "nt" and os.path.exists(address):
+        try:
+            Client(address, authkey=authkey).close()
+        except (OSError, EOFError):
+            os.unlink(address)  # left behind by a crashed engine process
+        else:
+            logger.info("An engine process is already serving %s", address)
+            return 0
+    host = EngineHost(address, authkey, args.idle_exit)
+    signal.signal(signal.SIGTERM, lambda *_: host.stop())
+    host.serve_forever()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,342 @@
+"""Change default/forced flags by patching the Matroska header in place.
+
+When a job removes no tracks, the only difference between the source and
+the cleaned file are a few ``FlagDefault``/``FlagForced`` bytes inside the
+``Tracks`` element. Instead of remuxing, the element is re-encoded with the
+new flags and written over its old location. Space for flags that have to
+be added comes from ``EbmlVoid`` padding inside or right after ``Tracks``;
+leftover space is filled with a new Void element so every other offset in
+the file stays valid.
+
+Writes are journaled: the original bytes are saved next to the file before
+anything is overwritten, and :func:`recover` puts them back if a patch was
+interrupted.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import mmap
+import os
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+from core.ebml import (
+    CRC32_ID,
+    VOID_ID,
+    EBMLError,
+    children,
+    element,
+    encode_id,
+    encode_vint,
+    read_element,
+    read_uint,
+    uint_element,
+    void_element,
+)
+from core.matroska import (
+    FLAG_DEFAULT_ID,
+    FLAG_FORCED_ID,
+    TRACK_ENTRY_ID,
+    TRACKS_ID,
+    MatroskaError,
+    SegmentLayout,
+    parse_layout,
+)
+
+logger = logging.getLogger("core.inplace")
+
+JOURNAL_SUFFIX = ".mkvc-journal"
+_JOURNAL_MAGIC = b"MKVCJ1\n"
+
+# Values assumed by players when a flag element is missing
+_FLAG_DEFAULTS = {FLAG_DEFAULT_ID: 1, FLAG_FORCED_ID: 0}
+
+
+class PatchError(MatroskaError):
+    """Raised when a header cannot be patched and a remux is needed."""
+
+
+@dataclass
+class FlagPatch:
+    """Bytes to write over ``original`` at ``offset``; both have equal length."""
+
+    offset: int
+    original: bytes
+    data: bytes
+    changed: int  # number of flag values that differ from the file
+
+
+def is_flag_only(tracks) -> bool:
+    """Return ``True`` if applying ``tracks`` removes nothing from the file."""
+    return not any(t.removed for t in tracks)
+
+
+def wanted_flags(tracks, wipe_forced: bool = False) -> dict[int, dict[int, int]]:
+    """Return ``{tid: {flag id: value}}`` for the flags ``build_cmd`` sets.
+
+    Like the mkvmerge backend, audio tracks get their default flag and
+    subtitle tracks their default and forced flags; video is left alone.
+    """
+    wanted: dict[int, dict[int, int]] = {}
+    for t in tracks:
+        if t.removed:
+            continue
+        if t.type == "audio":
+            wanted[t.tid] = {FLAG_DEFAULT_ID: int(t.default_audio)}
+        elif t.type == "subtitles":
+            wanted[t.tid] = {
+                FLAG_DEFAULT_ID: int(t.default_subtitle),
+                FLAG_FORCED_ID: int(t.forced and not wipe_forced),
+            }
+    return wanted
+
+
+def entry_flag_changes(
+    buf, layout: SegmentLayout, tracks, wipe_forced: bool = False
+) -> dict[int, dict[int, int]]:
+    """Return the flag values to change keyed by TrackEntry index."""
+    changes: dict[int, dict[int, int]] = {}
+    types = {t.tid: t.type for t in tracks}
+    for tid, flags in wanted_flags(tracks, wipe_forced).items():
+        if not 0 <= tid < len(layout.entries):
+            raise PatchError(f"Track {tid} not found in header")
+        entry = layout.entries[tid]
+        if entry.type != types[tid]:
+            raise PatchError(f"Track {tid} is {entry.type or 'unknown'}, expected {types[tid]}")
+        for el_id, value in flags.items():
+            field = entry.fields.get(el_id)
+            current = read_uint(buf, field) if field is not None else _FLAG_DEFAULTS[el_id]
+            if current != value:
+                changes.setdefault(tid, {})[el_id] = value
+    return changes
+
+
+def encode_track_entry(buf, entry_el, changes: dict[int, int]) -> bytes:
+    """Re-encode the TrackEntry ``entry_el`` with flag values from ``changes``."""
+    parts = []
+    pending = dict(changes)
+    for child in children(buf, entry_el):
+        if child.id == CRC32_ID:
+            raise PatchError("TrackEntry carries a CRC-32")
+        if child.id == VOID_ID:
+            continue  # padding is reclaimed for new elements
+        if child.id in pending:
+            parts.append(uint_element(child.id, pending.pop(child.id)))
+        elif child.id in changes:
+            continue  # duplicate flag, the first one wins when reading
+        else:
+            parts.append(bytes(buf[child.offset:child.end]))
+    for el_id, value in pending.items():
+        parts.append(uint_element(el_id, value))
+    return element(TRACK_ENTRY_ID, b"".join(parts))
+
+
+def plan_patch(buf, tracks, wipe_forced: bool = False) -> FlagPatch | None:
+    """Compute the header patch applying the flags of ``tracks`` to ``buf``.
+
+    Returns ``None`` if the file already has the requested flags. Raises
+    :class:`PatchError` (or another :class:`MatroskaError`) if the new
+    ``Tracks`` element does not fit into the available space.
+    """
+    layout = parse_layout(buf)
+    try:
+        changes = entry_flag_changes(buf, layout, tracks, wipe_forced)
+        if not changes:
+            return None
+        tracks_el = layout.tracks
+        parts = []
+        has_crc = False
+        index = 0
+        for child in children(buf, tracks_el):
+            if child.id == CRC32_ID:
+                has_crc = True
+            elif child.id == VOID_ID:
+                continue
+            elif child.id == TRACK_ENTRY_ID:
+                if index in changes:
+                    parts.append(encode_track_entry(buf, child, changes[index]))
+                else:
+                    parts.append(bytes(buf[child.offset:child.end]))
+                index += 1
+            else:
+                parts.append(bytes(buf[child.offset:child.end]))
+        payload = b"".join(parts)
+        if has_crc:
+            crc = zlib.crc32(payload).to_bytes(4, "little")
+            payload = element(CRC32_ID, crc) + payload
+
+        start, end = tracks_el.offset, tracks_el.end
+        segment_end = layout.segment.end or len(buf)
+        if end < min(len(buf), segment_end):
+            following = read_element(buf, end)
+            if following.id == VOID_ID and following.end is not None:
+                end = following.end
+        data = _fit(encode_id(TRACKS_ID), payload, end - start)
+    except EBMLError as exc:
+        raise PatchError(str(exc)) from exc
+    return FlagPatch(
+        start, bytes(buf[start:end]), data, sum(len(c) for c in changes.values())
+    )
+
+
+def _fit(id_bytes: bytes, payload: bytes, available: int) -> bytes:
+    """Encode an element that fills exactly ``available`` bytes."""
+    min_len = len(encode_vint(len(payload)))
+    for size_len in range(min_len, 9):
+        spare = available - len(id_bytes) - size_len - len(payload)
+        if spare < 0:
+            break
+        if spare == 1:
+            continue  # a Void needs two bytes; grow the size field instead
+        head = id_bytes + encode_vint(len(payload), size_len) + payload
+        return head + (void_element(spare) if spare else b"")
+    raise PatchError(
+        f"No room to grow the Tracks element ({len(payload)} bytes needed, "
+        f"{available} available)"
+    )
+
+
+def plan_file_patch(path: Path, tracks, wipe_forced: bool = False) -> FlagPatch | None:
+    """Run :func:`plan_patch` on the file at ``path``."""
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:  # empty file
+            raise MatroskaError(f"{path} is empty") from exc
+        with mm:
+            return plan_patch(mm, tracks, wipe_forced)
+
+
+def journal_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}{JOURNAL_SUFFIX}")
+
+
+def fsync_dir(path: Path) -> None:
+    """Make renames and new entries in the directory ``path`` durable."""
+    if os.name != "posix":
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_journal(journal: Path, patch: FlagPatch) -> None:
+    header = {
+        "offset": patch.offset,
+        "length": len(patch.original),
+        "crc": zlib.crc32(patch.original),
+    }
+    tmp = journal.with_name(journal.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(_JOURNAL_MAGIC + json.dumps(header).encode() + b"\n" + patch.original)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp, journal)
+    fsync_dir(journal.parent)
+
+
+def _read_journal(journal: Path) -> tuple[int, bytes] | None:
+    data = journal.read_bytes()
+    if not data.startswith(_JOURNAL_MAGIC):
+        return None
+    header, sep, original = data[len(_JOURNAL_MAGIC):].partition(b"\n")
+    try:
+        info = json.loads(header)
+        offset, length, crc = int(info["offset"]), int(info["length"]), int(info["crc"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    if not sep or len(original) != length or zlib.crc32(original) != crc:
+        return None
+    return offset, original
+
+
+def recover(path: Path) -> bool:
+    """Undo an interrupted patch of ``path``.
+
+    Returns ``True`` if original bytes were restored from the journal.
+    """
+    path = Path(path)
+    journal = journal_path(path)
+    if not journal.exists():
+        return False
+    entry = _read_journal(journal)
+    restored = False
+    if entry is None:
+        # Journals are renamed into place only once complete, so the file
+        # was never touched.
+        logger.warning("Discarding damaged patch journal %s", journal)
+    else:
+        offset, original = entry
+        with open(path, "r+b") as fh:
+            fh.seek(offset)
+            fh.write(original)
+            fh.flush()
+            os.fsync(fh.fileno())
+        logger.warning("Rolled back interrupted flag edit of %s", path)
+        restored = True
+    journal.unlink()
+    return restored
+
+
+def recover_dirs(directories) -> int:
+    """Undo interrupted patches of every file in ``directories``.
+
+    Journals whose file is gone are removed. Returns the number of files
+    that were rolled back.
+    """
+    restored = 0
+    for directory in set(map(Path, directories)):
+        try:
+            names = [e.name for e in os.scandir(directory) if e.name.endswith(JOURNAL_SUFFIX)]
+        except OSError:
+            continue
+        for name in names:
+            if not name.startswith("."):
+                continue
+            path = Path(directory) / name[1:-len(JOURNAL_SUFFIX)]
+            try:
+                if path.exists():
+                    restored += recover(path)
+                else:
+                    journal_path(path).unlink()
+            except OSError as exc:
+                logger.warning("Could not recover %s: %s", path, exc)
+    return restored
+
+
+def apply_patch(path: Path, patch: FlagPatch) -> None:
+    """Write ``patch`` into ``path`` crash-safely."""
+    path = Path(path)
+    recover(path)
+    with open(path, "r+b") as fh:
+        fh.seek(patch.offset)
+        if fh.read(len(patch.original)) != patch.original:
+            raise PatchError(f"{path} changed since the patch was planned")
+        journal = journal_path(path)
+        _write_journal(journal, patch)
+        fh.seek(patch.offset)
+        fh.write(patch.data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    journal.unlink()
+    fsync_dir(journal.parent)
+
+
+def patch_flags(path: Path, tracks: List, wipe_forced: bool = False) -> int:
+    """Apply the flags of ``tracks`` to ``path`` in place.
+
+    Returns the number of changed flag values.
+    """
+    path = Path(path)
+    recover(path)
+    patch = plan_file_patch(path, tracks, wipe_forced)
+    if patch is None:
+        return 0
+    apply_patch(path, patch)
+    return patch.changed
@@ -0,0 +1,296 @@
+"""Persistent SQLite queue of submitted jobs.
+
+Jobs submitted to the job service (see :mod:`core.service`) are stored here
+before they run, so nothing is lost when the service is restarted: jobs
+that were running are put back into the queue on startup. Each row holds
+the source, its track selection spec (see :mod:`core.selection`) and the
+latest state and progress of the job.
+
+A store can also be shared by several worker processes or machines (see
+:mod:`core.worker`). Workers :meth:`~JobStore.claim` jobs for a limited
+time and :meth:`~JobStore.renew` the lease while they run; a job whose
+lease ran out is claimed by the next worker.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+from core.engine import CANCELLED, DONE, FAILED, QUEUED, RUNNING, Job
+
+logger = logging.getLogger("core.jobstore")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    tracks TEXT NOT NULL DEFAULT '',
+    wipe_all INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    method TEXT NOT NULL DEFAULT '',
+    destination TEXT,
+    error TEXT NOT NULL DEFAULT '',
+    percent REAL NOT NULL DEFAULT 0,
+    bytes_done INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker TEXT NOT NULL DEFAULT '',
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, id);
+"""
+
+# Columns added after the first version of the schema
+_ADDED = {
+    "worker": "TEXT NOT NULL DEFAULT ''",
+    "lease_until": "REAL",
+    "attempts": "INTEGER NOT NULL DEFAULT 0",
+}
+
+_COLUMNS = (
+    "id",
+    "source",
+    "tracks",
+    "wipe_all",
+    "state",
+    "method",
+    "destination",
+    "error",
+    "percent",
+    "bytes_done",
+    "total_bytes",
+    "submitted",
+    "started",
+    "finished",
+    "worker",
+    "lease_until",
+    "attempts",
+)
+
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobStore:
+    """Queue of jobs in a SQLite database at ``path``.
+
+    Every thread uses its own connection; by default the database is in
+    WAL mode so readers do not block the writer. Paths below ``root`` are
+    stored relative to it and turned back into paths by :meth:`resolve`.
+    """
+
+    def __init__(self, path: Path | str, journal_mode: str = "WAL", root: Path | str | None = None):
+        self.path = Path(path)
+        self.journal_mode = journal_mode
+        self.root = Path(os.path.abspath(root)) if root is not None else None
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in _ADDED.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+            self._local.conn = conn
+        return conn
+
+    def _stored_path(self, path) -> str:
+        if self.root is None:
+            return str(path)
+        path = Path(os.path.abspath(path))
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def resolve(self, stored: str) -> Path:
+        """Return the path of a stored ``source`` or ``destination``."""
+        return self.root / stored if self.root is not None else Path(stored)
+
+    def add(self, items: Iterable[tuple]) -> List[int]:
+        """Queue ``(source, tracks spec, wipe_all)`` items; return their ids."""
+        now = time.time()
+        ids = []
+        with self._conn() as conn:
+            for source, tracks, wipe_all in items:
+                cur = conn.execute(
+                    "INSERT INTO jobs (source, tracks, wipe_all, state, submitted)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self._stored_path(source),
+                        str(tracks or ""),
+                        int(bool(wipe_all)),
+                        QUEUED,
+                        now,
+                    ),
+                )
+                ids.append(cur.lastrowid)
+        return ids
+
+    def get(self, job_id: int) -> dict | None:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return _row(row) if row is not None else None
+
+    def jobs(self, state: str | None = None, limit: int = -1, after: int = 0) -> List[dict]:
+        """Return up to ``limit`` jobs with an id above ``after``, oldest first.
+
+        A negative ``limit`` returns all of them.
+        """
+        sql = "SELECT * FROM jobs WHERE id>?"
+        args: list = [after]
+        if state:
+            sql += " AND state=?"
+            args.append(state)
+        sql += " ORDER BY id LIMIT ?"
+        args.append(limit)
+        return [_row(r) for r in self._conn().execute(sql, args)]
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return {state: count for state, count in rows}
+
+    def update(self, job: Job, worker: str | None = None) -> bool:
+        """Store the state, result and progress of an engine ``job``.
+
+        With ``worker`` the job is only updated while that worker holds
+        its lease. Returns whether the job was updated.
+        """
+        progress = job.progress
+        sql = (
+            "UPDATE jobs SET state=?, method=?, destination=?, error=?, percent=?,"
+            " bytes_done=?, total_bytes=?, started=?, finished=? WHERE id=?"
+        )
+        args = [
+            job.state,
+            job.method,
+            self._stored_path(job.destination) if job.destination is not None else None,
+            job.error,
+            progress.percent if progress is not None else 0.0,
+            progress.bytes_done if progress is not None else 0,
+            progress.total_bytes if progress is not None else 0,
+            job.started,
+            job.finished,
+            job.id,
+        ]
+        if worker is not None:
+            sql += " AND worker=? AND state=?"
+            args += [worker, RUNNING]
+        with self._conn() as conn:
+            cur = conn.execute(sql, args)
+        return cur.rowcount > 0
+
+    def claim(self, worker: str, lease: float, max_attempts: int = 0) -> dict | None:
+        """Take the oldest queued job for ``worker`` for ``lease`` seconds.
+
+        Jobs whose lease expired are claimed again, unless they were
+        already claimed ``max_attempts`` times: those are marked failed.
+        Returns the claimed job or ``None`` if there is nothing to do.
+        """
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Take the write lock first so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            if max_attempts > 0:
+                conn.execute(
+                    "UPDATE jobs SET state=?, error=?, finished=? WHERE state=?"
+                    " AND lease_until<? AND attempts>=?",
+                    (
+                        FAILED,
+                        f"Worker lease expired {max_attempts} times",
+                        now,
+                        RUNNING,
+                        now,
+                        max_attempts,
+                    ),
+                )
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE state=? OR (state=? AND lease_until<?)"
+                " ORDER BY id LIMIT 1",
+                (QUEUED, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state=?, worker=?, lease_until=?, attempts=attempts+1,"
+                " started=?, finished=NULL, percent=0, bytes_done=0, error='' WHERE id=?",
+                (RUNNING, worker, now + lease, now, row[0]),
+            )
+        return self.get(row[0])
+
+    def renew(self, job: Job, worker: str, lease: float) -> bool:
+        """Extend the lease of ``worker`` on ``job`` and store its progress.
+
+        Returns ``False`` if the worker lost the job, because its lease
+        expired and another worker took it or because it was cancelled.
+        """
+        progress = job.progress
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until=?, percent=?, bytes_done=?, total_bytes=?"
+                " WHERE id=? AND worker=? AND state=?",
+                (
+                    time.time() + lease,
+                    progress.percent if progress is not None else 0.0,
+                    progress.bytes_done if progress is not None else 0,
+                    progress.total_bytes if progress is not None else 0,
+                    job.id,
+                    worker,
+                    RUNNING,
+                ),
+            )
+        return cur.rowcount > 0
+
+    def release(self, job_id: int, worker: str) -> bool:
+        """Give a claimed job back to the queue."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state=?, worker='', lease_until=NULL, percent=0, bytes_done=0,"
+                " started=NULL WHERE id=? AND worker=? AND state=?",
+                (QUEUED, job_id, worker, RUNNING),
+            )
+        return cur.rowcount > 0
+
+    def set_state(self, job_id: int, state: str, error: str = "") -> bool:
+        """Change the state of an unfinished job; return ``False`` if it finished."""
+        finished = time.time() if state in FINISHED_STATES else None
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"UPDATE jobs SET state=?, error=?, finished=? WHERE id=?"
+                f" AND state NOT IN ({','.join('?' * len(FINISHED_STATES))})",
+                (state, error, finished, job_id, *FINISHED_STATES),
+            )
+        return cur.rowcount > 0
+
+    def requeue_interrupted(self) -> int:
+        """Put jobs left running by a previous process back into the queue."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET state=?, worker='', lease_until=NULL, percent=0, bytes_done=0,"
+                " started=NULL WHERE state=?",
+                (QUEUED, RUNNING),
+            )
+        if cur.rowcount:
+            logger.info("Requeued %d interrupted job(s)", cur.rowcount)
+        return cur.rowcount
+
+
+def _row(row: sqlite3.Row) -> dict:
+    data = {key: row[key] for key in _COLUMNS}
+    data["wipe_all"] = bool(data["wipe_all"])
+    return data
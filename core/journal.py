@@ -0,0 +1,235 @@
+"""Resumable job journal.
+
+Every job that starts is recorded in a SQLite database together with a
+fingerprint of what it is going to produce: the source path, the track
+selection, the backend and its version, the settings that choose how the
+output is made and the destination. When a job
+finishes, the identity of its output (size, mtime and inode) is stored
+too. A later run of the same batch, for example after a crash or reboot,
+asks :meth:`JobJournal.is_done` before doing any work and skips jobs whose
+fingerprint matches and whose output is still the file that was written.
+Everything else runs again.
+
+The identity of the source is kept apart from the fingerprint so jobs that
+replaced their source (see :mod:`core.replace`) are recognised by their
+output as well.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List
+
+from core.config import AppConfig
+from core.engine import Job, destination_for
+from core.tracks import backend_version
+
+logger = logging.getLogger("core.journal")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    source TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    state TEXT NOT NULL,
+    source_id TEXT,
+    output_id TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+# Journal states
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Method of jobs skipped because the journal says they are done
+RESUMED = "resumed"
+
+
+def file_id(path: Path) -> List[int] | None:
+    """Return ``[size, mtime_ns, inode]`` of ``path`` or ``None`` if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+def job_destination(job: Job, cfg: AppConfig) -> Path:
+    """Return the file ``job`` writes when run with ``cfg``."""
+    if cfg.replace_original:
+        return Path(job.source)
+    return destination_for(Path(job.source), cfg.output_dir)
+
+
+def fingerprint(job: Job, cfg: AppConfig) -> str:
+    """Return a digest of everything that determines the output of ``job``."""
+    selection = sorted(
+        (t.tid, t.removed, t.forced, t.default_audio, t.default_subtitle) for t in job.tracks
+    )
+    data = {
+        "source": str(Path(job.source).absolute()),
+        "destination": str(job_destination(job, cfg).absolute()),
+        "tracks": selection,
+        "wipe_all": job.wipe_all,
+        "backend": cfg.backend,
+        "version": backend_version(cfg),
+        # how the output is made: a flag patch, a clone or link, a remux
+        "inplace_flags": cfg.inplace_flags,
+        "noop_policy": cfg.noop_policy,
+        "replace": cfg.replace_original,
+        "backup": cfg.replace_original and cfg.backup_hours > 0,
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class JobJournal:
+    """SQLite journal of started and finished jobs.
+
+    Like :class:`~core.probe_cache.ProbeCache` the database is in WAL mode
+    and every thread uses its own connection.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._source_ids: dict[int, List[int] | None] = {}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _row(self, job: Job):
+        return self._conn().execute(
+            "SELECT fingerprint, destination, state, source_id, output_id FROM jobs"
+            " WHERE source=?",
+            (str(Path(job.source).absolute()),),
+        ).fetchone()
+
+    def _write(self, job: Job, cfg: AppConfig, state: str, source_id, output_id=None) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(Path(job.source).absolute()),
+                    fingerprint(job, cfg),
+                    str(job_destination(job, cfg).absolute()),
+                    state,
+                    json.dumps(source_id),
+                    json.dumps(output_id),
+                    time.time(),
+                ),
+            )
+
+    def is_done(self, job: Job, cfg: AppConfig | None = None) -> bool:
+        """Return ``True`` if ``job`` already produced its current output."""
+        cfg = cfg or job.config or AppConfig()
+        row = self._row(job)
+        if row is None or row[2] != DONE or row[0] != fingerprint(job, cfg):
+            return False
+        source_id, output_id = json.loads(row[3]), json.loads(row[4])
+        if output_id is None:  # nothing was written, e.g. a skipped no-op
+            return file_id(job.source) == source_id
+        dst = Path(row[1])
+        if file_id(dst) != output_id:
+            return False
+        return dst == Path(job.source).absolute() or file_id(job.source) == source_id
+
+    def started(self, job: Job, cfg: AppConfig | None = None) -> None:
+        source_id = file_id(job.source)
+        with self._lock:
+            # The source may be replaced by the time the job finishes
+            self._source_ids[job.id] = source_id
+        self._write(job, cfg or job.config or AppConfig(), RUNNING, source_id)
+
+    def finished(self, job: Job, cfg: AppConfig | None = None, ok: bool = True) -> None:
+        cfg = cfg or job.config or AppConfig()
+        with self._lock:
+            source_id = self._source_ids.pop(job.id, None) or file_id(job.source)
+        if not ok:
+            self._write(job, cfg, FAILED, source_id)
+            return
+        written = job.destination is not None and job.method != "skipped"
+        output_id = file_id(job.destination) if written else None
+        self._write(job, cfg, DONE, source_id, output_id)
+
+    def pending(self, jobs: Iterable[Job], cfg: AppConfig | None = None) -> List[Job]:
+        """Return the ``jobs`` that still need to run."""
+        return [job for job in jobs if not self.is_done(job, cfg)]
+
+    def counts(self) -> dict[str, int]:
+        rows = self._conn().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+        return dict(rows.fetchall())
+
+    def forget(self, sources: Iterable[Path]) -> None:
+        with self._conn() as conn:
+            conn.executemany(
+                "DELETE FROM jobs WHERE source=?",
+                [(str(Path(s).absolute()),) for s in sources],
+            )
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM jobs")
+
+    def wrap(self, execute: Callable[[Job], None]) -> Callable[[Job], None]:
+        """Return ``execute`` wrapped to skip finished jobs and record the others.
+
+        Skipped jobs get :data:`RESUMED` as their method.
+        """
+
+        def run(job: Job) -> None:
+            if self.is_done(job):
+                job.method = RESUMED
+                logger.info("%s was already processed, skipping", job.source)
+                return
+            self.started(job)
+            try:
+                execute(job)
+            except BaseException:
+                self.finished(job, ok=False)
+                raise
+            self.finished(job)
+
+        return run
+
+
+_journals: dict[str, JobJournal] = {}
+_journals_lock = threading.Lock()
+
+
+def run_journaled(job: Job, execute: Callable[[Job], None]) -> None:
+    """Run ``execute(job)``, recorded in the journal configured by ``job.config``."""
+    path = job.config.job_journal if job.config is not None else ""
+    if path:
+        open_journal(path).wrap(execute)(job)
+    else:
+        execute(job)
+
+
+def open_journal(path: Path | str) -> JobJournal:
+    """Return the shared :class:`JobJournal` for ``path``."""
+    key = os.path.abspath(path)
+    with _journals_lock:
+        journal = _journals.get(key)
+        if journal is None:
+            journal = _journals[key] = JobJournal(key)
+        return journal
+
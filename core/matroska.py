@@ -0,0 +1,272 @@
+"""Native Matroska header parsing without spawning external tools."""
+
+from __future__ import annotations
+
+import logging
+import mmap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List
+
+from core.ebml import (
+    EBMLError,
+    Element,
+    children,
+    iter_elements,
+    read_bytes,
+    read_element,
+    read_float,
+    read_string,
+    read_uint,
+)
+
+logger = logging.getLogger("core.matroska")
+
+# Bump when parsing changes so cached probe results are invalidated
+PARSER_VERSION = 1
+
+# Element IDs used by the parser
+EBML_ID = 0x1A45DFA3
+DOCTYPE_ID = 0x4282
+SEGMENT_ID = 0x18538067
+SEEKHEAD_ID = 0x114D9B74
+SEEK_ID = 0x4DBB
+SEEK_ID_ID = 0x53AB
+SEEK_POSITION_ID = 0x53AC
+INFO_ID = 0x1549A966
+TIMESTAMP_SCALE_ID = 0x2AD7B1
+DURATION_ID = 0x4489
+TRACKS_ID = 0x1654AE6B
+TRACK_ENTRY_ID = 0xAE
+TRACK_NUMBER_ID = 0xD7
+TRACK_UID_ID = 0x73C5
+TRACK_TYPE_ID = 0x83
+FLAG_ENABLED_ID = 0xB9
+FLAG_DEFAULT_ID = 0x88
+FLAG_FORCED_ID = 0x55AA
+NAME_ID = 0x536E
+LANGUAGE_ID = 0x22B59C
+LANGUAGE_IETF_ID = 0x22B59D
+CODEC_ID_ID = 0x86
+CLUSTER_ID = 0x1F43B675
+CUES_ID = 0x1C53BB6B
+CHAPTERS_ID = 0x1043A770
+ATTACHMENTS_ID = 0x1941A469
+TAGS_ID = 0x1254C367
+
+# Cluster children
+CLUSTER_TIMESTAMP_ID = 0xE7
+CLUSTER_POSITION_ID = 0xA7
+CLUSTER_PREV_SIZE_ID = 0xAB
+SIMPLE_BLOCK_ID = 0xA3
+BLOCK_GROUP_ID = 0xA0
+BLOCK_ID = 0xA1
+
+# Cues
+CUE_POINT_ID = 0xBB
+CUE_TRACK_POSITIONS_ID = 0xB7
+CUE_TRACK_ID = 0xF7
+CUE_CLUSTER_POSITION_ID = 0xF1
+CUE_RELATIVE_POSITION_ID = 0xF0
+CUE_BLOCK_NUMBER_ID = 0x5378
+CUE_REFERENCE_ID = 0xDB
+
+# Tags
+TAG_ID = 0x7373
+TARGETS_ID = 0x63C0
+TAG_TRACK_UID_ID = 0x63C5
+
+SUPPORTED_DOCTYPES = {"matroska", "webm"}
+
+TRACK_TYPES = {1: "video", 2: "audio", 17: "subtitles", 18: "buttons"}
+
+
+class MatroskaError(ValueError):
+    """Raised when a file cannot be handled by the native parser."""
+
+
+@dataclass
+class TrackEntry:
+    """Raw values of a ``TrackEntry`` element."""
+
+    number: int
+    uid: int
+    type_code: int
+    codec_id: str
+    language: str
+    name: str
+    flag_default: bool
+    flag_forced: bool
+    flag_enabled: bool
+    element: Element
+    # Direct children keyed by element ID, used for in-place edits
+    fields: dict[int, Element] = field(default_factory=dict)
+
+    @property
+    def type(self) -> str:
+        return TRACK_TYPES.get(self.type_code, "")
+
+
+@dataclass
+class SegmentLayout:
+    """Positions and values of the header elements of a Matroska file."""
+
+    doc_type: str
+    segment: Element
+    tracks: Element
+    entries: List[TrackEntry]
+    info: Element | None = None
+    duration: float | None = None  # seconds
+    seek_positions: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def segment_data(self) -> int:
+        """Offset that ``SeekPosition`` values are relative to."""
+        return self.segment.data_start
+
+
+def _parse_seekhead(buf, el: Element) -> dict[int, int]:
+    positions: dict[int, int] = {}
+    for seek in children(buf, el):
+        if seek.id != SEEK_ID:
+            continue
+        target = pos = None
+        for child in children(buf, seek):
+            if child.id == SEEK_ID_ID:
+                target = int.from_bytes(read_bytes(buf, child), "big")
+            elif child.id == SEEK_POSITION_ID:
+                pos = read_uint(buf, child)
+        if target is not None and pos is not None:
+            positions.setdefault(target, pos)
+    return positions
+
+
+def _parse_info(buf, el: Element) -> float | None:
+    scale = 1_000_000
+    duration = None
+    for child in children(buf, el):
+        if child.id == TIMESTAMP_SCALE_ID:
+            scale = read_uint(buf, child)
+        elif child.id == DURATION_ID:
+            duration = read_float(buf, child)
+    if duration is None:
+        return None
+    return duration * scale / 1_000_000_000
+
+
+def _parse_track_entry(buf, el: Element) -> TrackEntry:
+    fields: dict[int, Element] = {}
+    for child in children(buf, el):
+        fields.setdefault(child.id, child)
+
+    def uint(el_id: int, default: int) -> int:
+        return read_uint(buf, fields[el_id]) if el_id in fields else default
+
+    def text(el_id: int, default: str) -> str:
+        return read_string(buf, fields[el_id]) if el_id in fields else default
+
+    language = text(LANGUAGE_ID, "") or text(LANGUAGE_IETF_ID, "") or "eng"
+    return TrackEntry(
+        number=uint(TRACK_NUMBER_ID, 0),
+        uid=uint(TRACK_UID_ID, 0),
+        type_code=uint(TRACK_TYPE_ID, 0),
+        codec_id=text(CODEC_ID_ID, ""),
+        language=language,
+        name=text(NAME_ID, ""),
+        flag_default=bool(uint(FLAG_DEFAULT_ID, 1)),
+        flag_forced=bool(uint(FLAG_FORCED_ID, 0)),
+        flag_enabled=bool(uint(FLAG_ENABLED_ID, 1)),
+        element=el,
+        fields=fields,
+    )
+
+
+def _element_at(buf, pos: int, expected: int) -> Element:
+    el = read_element(buf, pos)
+    if el.id != expected:
+        raise MatroskaError(f"SeekHead points to {el.id:#x} instead of {expected:#x}")
+    return el
+
+
+def parse_layout(buf) -> SegmentLayout:
+    """Parse the header elements from the start of ``buf``.
+
+    Only the EBML header, SeekHead, Info and Tracks elements are read, so
+    for the usual layout just the first few kilobytes are touched.
+    """
+    try:
+        header = read_element(buf, 0)
+        if header.id != EBML_ID or header.end is None:
+            raise MatroskaError("Not an EBML file")
+        doc_type = "matroska"
+        for child in children(buf, header):
+            if child.id == DOCTYPE_ID:
+                doc_type = read_string(buf, child)
+        if doc_type not in SUPPORTED_DOCTYPES:
+            raise MatroskaError(f"Unsupported DocType {doc_type!r}")
+
+        segment = None
+        for el in iter_elements(buf, header.end):
+            if el.id == SEGMENT_ID:
+                segment = el
+                break
+        if segment is None:
+            raise MatroskaError("No Segment element")
+
+        seek_positions: dict[int, int] = {}
+        info = tracks = None
+        for el in iter_elements(buf, segment.data_start, segment.end):
+            if el.id == SEEKHEAD_ID and el.end is not None:
+                for key, pos in _parse_seekhead(buf, el).items():
+                    seek_positions.setdefault(key, pos)
+            elif el.id == INFO_ID:
+                info = el
+            elif el.id == TRACKS_ID:
+                tracks = el
+            elif el.id == CLUSTER_ID:
+                break
+            if info is not None and tracks is not None:
+                break
+            if el.end is None:
+                break
+
+        if tracks is None and TRACKS_ID in seek_positions:
+            tracks = _element_at(buf, segment.data_start + seek_positions[TRACKS_ID], TRACKS_ID)
+        if info is None and INFO_ID in seek_positions:
+            info = _element_at(buf, segment.data_start + seek_positions[INFO_ID], INFO_ID)
+        if tracks is None:
+            raise MatroskaError("No Tracks element")
+        if tracks.end is None or tracks.end > len(buf):
+            raise MatroskaError("Tracks element is truncated")
+
+        entries = [
+            _parse_track_entry(buf, el)
+            for el in children(buf, tracks)
+            if el.id == TRACK_ENTRY_ID
+        ]
+        duration = None
+        if info is not None and info.end is not None and info.end <= len(buf):
+            duration = _parse_info(buf, info)
+    except EBMLError as exc:
+        raise MatroskaError(str(exc)) from exc
+    return SegmentLayout(
+        doc_type=doc_type,
+        segment=segment,
+        tracks=tracks,
+        entries=entries,
+        info=info,
+        duration=duration,
+        seek_positions=seek_positions,
+    )
+
+
+def read_layout(path: Path) -> SegmentLayout:
+    """Parse the Matroska header of ``path`` using a read-only mmap."""
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:  # empty file
+            raise MatroskaError(f"{path} is empty") from exc
+        with mm:
+            return parse_layout(mm)
+
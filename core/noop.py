@@ -0,0 +1,120 @@
+"""Handle jobs whose output would be identical to their source.
+
+A job that keeps every track and leaves all default/forced flags as they
+are in the file does not need a remux. Depending on ``noop_policy`` it is
+skipped or its output is produced by the cheapest available way of
+duplicating the source:
+
+``reflink``
+    share the data blocks with the source (``FICLONE`` on Btrfs, XFS and
+    other copy-on-write filesystems), falling back to ``copy``
+``hardlink``
+    a second name for the source, falling back to ``reflink``
+``copy``
+    a kernel-side ``copy_file_range`` copy, falling back to a plain copy
+``skip``
+    write nothing
+``remux``
+    treat the job like any other
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+
+logger = logging.getLogger("core.noop")
+
+NOOP_POLICIES = ("reflink", "hardlink", "copy", "skip", "remux")
+
+# ioctl number of FICLONE from <linux/fs.h>
+FICLONE = 0x40049409
+COPY_CHUNK = 1 << 30
+
+
+def is_noop(tracks) -> bool:
+    """Return ``True`` if applying ``tracks`` would not change the file.
+
+    Flags are compared like :func:`core.inplace.wanted_flags` sets them:
+    the default flag of audio tracks and the default and forced flags of
+    subtitle tracks.
+    """
+    for t in tracks:
+        if t.removed:
+            return False
+        if t.type == "audio" and t.default_audio != t.orig_default_audio:
+            return False
+        if t.type == "subtitles" and (
+            t.default_subtitle != t.orig_default_subtitle or t.forced != t.orig_forced
+        ):
+            return False
+    return True
+
+
+def reflink(source: Path, destination: Path) -> bool:
+    """Clone ``source`` to ``destination`` sharing its blocks; ``False`` if unsupported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as exc:
+            logger.debug("Reflink of %s failed: %s", source, exc)
+            return False
+    return True
+
+
+def kernel_copy(source: Path, destination: Path) -> None:
+    """Copy ``source`` with ``copy_file_range`` where available."""
+    if not hasattr(os, "copy_file_range"):
+        shutil.copyfile(source, destination)
+        return
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        size = os.fstat(src.fileno()).st_size
+        offset = 0
+        try:
+            while offset < size:
+                copied = os.copy_file_range(
+                    src.fileno(), dst.fileno(), min(COPY_CHUNK, size - offset), offset, offset
+                )
+                if copied == 0:
+                    break
+                offset += copied
+        except OSError as exc:
+            logger.debug("copy_file_range of %s failed: %s", source, exc)
+            dst.seek(offset)
+            src.seek(offset)
+            shutil.copyfileobj(src, dst)
+            return
+        if offset < size:
+            dst.seek(offset)
+            src.seek(offset)
+            shutil.copyfileobj(src, dst)
+
+
+def clone_file(source: Path, destination: Path, policy: str = "reflink") -> str:
+    """Make ``destination`` a duplicate of ``source`` following ``policy``.
+
+    An existing ``destination`` is unlinked first, so a previous hard link
+    to the source is never written through. Returns how the duplicate was
+    made: ``"hardlink"``, ``"reflink"`` or ``"copy"``.
+    """
+    source, destination = Path(source), Path(destination)
+    if source.absolute() == destination.absolute():
+        raise ValueError(f"Cannot clone {source} onto itself")
+    destination.unlink(missing_ok=True)
+    if policy == "hardlink":
+        try:
+            os.link(source, destination)
+            return "hardlink"
+        except OSError as exc:
+            logger.debug("Hard link of %s failed: %s", source, exc)
+    if policy in ("hardlink", "reflink") and reflink(source, destination):
+        return "reflink"
+    kernel_copy(source, destination)
+    return "copy"
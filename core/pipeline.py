@@ -0,0 +1,245 @@
+"""Stream large batches through probe, plan and execute stages.
+
+Instead of building every job up front, sources are pulled from an
+iterable as the stages make room for them::
+
+    sources -> probe (N threads) -> queue -> plan (M threads) -> queue -> engine
+
+Every queue is bounded, so a stage that falls behind holds back the ones
+before it and memory stays flat no matter how long the batch is. The
+execute stage is a :class:`~core.engine.ProcessingEngine` fed through
+:meth:`~core.engine.ProcessingEngine.wait_for_room`, which keeps its
+scheduler, per-device limits, pause and cancel working while upcoming files
+are probed behind the running remuxes. Finished jobs are handed to a
+callback and then forgotten.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, List
+
+from core.engine import CANCELLED, DONE, FAILED, Job, ProcessingEngine
+from core.tracks import Track
+
+logger = logging.getLogger("core.pipeline")
+
+# Jobs waiting between two stages
+QUEUE_SIZE = 64
+
+_END = object()
+
+
+@dataclass
+class PipelineStats:
+    """Counts of a finished :meth:`Pipeline.run`."""
+
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    reused_probes: int = 0
+
+
+class _Stage:
+    """``workers`` threads applying ``func`` to items from ``inbox``.
+
+    Results go to ``outbox``; jobs whose ``func`` raises or that arrive
+    after ``cancelled`` was set are handed to ``on_error`` instead. The
+    stage puts one end marker into ``outbox`` after its last worker saw the
+    end of ``inbox``.
+    """
+
+    def __init__(self, name, func, workers, inbox, outbox, on_error, cancelled):
+        self.name = name
+        self._func = func
+        self._cancelled = cancelled
+        self._inbox = inbox
+        self._outbox = outbox
+        self._on_error = on_error
+        self._remaining = max(1, workers)
+        self._lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(self._remaining)
+        ]
+
+    def start(self) -> None:
+        for t in self.threads:
+            t.start()
+
+    def _work(self) -> None:
+        while True:
+            item = self._inbox.get()
+            if item is _END:
+                self._inbox.put(_END)  # let the other workers see it too
+                with self._lock:
+                    self._remaining -= 1
+                    last = self._remaining == 0
+                if last:
+                    self._outbox.put(_END)
+                return
+            job, payload = item
+            if self._cancelled.is_set():
+                job.state = CANCELLED
+                job.finished = time.time()
+                self._on_error(job)
+                continue
+            try:
+                result = self._func(job, payload)
+            except Exception as exc:
+                logger.error("%s of %s failed: %s", self.name.capitalize(), job.source, exc)
+                job.error = str(exc) or exc.__class__.__name__
+                job.state = FAILED
+                job.finished = time.time()
+                self._on_error(job)
+                continue
+            self._outbox.put((job, result))
+
+
+class Pipeline:
+    """Run jobs from an iterable through probe, plan and execute stages.
+
+    ``probe(job)`` returns the real tracks of the job's source and
+    ``plan(job, tracks)`` the tracks to write (it also sets
+    ``job.destination``). Both run on their own worker threads before the
+    job is submitted to ``engine``, whose ``execute`` finds the result in
+    ``job.planned_tracks``. At most ``queue_size`` jobs wait between two
+    stages and in the engine's queue.
+    """
+
+    def __init__(
+        self,
+        engine: ProcessingEngine,
+        probe: Callable[[Job], List[Track]],
+        plan: Callable[[Job, List[Track]], List[Track]],
+        probe_workers: int = 4,
+        plan_workers: int = 1,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        self.engine = engine
+        self._probe = probe
+        self._plan = plan
+        self.probe_workers = probe_workers
+        self.plan_workers = plan_workers
+        self.queue_size = max(1, queue_size)
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._finished: List[Job] = []
+
+    def cancel(self) -> None:
+        """Stop taking sources, drop waiting jobs and cancel running ones."""
+        self._cancelled.set()
+        self.engine.cancel_all()
+
+    def _early_finish(self, job: Job) -> None:
+        with self._lock:
+            self._finished.append(job)
+
+    def _feed(self, jobs: Iterable[Job], inbox: queue.Queue, stats: PipelineStats) -> None:
+        try:
+            for job in jobs:
+                if self._cancelled.is_set():
+                    break
+                stats.total += 1
+                inbox.put((job, None))
+        except Exception as exc:
+            logger.error("Reading the job sources failed: %s", exc)
+        finally:
+            inbox.put(_END)
+
+    def _submit(self, planned: queue.Queue) -> None:
+        while True:
+            item = planned.get()
+            if item is _END:
+                return
+            job, tracks = item
+            if self._cancelled.is_set():
+                job.state = CANCELLED
+                job.finished = time.time()
+                self._early_finish(job)
+                continue
+            job.planned_tracks = tracks
+            self.engine.wait_for_room(self.queue_size)
+            try:
+                self.engine.submit([job])
+            except RuntimeError:  # engine shut down underneath us
+                job.planned_tracks = None
+                job.state = CANCELLED
+                job.finished = time.time()
+                self._early_finish(job)
+
+    def run(
+        self,
+        jobs: Iterable[Job],
+        on_finished: Callable[[Job], None] | None = None,
+        poll: float = 0.1,
+    ) -> PipelineStats:
+        """Process ``jobs`` and block until all of them finished.
+
+        ``on_finished`` is called from this thread for every finished job,
+        including jobs that failed in the probe or plan stage.
+        """
+        stats = PipelineStats()
+        sources: queue.Queue = queue.Queue(self.queue_size)
+        probed: queue.Queue = queue.Queue(self.queue_size)
+        planned: queue.Queue = queue.Queue(self.queue_size)
+        stages = [
+            _Stage(
+                "probe",
+                lambda job, _: self._probe(job),
+                self.probe_workers,
+                sources,
+                probed,
+                self._early_finish,
+                self._cancelled,
+            ),
+            _Stage(
+                "plan",
+                self._plan,
+                self.plan_workers,
+                probed,
+                planned,
+                self._early_finish,
+                self._cancelled,
+            ),
+        ]
+        feeder = threading.Thread(
+            target=self._feed, args=(jobs, sources, stats), name="pipeline-source", daemon=True
+        )
+        submitter = threading.Thread(
+            target=self._submit, args=(planned,), name="pipeline-submit", daemon=True
+        )
+        feeder.start()
+        for stage in stages:
+            stage.start()
+        submitter.start()
+
+        def collect() -> None:
+            self.engine.take_changes()  # nobody else polls this engine
+            with self._lock:
+                finished, self._finished = self._finished, []
+            finished.extend(self.engine.clear_finished())
+            for job in finished:
+                if job.state == DONE:
+                    stats.done += 1
+                elif job.state == FAILED:
+                    stats.failed += 1
+                else:
+                    stats.cancelled += 1
+                stats.reused_probes += job.reused_probe
+                if on_finished is not None:
+                    on_finished(job)
+
+        while submitter.is_alive():
+            submitter.join(poll)
+            collect()
+        while not self.engine.wait(poll):
+            collect()
+        feeder.join()
+        collect()
+        return stats
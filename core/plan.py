@@ -0,0 +1,292 @@
+"""Dry-run planning of a batch and execution of saved plans.
+
+:func:`make_plan` probes the sources of a batch in parallel and works out
+for every file what a run would do: how it is processed, the backend
+command, where the output goes and roughly how many bytes are read and
+written. No media file is touched: a source with an interrupted flag
+edit is reported instead of rolled back, and only the probe cache, if
+configured, is written. Outputs that would overwrite each other or an
+input of the same batch are reported as collisions.
+
+Plans are stored as JSON Lines (one :class:`PlanEntry` per line) or as a
+JSON list. :func:`plan_to_jobs` turns a saved plan back into engine jobs
+that run exactly the stored decisions; :func:`execute_plan_job` is the
+matching ``execute`` callback for :class:`~core.engine.ProcessingEngine`.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Iterable, List
+
+from core.config import AppConfig
+from core.engine import Job, job_checkpoint, plan_job, resolve_tracks, run_job
+from core.inplace import is_flag_only, journal_path, plan_file_patch
+from core.matroska import MatroskaError
+from core.noop import is_noop
+from core.progress import JobProgress
+from core.remux import remux_file
+from core.replace import temp_path
+from core.scheduler import source_size
+from core.tracks import Track, build_cmd, file_stamp, query_tracks, run_command
+
+logger = logging.getLogger("core.plan")
+
+PLAN_VERSION = 1
+# Outputs can be a little larger than their source
+_OVERHEAD = 1.01
+
+
+@dataclass
+class PlanEntry:
+    """What a run would do with one source file."""
+
+    source: str
+    destination: str
+    backend: str = ""
+    method: str = ""  # "remux", "native", "flags" or "noop"
+    command: List[str] | None = None  # external backend command, if any
+    tracks: List[dict] = field(default_factory=list)  # planned Track fields
+    wipe_all: bool = False
+    replace: bool = False
+    noop_policy: str = "remux"
+    bytes_read: int = 0
+    bytes_written: int = 0
+    stamp: List[int] | None = None  # (size, mtime_ns) of the source when planned
+    exists: bool = False  # the destination already exists and is overwritten
+    collision: str = ""
+    error: str = ""
+    version: int = PLAN_VERSION
+
+    @property
+    def ok(self) -> bool:
+        return not self.error and not self.collision
+
+
+def _method(job: Job, tracks: List[Track], cfg: AppConfig) -> tuple[str, int, int]:
+    """Return the processing method and estimated bytes read and written."""
+    size = source_size(job)
+    if cfg.noop_policy != "remux" and is_noop(tracks):
+        if cfg.replace_original or cfg.noop_policy in ("skip", "hardlink", "reflink"):
+            # a reflink may fall back to a copy on some filesystems
+            return "noop", 0, 0
+        return "noop", size, size
+    if cfg.inplace_flags and is_flag_only(tracks):
+        try:
+            patch = plan_file_patch(job.source, tracks)
+        except (MatroskaError, OSError):
+            patch = False
+        if patch is not False:
+            header = len(patch.data) if patch else 0
+            if cfg.replace_original:
+                return "flags", header, header
+            return "flags", size + header, size
+    method = "native" if cfg.backend == "native" else "remux"
+    return method, size, int(size * _OVERHEAD)
+
+
+def plan_entry(job: Job, cfg: AppConfig, probe=None, select=None) -> PlanEntry:
+    """Plan ``job`` without touching its source or output.
+
+    ``probe(source)`` returns the real tracks; it defaults to the
+    configured backend's :func:`~core.tracks.query_tracks`. An optional
+    ``select(job, real_tracks)`` fills in ``job.tracks`` before planning.
+    Unlike :func:`~core.engine.probe_job` an interrupted flag edit is not
+    rolled back; the entry reports it as an error.
+    """
+    probe = probe or (lambda src: query_tracks(src, cfg))
+    entry = _new_entry(job, cfg)
+    if _pending_patch(job, entry):
+        return entry
+    try:
+        real_tracks, job.reused_probe = resolve_tracks(job.source, job.probe, probe)
+        if select is not None:
+            select(job, real_tracks)
+    except Exception as exc:
+        entry.error = str(exc) or exc.__class__.__name__
+        return entry
+    return entry_for(job, real_tracks, cfg)
+
+
+def _pending_patch(job: Job, entry: PlanEntry) -> bool:
+    """Set ``entry.error`` if a flag edit of the source was interrupted."""
+    if not journal_path(Path(job.source)).exists():
+        return False
+    entry.error = "An interrupted flag edit is pending; a run rolls it back first"
+    return True
+
+
+def _new_entry(job: Job, cfg: AppConfig) -> PlanEntry:
+    return PlanEntry(
+        str(job.source),
+        "",
+        backend=cfg.backend,
+        wipe_all=job.wipe_all,
+        replace=cfg.replace_original,
+        noop_policy=cfg.noop_policy,
+    )
+
+
+def entry_for(job: Job, real_tracks: List[Track], cfg: AppConfig) -> PlanEntry:
+    """Plan ``job`` for its already probed ``real_tracks``."""
+    entry = _new_entry(job, cfg)
+    if _pending_patch(job, entry):
+        return entry
+    try:
+        tracks = plan_job(job, real_tracks, cfg.output_dir, cfg.replace_original, create_dirs=False)
+    except Exception as exc:
+        entry.error = str(exc) or exc.__class__.__name__
+        return entry
+    dst = job.destination
+    entry.destination = str(dst)
+    entry.exists = not cfg.replace_original and dst.exists()
+    stamp = file_stamp(job.source)
+    entry.stamp = list(stamp) if stamp else None
+    entry.tracks = [asdict(t) for t in tracks]
+    entry.method, entry.bytes_read, entry.bytes_written = _method(job, tracks, cfg)
+    if cfg.backend != "native":
+        out = temp_path(dst) if cfg.replace_original else dst
+        entry.command = [
+            str(c)
+            for c in build_cmd(job.source, out, copy.deepcopy(tracks), cfg, False, job.wipe_all)
+        ]
+    return entry
+
+
+def find_collisions(entries: List[PlanEntry]) -> int:
+    """Mark entries whose output clashes with another entry; return how many.
+
+    Entries clash when they write the same path or when one writes over
+    a source of the batch, its own included, outside of replace mode.
+    """
+    by_output: dict[str, List[PlanEntry]] = defaultdict(list)
+    for e in entries:
+        if e.destination and not e.replace:
+            by_output[str(Path(e.destination).absolute())].append(e)
+    sources = {str(Path(e.source).absolute()): e for e in entries}
+    marked = 0
+    for path, group in by_output.items():
+        if len(group) > 1:
+            names = ", ".join(e.source for e in group)
+            for e in group:
+                e.collision = f"{len(group)} sources write {path}: {names}"
+                marked += 1
+        other = sources.get(path)
+        if other is not None:
+            for e in group:
+                if not e.collision:
+                    e.collision = f"Output overwrites the source {other.source}"
+                    marked += 1
+    return marked
+
+
+def make_plan(
+    jobs: Iterable[Job], cfg: AppConfig, workers: int = 8, probe=None, select=None
+) -> List[PlanEntry]:
+    """Plan ``jobs`` on ``workers`` threads and detect collisions."""
+    jobs = list(jobs)
+    with ThreadPoolExecutor(max(1, workers), thread_name_prefix="plan") as pool:
+        entries = list(pool.map(lambda job: plan_entry(job, cfg, probe, select), jobs))
+    find_collisions(entries)
+    return entries
+
+
+def summarize(entries: List[PlanEntry]) -> dict:
+    methods: dict[str, int] = defaultdict(int)
+    for e in entries:
+        if e.ok:
+            methods[e.method] += 1
+    return {
+        "files": len(entries),
+        "methods": dict(methods),
+        "bytes_read": sum(e.bytes_read for e in entries if e.ok),
+        "bytes_written": sum(e.bytes_written for e in entries if e.ok),
+        "collisions": sum(bool(e.collision) for e in entries),
+        "errors": sum(bool(e.error) for e in entries),
+    }
+
+
+def write_plan(entries: Iterable[PlanEntry], fh: IO[str], fmt: str = "jsonl") -> None:
+    """Write ``entries`` to ``fh`` as JSON Lines or, with ``fmt="json"``, a list."""
+    if fmt == "json":
+        json.dump([asdict(e) for e in entries], fh, indent=1)
+        fh.write("\n")
+        return
+    for e in entries:
+        fh.write(json.dumps(asdict(e), separators=(",", ":")) + "\n")
+
+
+def read_plan(fh: IO[str]) -> List[PlanEntry]:
+    """Read a plan written by :func:`write_plan` in either format."""
+    text = fh.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        items = json.loads(stripped)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    entries = []
+    for item in items:
+        if item.get("version", PLAN_VERSION) > PLAN_VERSION:
+            raise ValueError(f"Plan version {item['version']} is not supported")
+        entries.append(PlanEntry(**item))
+    return entries
+
+
+def plan_to_jobs(entries: Iterable[PlanEntry], cfg: AppConfig | None = None) -> List[Job]:
+    """Turn runnable plan entries into jobs for :func:`execute_plan_job`."""
+    jobs = []
+    for e in entries:
+        if not e.ok:
+            continue
+        job = Job(Path(e.source), [], wipe_all=e.wipe_all, config=cfg)
+        job.set_destination(e.destination)
+        job.planned_tracks = [Track(**t) for t in e.tracks]
+        job.plan = e
+        jobs.append(job)
+    return jobs
+
+
+def execute_plan_job(job: Job) -> None:
+    """Run a job created by :func:`plan_to_jobs` as it was planned.
+
+    Fails if the source changed since the plan was made.
+    """
+    entry: PlanEntry = job.plan
+    stamp = file_stamp(job.source)
+    if entry.stamp is not None and (stamp is None or list(stamp) != list(entry.stamp)):
+        raise RuntimeError(f"{job.source} changed since the plan was made")
+    job.progress = JobProgress(total_bytes=stamp[0] if stamp else 0)
+    if not entry.replace:
+        job.destination.parent.mkdir(parents=True, exist_ok=True)
+    remux = None
+    if entry.backend == "native":
+        checkpoint = job_checkpoint(job)
+
+        def remux(src, dst, tracks):
+            remux_file(src, dst, tracks, checkpoint=checkpoint)
+
+    def planned_cmd(*args, **kwargs):
+        if entry.command is None:
+            raise RuntimeError(f"Plan for {job.source} has no command")
+        return list(entry.command)
+
+    cfg = job.config or AppConfig()
+    run_job(
+        job,
+        None,
+        planned_cmd,
+        run_command,
+        None,
+        inplace=entry.method == "flags",
+        remux=remux,
+        replace=entry.replace,
+        backup=cfg.backup_hours > 0,
+        noop=entry.noop_policy if entry.method == "noop" else "remux",
+    )
+    job.progress.finish()
@@ -0,0 +1,205 @@
+"""Persistent SQLite cache for track probe results."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, NamedTuple
+
+logger = logging.getLogger("core.probe_cache")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS probes (
+    path TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    tool_version TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    tracks TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (path, backend, tool_version)
+);
+CREATE INDEX IF NOT EXISTS probes_last_used ON probes (last_used);
+"""
+
+# Number of inserts between two checks of the size limit
+_EVICT_INTERVAL = 100
+
+
+class CacheKey(NamedTuple):
+    """Identity of a probed file."""
+
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    backend: str
+    tool_version: str
+
+
+def file_key(path: Path, backend: str, tool_version: str) -> CacheKey:
+    """Build the cache key for ``path`` from a single ``stat`` call."""
+    path = Path(path).absolute()
+    st = path.stat()
+    return CacheKey(str(path), st.st_size, st.st_mtime_ns, st.st_ino, backend, tool_version)
+
+
+class ProbeCache:
+    """Store serialized :class:`~core.tracks.Track` lists keyed by file identity.
+
+    The database uses WAL mode so several worker threads or processes can
+    read it while another one writes. Each thread gets its own connection.
+    Once more than ``max_entries`` rows exist the least recently used ones
+    are evicted.
+    """
+
+    def __init__(self, path: Path | str, max_entries: int = 100_000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._inserts = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: CacheKey) -> List | None:
+        """Return the cached tracks for ``key`` or ``None`` on a miss."""
+        from core.tracks import Track
+
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT tracks FROM probes WHERE path=? AND backend=? AND tool_version=?"
+            " AND size=? AND mtime_ns=? AND inode=?",
+            (key.path, key.backend, key.tool_version, key.size, key.mtime_ns, key.inode),
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with conn:
+            conn.execute(
+                "UPDATE probes SET last_used=? WHERE path=? AND backend=? AND tool_version=?",
+                (time.time(), key.path, key.backend, key.tool_version),
+            )
+        return [Track(**d) for d in json.loads(row[0])]
+
+    def put(self, key: CacheKey, tracks: List) -> None:
+        """Store ``tracks`` for ``key`` replacing older entries for the file."""
+        data = json.dumps([asdict(t) for t in tracks])
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key.path,
+                    key.backend,
+                    key.tool_version,
+                    key.size,
+                    key.mtime_ns,
+                    key.inode,
+                    data,
+                    time.time(),
+                ),
+            )
+        with self._lock:
+            self._inserts += 1
+            evict = self._inserts % _EVICT_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop least recently used rows above ``max_entries``."""
+        conn = self._conn()
+        with conn:
+            count = conn.execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return 0
+            conn.execute(
+                "DELETE FROM probes WHERE rowid IN "
+                "(SELECT rowid FROM probes ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        logger.debug("Evicted %d probe cache entries", excess)
+        return excess
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM probes").fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def clear(self) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM probes")
+
+
+_caches: dict[str, ProbeCache] = {}
+_caches_lock = threading.Lock()
+_broken: set[str] = set()
+
+# Raised by a corrupt, locked or unwritable cache file
+CACHE_ERRORS = (sqlite3.Error, OSError)
+
+
+def open_cache(path: Path | str, max_entries: int = 100_000) -> ProbeCache:
+    """Return the shared :class:`ProbeCache` for ``path``."""
+    key = os.path.abspath(path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = ProbeCache(key, max_entries)
+        cache.max_entries = max_entries
+        return cache
+
+
+def usable_cache(path: Path | str, max_entries: int = 100_000) -> ProbeCache | None:
+    """Return the cache for ``path``, or ``None`` if it cannot be used.
+
+    A cache that failed once is skipped for the rest of the process so
+    probing carries on uncached.
+    """
+    if os.path.abspath(path) in _broken:
+        return None
+    try:
+        return open_cache(path, max_entries)
+    except CACHE_ERRORS as exc:
+        cache_failed(path, exc)
+        return None
+
+
+def cache_failed(path: Path | str, exc: Exception) -> None:
+    """Stop using the cache at ``path`` after ``exc``, logging it once."""
+    key = os.path.abspath(path)
+    with _caches_lock:
+        if key in _broken:
+            return
+        _broken.add(key)
+    logger.warning("Probe cache %s is unusable, probing without it: %s", key, exc)
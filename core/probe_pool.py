@@ -0,0 +1,94 @@
+"""Probe many files concurrently and hand the results over in batches."""
+
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, List, NamedTuple
+
+logger = logging.getLogger("core.probe_pool")
+
+
+class ProbeOutcome(NamedTuple):
+    """Result of probing a single file."""
+
+    path: Path
+    result: object | None  # ProbeResult on success
+    error: Exception | None
+
+
+class ProbePool:
+    """Run ``probe`` for many paths on a bounded thread pool.
+
+    Finished probes are queued and collected with :meth:`drain`, which is
+    meant to be polled from the GUI thread. Nothing in here touches Qt.
+    """
+
+    def __init__(self, probe: Callable[[Path], object], max_workers: int = 4):
+        self._probe = probe
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="probe"
+        )
+        self._results: queue.SimpleQueue[ProbeOutcome] = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self.total = 0
+        self.finished = 0
+
+    def submit(self, paths: Iterable[Path]) -> int:
+        """Queue ``paths`` for probing and return how many were added."""
+        added = 0
+        with self._lock:
+            if self._cancelled:
+                return 0
+            for p in paths:
+                path = Path(p)
+                self._executor.submit(self._run, path)
+                added += 1
+            self.total += added
+        return added
+
+    def _run(self, path: Path) -> None:
+        try:
+            outcome = ProbeOutcome(path, self._probe(path), None)
+        except Exception as exc:
+            logger.debug("Probe of %s failed: %s", path, exc)
+            outcome = ProbeOutcome(path, None, exc)
+        if not self._cancelled:
+            self._results.put(outcome)
+
+    def drain(self, limit: int | None = None) -> List[ProbeOutcome]:
+        """Return up to ``limit`` finished probes without blocking.
+
+        Nothing is returned after :meth:`cancel`, including probes that
+        finished before it but were not drained yet.
+        """
+        out: List[ProbeOutcome] = []
+        if self._cancelled:
+            return out
+        while limit is None or len(out) < limit:
+            try:
+                out.append(self._results.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            self.finished += len(out)
+        return out
+
+    @property
+    def done(self) -> bool:
+        """``True`` once every submitted path has been drained."""
+        with self._lock:
+            return self._cancelled or self.finished >= self.total
+
+    def cancel(self) -> None:
+        """Drop pending probes and discard results of running ones."""
+        with self._lock:
+            self._cancelled = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
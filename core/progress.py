@@ -0,0 +1,145 @@
+"""Progress tracking for running backend processes."""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Iterable
+
+# Seconds without any progress report after which a job counts as stalled
+STALL_SECONDS = 30.0
+
+
+@dataclass
+class JobProgress:
+    """Progress of a single job.
+
+    ``total_bytes`` is the size of the source file; ``bytes_done`` is the
+    amount of it processed so far. Values are written by the worker thread
+    and only read elsewhere.
+    """
+
+    total_bytes: int = 0
+    bytes_done: int = 0
+    percent: float = 0.0
+    started: float = field(default_factory=lambda: time.monotonic())
+    updated: float = field(default_factory=lambda: time.monotonic())
+    finished: float | None = None
+
+    def update(self, percent: float | None = None, bytes_done: int | None = None) -> None:
+        """Record a new progress report from the backend."""
+        if percent is not None:
+            self.percent = max(self.percent, min(percent, 100.0))
+            if bytes_done is None and self.total_bytes:
+                bytes_done = int(self.total_bytes * self.percent / 100)
+        if bytes_done is not None:
+            self.bytes_done = max(self.bytes_done, bytes_done)
+            if percent is None and self.total_bytes:
+                self.percent = max(
+                    self.percent, min(100.0, self.bytes_done * 100 / self.total_bytes)
+                )
+        self.updated = time.monotonic()
+
+    def finish(self) -> None:
+        self.update(100.0, self.total_bytes or self.bytes_done)
+        self.finished = self.updated
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """Average throughput in bytes per second."""
+        elapsed = self.elapsed
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.rate / 1_000_000
+
+    @property
+    def eta(self) -> float | None:
+        """Estimated seconds until the job finishes or ``None`` if unknown."""
+        if self.finished is not None:
+            return 0.0
+        if self.percent <= 0:
+            return None
+        return self.elapsed * (100.0 - self.percent) / self.percent
+
+    @property
+    def stalled(self) -> bool:
+        return self.finished is None and time.monotonic() - self.updated > STALL_SECONDS
+
+
+class FFmpegProgressParser:
+    """Parse ``ffmpeg -progress`` key/value output.
+
+    Percentages come from ``out_time_us`` when the duration is known and
+    from the number of bytes written otherwise.
+    """
+
+    def __init__(self, progress: JobProgress, duration: float | None = None):
+        self.progress = progress
+        self.duration = duration
+        self._block: dict[str, str] = {}
+
+    def feed(self, line: str) -> None:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            return
+        self._block[key] = value
+        if key == "progress":
+            self._commit()
+
+    def _commit(self) -> None:
+        block, self._block = self._block, {}
+        percent = None
+        out_us = block.get("out_time_us") or block.get("out_time_ms")
+        if self.duration and out_us and out_us.lstrip("-").isdigit():
+            percent = int(out_us) / 1_000_000 / self.duration * 100
+        size = block.get("total_size", "")
+        bytes_done = int(size) if size.isdigit() else None
+        if percent is not None and bytes_done is not None:
+            # Written bytes lag behind the source for stream copies; the
+            # time based percentage is the better measure of input consumed.
+            bytes_done = None
+        self.progress.update(percent, bytes_done)
+
+
+class MkvmergeProgressParser:
+    """Parse the ``#GUI#progress`` lines printed by ``mkvmerge --gui-mode``."""
+
+    def __init__(self, progress: JobProgress):
+        self.progress = progress
+
+    def feed(self, line: str) -> None:
+        line = line.strip()
+        if line.startswith("#GUI#progress"):
+            value = line.rsplit(" ", 1)[-1].rstrip("%")
+            try:
+                self.progress.update(float(value))
+            except ValueError:
+                pass
+
+
+def make_parser(backend: str, progress: JobProgress, duration: float | None = None):
+    """Return a line parser for ``backend`` feeding ``progress``."""
+    if backend == "ffmpeg":
+        return FFmpegProgressParser(progress, duration)
+    return MkvmergeProgressParser(progress)
+
+
+def aggregate_rate(progresses: Iterable[JobProgress]) -> float:
+    """Return combined throughput in bytes per second.
+
+    The rate is measured from the earliest start to the latest activity of
+    the given jobs, so it reflects wall-clock batch throughput.
+    """
+    items = list(progresses)
+    if not items:
+        return 0.0
+    start = min(p.started for p in items)
+    end = max((p.finished or time.monotonic()) for p in items)
+    total = sum(p.bytes_done for p in items)
+    return total / (end - start) if end > start else 0.0
@@ -0,0 +1,363 @@
+"""Stream-copy remuxer for Matroska files written in pure Python.
+
+Removing tracks from a Matroska file does not require decoding anything:
+the header is rewritten without the removed ``TrackEntry`` elements and
+every Cluster is copied with the blocks of removed tracks left out. Kept
+blocks are written straight from an mmap of the source as memoryview
+slices, so block data is never copied into Python objects.
+
+Track numbers are kept as they are, which means block headers stay
+untouched. ``SeekHead`` and ``Cues`` are rebuilt for the new layout.
+"""
+
+from __future__ import annotations
+
+import logging
+import mmap
+from pathlib import Path
+from typing import Callable, List, NamedTuple
+
+from core.ebml import (
+    CRC32_ID,
+    VOID_ID,
+    EBMLError,
+    Element,
+    children,
+    element,
+    encode_id,
+    encode_vint,
+    read_element,
+    read_uint,
+    read_vint,
+    uint_element,
+    void_element,
+)
+from core.inplace import encode_track_entry, entry_flag_changes
+from core.matroska import (
+    ATTACHMENTS_ID,
+    BLOCK_GROUP_ID,
+    BLOCK_ID,
+    CHAPTERS_ID,
+    CLUSTER_ID,
+    CLUSTER_POSITION_ID,
+    CLUSTER_PREV_SIZE_ID,
+    CUE_BLOCK_NUMBER_ID,
+    CUE_CLUSTER_POSITION_ID,
+    CUE_POINT_ID,
+    CUE_REFERENCE_ID,
+    CUE_RELATIVE_POSITION_ID,
+    CUE_TRACK_ID,
+    CUE_TRACK_POSITIONS_ID,
+    CUES_ID,
+    INFO_ID,
+    SEEK_ID,
+    SEEK_ID_ID,
+    SEEK_POSITION_ID,
+    SEEKHEAD_ID,
+    SEGMENT_ID,
+    SIMPLE_BLOCK_ID,
+    TAG_ID,
+    TAG_TRACK_UID_ID,
+    TAGS_ID,
+    TARGETS_ID,
+    TRACK_ENTRY_ID,
+    TRACKS_ID,
+    MatroskaError,
+    SegmentLayout,
+    parse_layout,
+)
+
+logger = logging.getLogger("core.remux")
+
+# Top level elements copied to the output as they are
+_COPIED_IDS = (INFO_ID, CHAPTERS_ID, ATTACHMENTS_ID, TAGS_ID)
+# Cluster children dropped because their values change when blocks go away
+_DROPPED_CLUSTER_IDS = {CRC32_ID, VOID_ID, CLUSTER_POSITION_ID, CLUSTER_PREV_SIZE_ID}
+# IDs that end a Cluster of unknown size
+_LEVEL1_IDS = {
+    CLUSTER_ID, CUES_ID, INFO_ID, TRACKS_ID, SEEKHEAD_ID, CHAPTERS_ID,
+    ATTACHMENTS_ID, TAGS_ID,
+}
+
+
+class RemuxStats(NamedTuple):
+    bytes_read: int
+    bytes_written: int
+    blocks_kept: int
+    blocks_dropped: int
+
+
+def _removed_entries(layout: SegmentLayout, tracks) -> set[int]:
+    """Return the indexes of the TrackEntry elements to drop."""
+    removed = set()
+    for t in tracks:
+        if not t.removed:
+            continue
+        if not 0 <= t.tid < len(layout.entries):
+            raise MatroskaError(f"Track {t.tid} not found in header")
+        if layout.entries[t.tid].type != t.type:
+            raise MatroskaError(f"Track {t.tid} is not a {t.type} track")
+        removed.add(t.tid)
+    return removed
+
+
+def _encode_tracks(buf, layout: SegmentLayout, removed: set[int], changes) -> bytes:
+    parts = []
+    index = 0
+    for child in children(buf, layout.tracks):
+        if child.id == TRACK_ENTRY_ID:
+            if index in changes:
+                parts.append(encode_track_entry(buf, child, changes[index]))
+            elif index not in removed:
+                parts.append(bytes(buf[child.offset:child.end]))
+            index += 1
+        elif child.id not in (CRC32_ID, VOID_ID):
+            parts.append(bytes(buf[child.offset:child.end]))
+    return element(TRACKS_ID, b"".join(parts))
+
+
+def _filter_tags(buf, tags: Element, removed_uids: set[int]) -> bytes:
+    """Drop ``Tag`` elements that only target removed tracks."""
+    parts = []
+    for tag in children(buf, tags):
+        if tag.id == CRC32_ID:
+            continue
+        if tag.id == TAG_ID and removed_uids:
+            uids = {
+                read_uint(buf, uid)
+                for target in children(buf, tag)
+                if target.id == TARGETS_ID
+                for uid in children(buf, target)
+                if uid.id == TAG_TRACK_UID_ID
+            }
+            if uids and uids <= removed_uids:
+                continue
+        parts.append(bytes(buf[tag.offset:tag.end]))
+    return element(TAGS_ID, b"".join(parts))
+
+
+def _cluster_end(buf, cluster: Element, limit: int) -> int:
+    """Find the end of a Cluster with unknown size."""
+    pos = cluster.data_start
+    while pos < limit:
+        el = read_element(buf, pos)
+        if el.id in _LEVEL1_IDS or el.end is None:
+            break
+        pos = el.end
+    return pos
+
+
+def _block_track(buf, el: Element) -> int | None:
+    """Return the track number of a SimpleBlock or BlockGroup."""
+    if el.id == SIMPLE_BLOCK_ID:
+        return read_vint(buf, el.data_start)[0]
+    for child in children(buf, el):
+        if child.id == BLOCK_ID:
+            return read_vint(buf, child.data_start)[0]
+    return None
+
+
+def _scan_segment(buf, layout: SegmentLayout):
+    """Return the copied elements, the Clusters and the Cues of the segment."""
+    segment = layout.segment
+    limit = len(buf) if segment.end is None else min(segment.end, len(buf))
+    copied: list[Element] = []
+    clusters: list[tuple[Element, int]] = []
+    cues = None
+    pos = segment.data_start
+    while pos < limit:
+        el = read_element(buf, pos)
+        if el.id == CLUSTER_ID:
+            end = el.end if el.end is not None else _cluster_end(buf, el, limit)
+            clusters.append((el, end))
+            pos = end
+            continue
+        if el.end is None or el.end > len(buf):
+            raise MatroskaError(f"Element {el.id:#x} at {el.offset} is truncated")
+        if el.id in _COPIED_IDS:
+            copied.append(el)
+        elif el.id == CUES_ID and cues is None:
+            cues = el
+        pos = el.end
+    if clusters and clusters[-1][1] > len(buf):
+        raise MatroskaError("Last Cluster is truncated")
+    return copied, clusters, cues
+
+
+def _seek_head(positions: dict[int, int]) -> bytes:
+    seeks = b"".join(
+        element(
+            SEEK_ID,
+            element(SEEK_ID_ID, encode_id(el_id)) + uint_element(SEEK_POSITION_ID, pos, 8),
+        )
+        for el_id, pos in positions.items()
+    )
+    return element(SEEKHEAD_ID, seeks)
+
+
+def _rebuild_cues(
+    buf, cues: Element, removed_numbers: set[int], cluster_map: dict[int, int]
+) -> bytes:
+    points = []
+    for point in children(buf, cues):
+        if point.id != CUE_POINT_ID:
+            continue
+        parts = []
+        kept = 0
+        for child in children(buf, point):
+            if child.id != CUE_TRACK_POSITIONS_ID:
+                parts.append(bytes(buf[child.offset:child.end]))
+                continue
+            track = cluster = None
+            rest = []
+            for c in children(buf, child):
+                if c.id == CUE_TRACK_ID:
+                    track = read_uint(buf, c)
+                elif c.id == CUE_CLUSTER_POSITION_ID:
+                    cluster = read_uint(buf, c)
+                # Positions inside a cluster change when blocks are dropped
+                elif c.id not in (CUE_RELATIVE_POSITION_ID, CUE_BLOCK_NUMBER_ID, CUE_REFERENCE_ID):
+                    rest.append(bytes(buf[c.offset:c.end]))
+            if track is None or track in removed_numbers or cluster not in cluster_map:
+                continue
+            parts.append(
+                element(
+                    CUE_TRACK_POSITIONS_ID,
+                    uint_element(CUE_TRACK_ID, track)
+                    + uint_element(CUE_CLUSTER_POSITION_ID, cluster_map[cluster])
+                    + b"".join(rest),
+                )
+            )
+            kept += 1
+        if kept:
+            points.append(element(CUE_POINT_ID, b"".join(parts)))
+    return element(CUES_ID, b"".join(points)) if points else b""
+
+
+def remux(
+    buf,
+    out,
+    tracks: List,
+    wipe_forced: bool = False,
+    checkpoint: Callable[[int], None] | None = None,
+) -> RemuxStats:
+    """Write ``buf`` without the removed ``tracks`` to the file object ``out``.
+
+    ``out`` must be seekable. Default and forced flags of the kept tracks
+    are set like the other backends do. ``checkpoint`` is called after each
+    Cluster with the number of source bytes processed; it may raise to
+    abort the remux.
+    """
+    layout = parse_layout(buf)
+    with memoryview(buf) as view:
+        return _remux(buf, view, layout, out, tracks, wipe_forced, checkpoint)
+
+
+def _remux(buf, view, layout, out, tracks, wipe_forced, checkpoint) -> RemuxStats:
+    try:
+        removed = _removed_entries(layout, tracks)
+        removed_numbers = {layout.entries[i].number for i in removed}
+        removed_uids = {layout.entries[i].uid for i in removed}
+        changes = entry_flag_changes(buf, layout, tracks, wipe_forced)
+        copied, clusters, cues = _scan_segment(buf, layout)
+
+        head: list[tuple[int, bytes]] = []
+        for el in copied:
+            if el.id == TAGS_ID:
+                data = _filter_tags(buf, el, removed_uids)
+            else:
+                data = bytes(buf[el.offset:el.end])
+            head.append((el.id, data))
+            if el.id == INFO_ID:
+                head.append((TRACKS_ID, _encode_tracks(buf, layout, removed, changes)))
+        if not any(el_id == TRACKS_ID for el_id, _ in head):
+            head.insert(0, (TRACKS_ID, _encode_tracks(buf, layout, removed, changes)))
+
+        seek_ids = [el_id for el_id, _ in head]
+        if cues is not None:
+            seek_ids.append(CUES_ID)
+        reserved = len(_seek_head({el_id: 0 for el_id in seek_ids}))
+
+        start = out.tell()
+        out.write(view[:layout.segment.offset])
+        segment_header = out.tell()
+        out.write(encode_id(SEGMENT_ID) + encode_vint(0, 8))
+        segment_data = out.tell()
+        out.write(bytes(reserved))
+        positions: dict[int, int] = {}
+        for el_id, data in head:
+            positions.setdefault(el_id, out.tell() - segment_data)
+            out.write(data)
+
+        cluster_map: dict[int, int] = {}
+        kept_blocks = dropped_blocks = 0
+        for cluster, end in clusters:
+            ranges: list[list[int]] = []
+            size = 0
+            blocks = 0
+            pos = cluster.data_start
+            while pos < end:
+                child = read_element(buf, pos)
+                if child.end is None:
+                    raise MatroskaError(f"Cluster child at {pos} has unknown size")
+                pos = child.end
+                if child.id in _DROPPED_CLUSTER_IDS:
+                    continue
+                if child.id in (SIMPLE_BLOCK_ID, BLOCK_GROUP_ID):
+                    if _block_track(buf, child) in removed_numbers:
+                        dropped_blocks += 1
+                        continue
+                    blocks += 1
+                if ranges and ranges[-1][1] == child.offset:
+                    ranges[-1][1] = child.end
+                else:
+                    ranges.append([child.offset, child.end])
+                size += child.end - child.offset
+            if blocks:
+                cluster_map[cluster.offset - layout.segment_data] = out.tell() - segment_data
+                out.write(encode_id(CLUSTER_ID) + encode_vint(size))
+                for a, b in ranges:
+                    out.write(view[a:b])
+                kept_blocks += blocks
+            if checkpoint is not None:
+                checkpoint(end)
+
+        if cues is not None:
+            data = _rebuild_cues(buf, cues, removed_numbers, cluster_map)
+            if data:
+                positions[CUES_ID] = out.tell() - segment_data
+                out.write(data)
+    except EBMLError as exc:
+        raise MatroskaError(str(exc)) from exc
+
+    finish = out.tell()
+    seek_head = _seek_head(positions)
+    spare = reserved - len(seek_head)
+    out.seek(segment_data)
+    out.write(seek_head + (void_element(spare) if spare else b""))
+    out.seek(segment_header + len(encode_id(SEGMENT_ID)))
+    out.write(encode_vint(finish - segment_data, 8))
+    out.seek(finish)
+    return RemuxStats(len(buf), finish - start, kept_blocks, dropped_blocks)
+
+
+def remux_file(
+    source: Path,
+    destination: Path,
+    tracks: List,
+    wipe_forced: bool = False,
+    checkpoint: Callable[[int], None] | None = None,
+) -> RemuxStats:
+    """Remux ``source`` into ``destination`` keeping the selected ``tracks``."""
+    with open(source, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError as exc:  # empty file
+            raise MatroskaError(f"{source} is empty") from exc
+        with mm, open(destination, "wb") as out:
+            stats = remux(mm, out, tracks, wipe_forced, checkpoint)
+    logger.info(
+        "Remuxed %s: %d blocks kept, %d dropped, %d bytes written",
+        source, stats.blocks_kept, stats.blocks_dropped, stats.bytes_written,
+    )
+    return stats
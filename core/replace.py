@@ -0,0 +1,111 @@
+"""Replace source files with their cleaned version.
+
+Instead of writing to an output folder, a job can write next to its
+source into a hidden temporary file on the same filesystem, flush it to
+disk and rename it over the original in one atomic step. Readers see
+either the old or the new file under the real name, never a partial one.
+
+Before the rename the original is kept as a hidden backup (a hard link, so
+no data is copied) which :func:`prune_backups` removes once it is older
+than the configured retention.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Iterable
+
+from core.inplace import fsync_dir
+
+logger = logging.getLogger("core.replace")
+
+TEMP_SUFFIX = ".mkvc-tmp"
+BACKUP_SUFFIX = ".mkvc-backup"
+# Temporary files untouched for this long are left over from a crash
+STALE_TEMP_SECONDS = 3600
+
+
+def temp_path(source: Path) -> Path:
+    """Return the temporary output path used while replacing ``source``."""
+    source = Path(source)
+    return source.with_name(f".{source.name}{TEMP_SUFFIX}")
+
+
+def backup_path(source: Path) -> Path:
+    source = Path(source)
+    return source.with_name(f".{source.name}{BACKUP_SUFFIX}")
+
+
+def fsync_file(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replace_original(source: Path, temp: Path, backup: bool = True) -> Path | None:
+    """Atomically move ``temp`` over ``source``.
+
+    With ``backup`` the original stays reachable under :func:`backup_path`
+    and that path is returned. Where hard links are not supported the
+    original is renamed to the backup first, which leaves ``source``
+    missing for a moment.
+    """
+    source, temp = Path(source), Path(temp)
+    fsync_file(temp)
+    kept = None
+    if backup:
+        kept = backup_path(source)
+        kept.unlink(missing_ok=True)
+        try:
+            os.link(source, kept)
+        except OSError as exc:
+            logger.debug("Cannot hard link %s (%s), renaming instead", source, exc)
+            os.replace(source, kept)
+    os.replace(temp, source)
+    fsync_dir(source.parent)
+    logger.info("Replaced %s%s", source, f" (backup {kept.name})" if kept else "")
+    return kept
+
+
+def prune_backups(directories: Iterable[Path], max_age: float) -> int:
+    """Delete backups older than ``max_age`` seconds and stale temp files.
+
+    Returns the number of removed files.
+    """
+    now = time.time()
+    removed = 0
+    for directory in set(map(Path, directories)):
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if not entry.name.startswith("."):
+                continue
+            is_backup = entry.name.endswith(BACKUP_SUFFIX)
+            if not (is_backup or entry.name.endswith(TEMP_SUFFIX)):
+                continue
+            try:
+                st = entry.stat()
+                if is_backup:
+                    # A backup shares the original's inode and thus its
+                    # mtime; the inode change time tells when it was made.
+                    age = now - max(st.st_mtime, st.st_ctime if os.name == "posix" else 0)
+                    limit = max_age
+                else:
+                    age = now - st.st_mtime
+                    limit = STALE_TEMP_SECONDS
+                if age < limit:
+                    continue
+                os.unlink(entry.path)
+            except OSError as exc:
+                logger.warning("Could not remove %s: %s", entry.path, exc)
+                continue
+            logger.info("Removed %s", entry.path)
+            removed += 1
+    return removed
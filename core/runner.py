@@ -0,0 +1,155 @@
+"""Run backend commands while streaming their output.
+
+Remuxes can run for a long time and produce a lot of diagnostics, so
+instead of buffering everything the child writes, both pipes are read
+incrementally and split into lines for the caller. Only the last
+``tail_lines`` lines of stderr are kept for error reports.
+"""
+
+from __future__ import annotations
+
+import codecs
+import logging
+import os
+import re
+import selectors
+import subprocess
+import threading
+from collections import deque
+from typing import Callable, Sequence
+
+logger = logging.getLogger("core.runner")
+
+# Lines of stderr kept for error messages
+STDERR_TAIL_LINES = 200
+READ_SIZE = 64 * 1024
+# Longest partial line buffered before it is handed over anyway
+MAX_LINE = 64 * 1024
+
+_NEWLINES = re.compile(r"\r\n|\r|\n")
+
+
+class LineBuffer:
+    """Turn chunks of bytes into decoded lines passed to ``callback``.
+
+    ``\\r`` counts as a line break so carriage-return progress meters are
+    reported line by line. Empty lines are skipped.
+    """
+
+    def __init__(self, callback: Callable[[str], None]):
+        self._callback = callback
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._partial = ""
+
+    def feed(self, data: bytes) -> None:
+        text = self._partial + self._decoder.decode(data)
+        lines = _NEWLINES.split(text)
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_LINE:
+            lines.append(self._partial)
+            self._partial = ""
+        for line in lines:
+            if line:
+                self._callback(line)
+
+    def close(self) -> None:
+        text = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        if text:
+            self._callback(text)
+
+
+def _pump_select(streams: dict) -> None:
+    """Read all ``streams`` from this thread using non-blocking pipes."""
+    sel = selectors.DefaultSelector()
+    for stream, buf in streams.items():
+        os.set_blocking(stream.fileno(), False)
+        sel.register(stream, selectors.EVENT_READ, buf)
+    try:
+        while sel.get_map():
+            for key, _ in sel.select():
+                try:
+                    data = os.read(key.fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                if data:
+                    key.data.feed(data)
+                else:
+                    sel.unregister(key.fileobj)
+                    key.data.close()
+    finally:
+        sel.close()
+
+
+def _pump_threads(streams: dict) -> None:
+    """Fallback for platforms whose selectors cannot wait on pipes."""
+
+    def pump(stream, buf):
+        for chunk in iter(lambda: stream.read1(READ_SIZE), b""):
+            buf.feed(chunk)
+        buf.close()
+
+    threads = [
+        threading.Thread(target=pump, args=item, daemon=True) for item in streams.items()
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def stream_command(
+    cmd: Sequence[str],
+    on_line: Callable[[str], None] | None = None,
+    on_stderr: Callable[[str], None] | None = None,
+    on_start: Callable[[subprocess.Popen], None] | None = None,
+    tail_lines: int = STDERR_TAIL_LINES,
+) -> subprocess.CompletedProcess:
+    """Run ``cmd`` and stream its output.
+
+    Lines written to stdout go to ``on_line`` (or are dropped), lines
+    written to stderr are logged at debug level and passed to
+    ``on_stderr``. ``on_start`` receives the ``Popen`` object right after
+    the process was started. The returned ``stderr`` holds the last
+    ``tail_lines`` lines only; ``stdout`` is always empty.
+
+    Raises ``FileNotFoundError`` if the executable is missing and
+    ``subprocess.CalledProcessError`` with the stderr tail on failure.
+    """
+    cmd = list(cmd)
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    tail: deque[str] = deque(maxlen=tail_lines)
+    name = os.path.basename(str(cmd[0]))
+
+    def err_line(line: str) -> None:
+        tail.append(line)
+        logger.debug("%s: %s", name, line)
+        if on_stderr is not None:
+            on_stderr(line)
+
+    try:
+        if on_start is not None:
+            on_start(proc)
+        streams = {
+            proc.stdout: LineBuffer(on_line or (lambda line: None)),
+            proc.stderr: LineBuffer(err_line),
+        }
+        if os.name == "posix":
+            _pump_select(streams)
+        else:
+            _pump_threads(streams)
+        rc = proc.wait()
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    err = "\n".join(tail)
+    if rc:
+        raise subprocess.CalledProcessError(rc, cmd, stderr=err)
+    return subprocess.CompletedProcess(cmd, rc, "", err)
@@ -0,0 +1,389 @@
+"""Decide which queued job runs next.
+
+The processing engine keeps its queued jobs in a scheduler. The plain
+:class:`FifoScheduler` runs them one after another; the
+:class:`DeviceScheduler` groups them by the block devices they read from
+and write to, caps the number of jobs per device and rotates between
+devices, so a slow disk is not thrashed while others sit idle.
+
+Both order their jobs by one of the :data:`ORDERS` policies. Apart from
+``fifo`` the policies rank jobs by their estimated cost: source size times
+the per-byte cost a :class:`CostModel` learned from finished jobs.
+Running the longest jobs first (``largest``) keeps one huge file from
+starting last and stretching the batch, ``smallest`` gives the quickest
+early results and ``mixed`` alternates between both ends.
+"""
+
+from __future__ import annotations
+
+import bisect
+import itertools
+import os
+import threading
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator
+
+from core.autotune import load_history, save_history
+
+if TYPE_CHECKING:
+    from core.diskspace import DiskSpace
+
+ORDERS = ("fifo", "largest", "smallest", "mixed")
+
+
+def device_of(path: Path) -> int | None:
+    """Return ``st_dev`` of ``path`` or of its nearest existing parent."""
+    path = Path(path)
+    for p in (path, *path.parents):
+        try:
+            return os.stat(p).st_dev
+        except OSError:
+            continue
+    return None
+
+
+def source_size(job) -> int:
+    """Return the size of ``job.source`` in bytes, 0 if unknown."""
+    try:
+        return os.stat(job.source).st_size
+    except OSError:
+        return 0
+
+
+class CostModel:
+    """Seconds per source byte of finished jobs, per backend.
+
+    Only remuxes are counted; flag edits and no-op copies do not scale with
+    the file size the same way. Backends without measurements are assumed to cost as much
+    as the average of the known ones. With ``path`` the rates are loaded
+    from and saved to a JSON file.
+    """
+
+    # Weight of a new measurement in the running average
+    SMOOTHING = 0.2
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self.rates: dict[str, float] = {}
+        for key, value in load_history(self.path).items():
+            if isinstance(value, (int, float)) and value > 0:
+                self.rates[str(key)] = float(value)
+
+    @staticmethod
+    def key(job) -> str:
+        return job.config.backend if job.config is not None else ""
+
+    def rate(self, key: str) -> float:
+        with self._lock:
+            if key in self.rates:
+                return self.rates[key]
+            if self.rates:
+                return sum(self.rates.values()) / len(self.rates)
+        return 1.0
+
+    def estimate(self, job, size: int) -> float:
+        """Return the expected run time of ``job`` in relative units."""
+        return size * self.rate(self.key(job))
+
+    def record(self, job, size: int, seconds: float) -> None:
+        if job.method not in ("remux", "native") or size <= 0 or seconds <= 0:
+            return
+        key = self.key(job)
+        value = seconds / size
+        with self._lock:
+            old = self.rates.get(key)
+            self.rates[key] = value if old is None else (
+                (1 - self.SMOOTHING) * old + self.SMOOTHING * value
+            )
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            rates = dict(self.rates)
+        save_history(self.path, rates)
+
+
+class JobQueue:
+    """Jobs sorted by policy; used by the schedulers for each of their queues.
+
+    With the ``fifo`` order jobs stay in submission order, otherwise they
+    are sorted from the highest to the lowest estimated cost. Ties keep the
+    submission order.
+    """
+
+    def __init__(self, order: str = "fifo"):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown job order: {order}")
+        self.order = order
+        self._entries: list[tuple[float, int, object]] = []
+
+    def add(self, job, cost: float, seq: int) -> None:
+        rank = 0.0 if self.order == "fifo" else -cost
+        # (rank, seq) is unique, so jobs themselves are never compared
+        bisect.insort(self._entries, (rank, seq, job))
+
+    def remove(self, job) -> None:
+        for i, entry in enumerate(self._entries):
+            if entry[2] is job:
+                del self._entries[i]
+                return
+        raise ValueError(f"Job {job.id} is not queued")
+
+    def peek(self, smallest: bool = False, admit: Callable | None = None):
+        """Return ``(cost, job)`` of the next runnable job from either end.
+
+        Jobs for which ``admit(job)`` is false are skipped.
+        """
+        entries = reversed(self._entries) if smallest else self._entries
+        for rank, _seq, job in entries:
+            if not job.paused and (admit is None or admit(job)):
+                return -rank, job
+        return None
+
+    def __iter__(self) -> Iterator:
+        return (job for _rank, _seq, job in self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FifoScheduler:
+    """Queued jobs in submission order or ordered by ``order``.
+
+    ``costs`` provides the per-byte cost of finished jobs; a private
+    :class:`CostModel` is used if none is given. With ``space`` a job is
+    only picked once its output fits on the destination device.
+    """
+
+    def __init__(
+        self,
+        order: str = "fifo",
+        costs: CostModel | None = None,
+        space: DiskSpace | None = None,
+    ):
+        self._queue = JobQueue(order)
+        self.costs = costs if costs is not None else CostModel()
+        self.space = space
+        self._seq = itertools.count()
+        self._small_next = False
+        self._sizes: dict[int, int] = {}  # job id -> source size
+
+    @property
+    def order(self) -> str:
+        return self._queue.order
+
+    def _cost(self, job) -> float:
+        if job.id not in self._sizes:
+            self._sizes[job.id] = source_size(job)
+        return self.costs.estimate(job, self._sizes[job.id])
+
+    def _smallest_next(self) -> bool:
+        """Return which end to serve from next; alternates for ``mixed``."""
+        if self.order == "mixed":
+            return self._small_next
+        return self.order == "smallest"
+
+    def _picked(self) -> None:
+        if self.order == "mixed":
+            self._small_next = not self._small_next
+
+    def append(self, job) -> None:
+        cost = 0.0 if self.order == "fifo" else self._cost(job)
+        self._queue.add(job, cost, next(self._seq))
+
+    def remove(self, job) -> None:
+        self._queue.remove(job)
+        self._sizes.pop(job.id, None)
+
+    def __contains__(self, job) -> bool:
+        return any(j is job for j in self._queue)
+
+    def __iter__(self) -> Iterator:
+        return iter(list(self._queue))
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def pick(self):
+        """Remove and return the next runnable job or ``None``."""
+        with self._measuring():
+            found = self._queue.peek(self._smallest_next(), self._admit)
+        if found is None:
+            return None
+        job = found[1]
+        self._queue.remove(job)
+        self._picked()
+        return job
+
+    @property
+    def _admit(self) -> Callable | None:
+        return self.space.admit if self.space is not None else None
+
+    def _measuring(self):
+        return self.space.snapshot() if self.space is not None else nullcontext()
+
+    def started(self, job) -> None:
+        """Called when a picked job starts running."""
+        if self.space is not None and not job.rejected:
+            self.space.reserve_for(job)
+
+    def discard(self, job) -> None:
+        """Called for a picked job that is dropped without being started."""
+        self._sizes.pop(job.id, None)
+
+    def finished(self, job) -> None:
+        """Called when a job that was started has finished."""
+        if self.space is not None:
+            self.space.release(job)
+        size = self._sizes.pop(job.id, None)
+        if job.state == "done" and job.started and job.finished:  # engine.DONE
+            if size is None:
+                size = source_size(job)
+            self.costs.record(job, size, job.finished - job.started)
+
+
+class DeviceScheduler(FifoScheduler):
+    """Run at most ``per_device`` jobs per block device.
+
+    A job counts against the device of its source and, if different, the
+    device of its output directory. ``limits`` overrides the cap for
+    single devices and is keyed by any path on that device. With the
+    ``fifo`` order jobs of the same device pair keep their order and pairs
+    are served round-robin; the other orders pick the best ranked job
+    among all pairs that have room.
+    """
+
+    def __init__(
+        self,
+        per_device: int = 2,
+        limits: dict[str, int] | None = None,
+        output_dir: str | Path | None = None,
+        order: str = "fifo",
+        costs: CostModel | None = None,
+        space: DiskSpace | None = None,
+    ):
+        super().__init__(order, costs, space)
+        self.per_device = max(1, per_device)
+        self.output_dir = output_dir
+        self.limits: dict[int, int] = {}
+        for path, limit in (limits or {}).items():
+            dev = device_of(Path(path))
+            if dev is not None:
+                self.limits[dev] = max(1, int(limit))
+        self._queues: OrderedDict[tuple, JobQueue] = OrderedDict()
+        self._queued: set[int] = set()
+        self._devices: dict[int, tuple] = {}  # job id -> devices
+        self._dir_devices: dict[Path, int | None] = {}
+        self.active: Counter = Counter()
+
+    def _dir_device(self, directory: Path) -> int | None:
+        if directory not in self._dir_devices:
+            self._dir_devices[directory] = device_of(directory)
+        return self._dir_devices[directory]
+
+    def devices(self, job) -> tuple:
+        """Return the distinct devices ``job`` reads from and writes to."""
+        if job.id in self._devices:
+            return self._devices[job.id]
+        src = Path(job.source)
+        out = job.config.output_dir if job.config is not None else self.output_dir
+        out_dir = src.parent
+        if job.config is not None and job.config.replace_original:
+            out = None
+        if out:
+            out = Path(out)
+            out_dir = out if out.is_absolute() else src.parent / out
+        devs = []
+        for dev in (self._dir_device(src.parent), self._dir_device(out_dir)):
+            if dev not in devs:
+                devs.append(dev)
+        self._devices[job.id] = tuple(devs)
+        return self._devices[job.id]
+
+    def limit(self, dev) -> int:
+        return self.limits.get(dev, self.per_device)
+
+    def append(self, job) -> None:
+        key = self.devices(job)
+        if key not in self._queues:
+            self._queues[key] = JobQueue(self.order)
+        cost = 0.0 if self.order == "fifo" else self._cost(job)
+        self._queues[key].add(job, cost, next(self._seq))
+        self._queued.add(job.id)
+
+    def remove(self, job) -> None:
+        if job.id not in self._queued:
+            raise ValueError(f"Job {job.id} is not queued")
+        key = self.devices(job)
+        queue = self._queues[key]
+        queue.remove(job)
+        if not queue:
+            del self._queues[key]
+        self._queued.discard(job.id)
+        self._devices.pop(job.id, None)
+        self._sizes.pop(job.id, None)
+
+    def __contains__(self, job) -> bool:
+        return job.id in self._queued
+
+    def __iter__(self) -> Iterator:
+        return iter([job for queue in self._queues.values() for job in queue])
+
+    def __len__(self) -> int:
+        return len(self._queued)
+
+    def _has_room(self, key: tuple) -> bool:
+        return all(self.active[dev] < self.limit(dev) for dev in key)
+
+    def pick(self):
+        smallest = self._smallest_next()
+        best = None
+        with self._measuring():
+            for key in list(self._queues):
+                if not self._has_room(key):
+                    continue
+                found = self._queues[key].peek(smallest, self._admit)
+                if found is None:
+                    continue
+                if self.order == "fifo":
+                    best = (key, found[1])
+                    break
+                if best is None or (found[0] < best[2] if smallest else found[0] > best[2]):
+                    best = (key, found[1], found[0])
+        if best is None:
+            return None
+        key, job = best[0], best[1]
+        queue = self._queues[key]
+        queue.remove(job)
+        if queue:
+            # Serve the other device pairs first next time
+            self._queues.move_to_end(key)
+        else:
+            del self._queues[key]
+        self._queued.discard(job.id)
+        self._picked()
+        return job
+
+    def started(self, job) -> None:
+        super().started(job)
+        for dev in self.devices(job):
+            self.active[dev] += 1
+
+    def discard(self, job) -> None:
+        super().discard(job)
+        self._devices.pop(job.id, None)
+
+    def finished(self, job) -> None:
+        super().finished(job)
+        for dev in self._devices.pop(job.id, ()):
+            self.active[dev] -= 1
+            if self.active[dev] <= 0:
+                del self.active[dev]
+
+    def load(self) -> dict:
+        """Return the number of running jobs per device."""
+        return dict(self.active)
@@ -0,0 +1,127 @@
+"""Language based track selection for headless use.
+
+The GUI lets the user pick tracks per group of identical files. Without a
+GUI the selection is described by a spec that is applied to the probed
+tracks of every file::
+
+    audio=jpn,eng;subs=eng;default-audio=jpn;default-subs=eng;forced=eng
+
+``audio`` and ``subs``
+    languages of the audio and subtitle tracks to keep (``*`` keeps all,
+    ``none`` removes all subtitles). A file without any matching audio
+    track keeps all of its audio tracks.
+``default-audio`` and ``default-subs``
+    language of the kept track that gets the default flag; all other
+    tracks of that type lose it (``none`` clears it everywhere).
+``forced``
+    languages of the kept subtitle tracks that are flagged forced; all
+    other subtitle tracks lose the flag.
+
+Keys left out of the spec leave the corresponding tracks and flags as
+they are in the file. Items may also be separated by whitespace.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import List
+
+from core.tracks import Track
+
+logger = logging.getLogger("core.selection")
+
+KEYS = ("audio", "subs", "default-audio", "default-subs", "forced")
+ALL = "*"
+NONE = "none"
+
+
+@dataclass(frozen=True)
+class TrackSpec:
+    """Parsed selection spec; ``None`` fields leave tracks untouched."""
+
+    audio: tuple[str, ...] | None = None
+    subs: tuple[str, ...] | None = None
+    default_audio: str | None = None
+    default_subs: str | None = None
+    forced: tuple[str, ...] | None = None
+
+    def __str__(self) -> str:
+        items = []
+        for key in KEYS:
+            value = getattr(self, key.replace("-", "_"))
+            if value is not None:
+                items.append(f"{key}={value if isinstance(value, str) else ','.join(value)}")
+        return ";".join(items)
+
+
+def _languages(value: str) -> tuple[str, ...]:
+    return tuple(v.strip().lower() for v in value.split(",") if v.strip())
+
+
+def parse_spec(text: str) -> TrackSpec:
+    """Parse a selection spec; raises :class:`ValueError` on unknown keys."""
+    values: dict[str, object] = {}
+    for item in re.split(r"[;\s]+", text.strip()):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        key = key.strip().lower()
+        if not sep or key not in KEYS:
+            raise ValueError(f"Invalid track selection item: {item!r}")
+        field_name = key.replace("-", "_")
+        if key.startswith("default-"):
+            values[field_name] = value.strip().lower()
+        else:
+            values[field_name] = _languages(value)
+    return TrackSpec(**values)
+
+
+def _matches(track: Track, languages) -> bool:
+    if ALL in languages:
+        return True
+    lang = (track.language or "und").lower()
+    return lang in languages
+
+
+def _keep(tracks: List[Track], languages, keep_some: bool) -> None:
+    if languages is None:
+        return
+    if NONE in languages and not keep_some:
+        for t in tracks:
+            t.removed = True
+        return
+    wanted = {id(t) for t in tracks if _matches(t, languages)}
+    if not wanted and keep_some:
+        wanted = {id(t) for t in tracks}
+    for t in tracks:
+        t.removed = id(t) not in wanted
+
+
+def _default(tracks: List[Track], language, attr: str) -> None:
+    if language is None:
+        return
+    chosen = None
+    if language != NONE:
+        chosen = next(
+            (t for t in tracks if not t.removed and _matches(t, (language,))), None
+        )
+        if chosen is None:
+            return  # keep the flags of files without that language
+    for t in tracks:
+        setattr(t, attr, t is chosen)
+
+
+def apply_spec(tracks: List[Track], spec: TrackSpec) -> List[Track]:
+    """Set ``removed``, default and forced flags of ``tracks`` from ``spec``."""
+    audio = [t for t in tracks if t.type == "audio"]
+    subs = [t for t in tracks if t.type == "subtitles"]
+    _keep(audio, spec.audio, keep_some=True)
+    _keep(subs, spec.subs, keep_some=False)
+    _default(audio, spec.default_audio, "default_audio")
+    _default(subs, spec.default_subs, "default_subtitle")
+    if spec.forced is not None:
+        for t in subs:
+            t.forced = not t.removed and _matches(t, spec.forced)
+    return tracks
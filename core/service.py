@@ -0,0 +1,436 @@
+"""Local HTTP job service: ``mkv-cleaner serve``.
+
+Runs on the machine that has the disks and lets other hosts queue files
+for cleaning. Submitted jobs are stored in a :class:`~core.jobstore.JobStore`
+and run by a :class:`~core.engine.ProcessingEngine` with the configured
+backend and concurrency; jobs interrupted by a restart are run again.
+Only the standard library is used::
+
+    mkv-cleaner serve --port 8765 --root /media --backend native --jobs 4
+
+Sources are paths on the serving machine. With ``--root`` they must lie
+below one of the given directories. The service listens on localhost
+unless ``--host`` says otherwise; there is no authentication.
+
+Endpoints, all speaking JSON:
+
+``POST /jobs``
+    Queue a manifest: JSON Lines as for ``mkv-cleaner batch --manifest``
+    or an object ``{"jobs": [...], "tracks": spec, "wipe_all": bool}``
+    whose ``tracks`` and ``wipe_all`` are the defaults of its items.
+    Returns ``{"ids": [...]}``.
+``GET /jobs?state=&after=&limit=``
+    List jobs, oldest first.
+``GET /jobs/<id>``
+    One job with its state, method, destination, error and progress.
+``GET /jobs/<id>/events``
+    Stream the job as JSON Lines whenever it changes, until it finishes.
+``POST /jobs/<id>/cancel``
+    Cancel a queued or running job.
+``GET /status``
+    Number of jobs per state.
+
+:class:`ServiceClient` is a small client for these endpoints.
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import io
+import json
+import logging
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterable, Iterator, List
+from urllib.parse import parse_qs, quote, urlsplit
+
+from core.cli import add_config_options, config_from_args, make_scheduler, read_manifest
+from core.config import AppConfig, setup_logging, user_cache_dir
+from core.engine import (
+    CANCELLED,
+    QUEUED,
+    Job,
+    ProcessingEngine,
+    execute_job,
+    plan_job,
+    probe_job,
+)
+from core.jobstore import FINISHED_STATES, JobStore
+from core.selection import TrackSpec, apply_spec, parse_spec
+from core.tracks import query_tracks
+
+logger = logging.getLogger("core.service")
+
+DEFAULT_PORT = 8765
+MAX_BODY = 16 << 20
+SYNC_INTERVAL = 0.5
+
+
+class JobService:
+    """Run the jobs of ``store`` and keep their state in it.
+
+    Jobs are probed when they start; each job's tracks spec is applied to
+    the probed tracks before it runs like any other engine job.
+    """
+
+    def __init__(self, store: JobStore, cfg: AppConfig, roots: Iterable[str | Path] = ()):
+        self.store = store
+        self.cfg = cfg
+        self.roots = [Path(r).resolve() for r in roots]
+        self._run = execute_job
+        if cfg.job_journal:
+            from core.journal import open_journal
+
+            self._run = open_journal(cfg.job_journal).wrap(execute_job)
+        self.engine = ProcessingEngine(self._execute, cfg.max_workers, make_scheduler(cfg))
+        self._lock = threading.Lock()
+        self._jobs: dict[int, Job] = {}
+        self._specs: dict[int, TrackSpec] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Queue the stored jobs that have not run yet and start syncing."""
+        self.store.requeue_interrupted()
+        self._enqueue(self.store.jobs(QUEUED))
+        self._thread = threading.Thread(target=self._sync_loop, name="service-sync", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: Iterable[tuple]) -> List[int]:
+        """Store and queue ``(source, spec, wipe_all)`` items; return their ids."""
+        items = list(items)
+        for source, _spec, _wipe_all in items:
+            self._check_source(Path(source))
+        ids = self.store.add((source, spec, wipe_all) for source, spec, wipe_all in items)
+        self._enqueue(self.store.get(i) for i in ids)
+        return ids
+
+    def _check_source(self, source: Path) -> None:
+        if not source.is_absolute():
+            raise ValueError(f"Source must be an absolute path: {source}")
+        if self.roots:
+            resolved = source.resolve()
+            if not any(resolved.is_relative_to(root) for root in self.roots):
+                raise ValueError(f"Source is outside the served directories: {source}")
+
+    def _enqueue(self, rows: Iterable[dict]) -> None:
+        jobs = []
+        with self._lock:
+            for row in rows:
+                source = Path(row["source"])
+                job = Job(source, [], wipe_all=row["wipe_all"], config=self.cfg, id=row["id"])
+                self._jobs[job.id] = job
+                self._specs[job.id] = parse_spec(row["tracks"])
+                jobs.append(job)
+        self.engine.submit(jobs)
+
+    def _execute(self, job: Job) -> None:
+        with self._lock:
+            spec = self._specs.pop(job.id)
+        execute_with_spec(job, spec, self._run)
+
+    def cancel(self, job_id: int) -> dict | None:
+        """Cancel job ``job_id`` and return it, or ``None`` if it does not exist."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            self.engine.cancel([job])
+            self.sync()
+        else:
+            self.store.set_state(job_id, CANCELLED)
+        return self.store.get(job_id)
+
+    def sync(self) -> None:
+        """Write changed and running jobs to the store."""
+        with self._lock:
+            for job in self.engine.take_changes() + self.engine.running():
+                self.store.update(job)
+            for job in self.engine.clear_finished():
+                self._jobs.pop(job.id, None)
+                self._specs.pop(job.id, None)
+
+    def _sync_loop(self) -> None:
+        while not self._stop.wait(SYNC_INTERVAL):
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Could not update the job store")
+
+    @property
+    def closed(self) -> bool:
+        return self._stop.is_set()
+
+    def close(self, timeout: float = 10) -> None:
+        """Stop running jobs; they are queued again when the service restarts."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sync()
+        self.engine.cancel_all()
+        self.engine.wait(timeout)
+        self.engine.shutdown(wait=False)
+        # Jobs that completed before they could be cancelled are still recorded
+        for job in self.engine.take_changes():
+            if job.state != CANCELLED:
+                self.store.update(job)
+        if self.cfg.job_costs:
+            self.engine.scheduler.costs.save()
+
+
+def execute_with_spec(job: Job, spec: TrackSpec, run=execute_job) -> None:
+    """Probe ``job``, select its tracks by ``spec`` and ``run(job)`` it."""
+    cfg = job.config or AppConfig()
+    real_tracks = probe_job(job, lambda src: query_tracks(src, cfg))
+    job.tracks = apply_spec(copy.deepcopy(real_tracks), spec)
+    job.planned_tracks = plan_job(job, real_tracks, cfg.output_dir, cfg.replace_original)
+    run(job)
+
+
+def parse_submission(body: bytes) -> List[tuple]:
+    """Return the ``(source, spec, wipe_all)`` items of a ``POST /jobs`` body."""
+    text = body.decode("utf-8")
+    spec, wipe_all = TrackSpec(), False
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict) and "jobs" in data:
+        spec = parse_spec(data.get("tracks", ""))
+        wipe_all = bool(data.get("wipe_all", False))
+        if not isinstance(data["jobs"], list):
+            raise ValueError("jobs must be a list")
+        text = "\n".join(json.dumps(item) for item in data["jobs"])
+    items = list(read_manifest(io.StringIO(text), spec, wipe_all))
+    if not items:
+        raise ValueError("No jobs given")
+    return items
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "mkv-cleaner"
+    service: JobService
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s", self.address_string(), format % args)
+
+    def _send(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str) -> None:
+        self._send(status, {"error": message})
+
+    def _route(self) -> tuple[List[str], dict]:
+        url = urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        return parts, query
+
+    def _job_id(self, parts: List[str]) -> int | None:
+        try:
+            return int(parts[1])
+        except ValueError:
+            return None
+
+    def do_GET(self):
+        parts, query = self._route()
+        store = self.server.service.store
+        if parts == ["status"]:
+            return self._send(200, {"jobs": store.counts()})
+        if parts == ["jobs"]:
+            try:
+                after = int(query.get("after", 0))
+                limit = int(query.get("limit", 1000))
+            except ValueError:
+                return self._error(400, "after and limit must be integers")
+            return self._send(200, {"jobs": store.jobs(query.get("state"), limit, after)})
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job_id = self._job_id(parts)
+            job = store.get(job_id) if job_id is not None else None
+            if job is None:
+                return self._error(404, "No such job")
+            if len(parts) == 2:
+                return self._send(200, job)
+            if parts[2] == "events":
+                return self._events(job_id)
+        self._error(404, "Not found")
+
+    def _events(self, job_id: int) -> None:
+        service = self.server.service
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        last = None
+        try:
+            while not service.closed:
+                job = service.store.get(job_id)
+                if job != last:
+                    self.wfile.write((json.dumps(job) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                    last = job
+                if job["state"] in FINISHED_STATES:
+                    break
+                time.sleep(SYNC_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def do_POST(self):
+        parts, _query = self._route()
+        service = self.server.service
+        if parts == ["jobs"]:
+            try:
+                length = int(self.headers.get("Content-Length", ""))
+            except ValueError:
+                return self._error(411, "Content-Length required")
+            if length > MAX_BODY:
+                return self._error(413, "Manifest too large")
+            try:
+                ids = service.submit(parse_submission(self.rfile.read(length)))
+            except (ValueError, UnicodeDecodeError) as exc:
+                return self._error(400, str(exc))
+            return self._send(201, {"ids": ids})
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            job_id = self._job_id(parts)
+            job = service.cancel(job_id) if job_id is not None else None
+            if job is None:
+                return self._error(404, "No such job")
+            return self._send(200, job)
+        self._error(404, "Not found")
+
+
+def make_server(
+    service: JobService, host: str = "127.0.0.1", port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    """Return an HTTP server for ``service``; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.service = service
+    return server
+
+
+class ServiceError(Exception):
+    """A request to the job service failed."""
+
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceClient:
+    """Client for a job service at ``url``."""
+
+    def __init__(self, url: str = f"http://127.0.0.1:{DEFAULT_PORT}", timeout: float = 30):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _open(self, method: str, path: str, data: dict | None = None):
+        body = json.dumps(data).encode("utf-8") if data is not None else None
+        request = urllib.request.Request(self.url + path, body, method=method)
+        if body is not None:
+            request.add_header("Content-Type", "application/json")
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as exc:
+            try:
+                message = json.loads(exc.read())["error"]
+            except (ValueError, KeyError, TypeError):
+                message = str(exc)
+            raise ServiceError(message, exc.code) from None
+        except urllib.error.URLError as exc:
+            raise ServiceError(f"Cannot reach {self.url}: {exc.reason}") from None
+
+    def _request(self, method: str, path: str, data: dict | None = None) -> dict:
+        with self._open(method, path, data) as response:
+            return json.loads(response.read())
+
+    def submit(self, sources: Iterable, tracks: str = "", wipe_all: bool = False) -> List[int]:
+        """Queue ``sources`` (paths or manifest objects); return the job ids."""
+        items = [s if isinstance(s, dict) else str(s) for s in sources]
+        data = {"jobs": items, "tracks": str(tracks), "wipe_all": wipe_all}
+        return self._request("POST", "/jobs", data)["ids"]
+
+    def job(self, job_id: int) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def jobs(self, state: str | None = None) -> List[dict]:
+        path = "/jobs" + (f"?state={quote(state)}" if state else "")
+        return self._request("GET", path)["jobs"]
+
+    def status(self) -> dict[str, int]:
+        return self._request("GET", "/status")["jobs"]
+
+    def cancel(self, job_id: int) -> dict:
+        return self._request("POST", f"/jobs/{job_id}/cancel", {})
+
+    def events(self, job_id: int) -> Iterator[dict]:
+        """Yield job ``job_id`` every time it changes until it finishes."""
+        with self._open("GET", f"/jobs/{job_id}/events") as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+    def wait(self, job_id: int) -> dict:
+        """Block until job ``job_id`` finishes and return it."""
+        job = None
+        for job in self.events(job_id):
+            pass
+        if job is None or job["state"] not in FINISHED_STATES:
+            raise ServiceError(f"Job {job_id} did not finish")
+        return job
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mkv-cleaner serve",
+        description="Accept cleaning jobs from other hosts over HTTP.",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--db", help="job queue database")
+    parser.add_argument(
+        "--root", action="append", default=[], help="only accept sources below this directory"
+    )
+    add_config_options(parser)
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    return parser
+
+
+def main(argv: List[str] | None = None) -> int:
+    """Run ``mkv-cleaner serve`` with ``argv`` until interrupted."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    levels = (logging.INFO, logging.DEBUG)
+    setup_logging(levels[min(args.verbose, 1)])
+    try:
+        cfg = config_from_args(args)
+        store = JobStore(args.db or user_cache_dir() / "service.sqlite3")
+        service = JobService(store, cfg, args.root)
+        server = make_server(service, args.host, args.port)
+    except (ValueError, OSError) as exc:
+        parser.error(str(exc))
+    service.start()
+    host, port = server.server_address[:2]
+    logger.info("Serving %s on http://%s:%d", store.path, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
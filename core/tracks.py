@@ -3,18 +3,28 @@
 from __future__ import annotations
 import json
 import subprocess
+import sys
 import logging
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List
 
 from core.config import AppConfig
+from core.inplace import recover
+from core.matroska import PARSER_VERSION, MatroskaError, read_layout
+from core.probe_cache import CACHE_ERRORS, CacheKey, cache_failed, file_key, usable_cache
+from core.runner import stream_command
 
 logger = logging.getLogger("core.tracks")
 
-@dataclass
+@dataclass(slots=True)
 class Track:
-    """Represents a single media track and its attributes."""
+    """Represents a single media track and its attributes.
+
+    Tracks are slotted and their text fields interned: a library holds
+    millions of tracks that share a handful of types, codecs, languages
+    and names (see ``benchmarks/bench_tracks.py``).
+    """
     idx: int       # index in the UI/table
     tid: int       # real mkvmerge track id
     type: str
@@ -29,6 +39,32 @@ class Track:
     orig_default_audio: bool = False
     orig_default_subtitle: bool = False
 
+    def __post_init__(self):
+        self.type = sys.intern(self.type)
+        self.codec = sys.intern(self.codec)
+        self.language = sys.intern(self.language)
+        self.name = sys.intern(self.name)
+
+    def __copy__(self) -> Track:
+        new = object.__new__(Track)
+        for name in _TRACK_FIELDS:
+            setattr(new, name, getattr(self, name))
+        return new
+
+    def __deepcopy__(self, memo) -> Track:
+        # Every field is immutable, so a shallow copy is already deep
+        return self.__copy__()
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in _TRACK_FIELDS)
+
+    def __setstate__(self, state: tuple) -> None:
+        # Unpickling skips __post_init__, e.g. for tracks sent by the
+        # engine process, so the strings are interned here
+        for name, value in zip(_TRACK_FIELDS, state):
+            setattr(self, name, value)
+        self.__post_init__()
+
     def signature(self) -> str:
         """Return a string uniquely identifying the track."""
 
@@ -37,19 +73,48 @@ class Track:
             f"{self.language}-{'F' if self.forced else ''}-{self.name}"
         )
 
+_TRACK_FIELDS = Track.__slots__
+
+def file_stamp(path: Path) -> tuple[int, int] | None:
+    """Return ``(size, mtime_ns)`` of ``path`` or ``None`` if it is missing."""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+@dataclass
+class ProbeResult:
+    """Tracks read from a file together with the file's stamp at that time."""
+    tracks: List[Track]
+    stamp: tuple[int, int] | None
+
+    def is_current(self, path: Path) -> bool:
+        """Return ``True`` if ``path`` has not changed since it was probed."""
+        return self.stamp is not None and file_stamp(path) == self.stamp
+
 class CommandNotFoundError(RuntimeError):
     """Raised when an external command is missing."""
 
 
-def run_command(cmd: list[str], capture: bool = True) -> subprocess.CompletedProcess:
-    """Run an external command and return the completed process."""
+def run_command(
+    cmd: list[str], capture: bool = True, on_line=None, on_start=None
+) -> subprocess.CompletedProcess:
+    """Run an external command and return the completed process.
+
+    With ``capture`` the full output is returned, which is what probes
+    need. Otherwise the output is streamed: stdout lines go to ``on_line``
+    as they arrive and only a bounded tail of stderr is kept for errors.
+    ``on_start`` is called with the ``Popen`` object once the command has
+    been started so the caller can suspend or kill it.
+    """
 
     logger.debug("Running: %s", " ".join(cmd))
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        if not capture:
-            result.stdout = ""
-        return result
+        if capture and on_line is None and on_start is None:
+            return subprocess.run(cmd, check=True, capture_output=True, text=True)
+        return stream_command(cmd, on_line=on_line, on_start=on_start)
     except FileNotFoundError as exc:
         msg = f"{cmd[0]} not found on PATH"
         logger.error(msg)
@@ -59,67 +124,276 @@ def run_command(cmd: list[str], capture: bool = True) -> subprocess.CompletedPro
         logger.error("Command failed: %s\n%s", exc, err_msg)
         raise
 
-def query_tracks(source: Path, cfg: AppConfig) -> List[Track]:
-    """Query tracks using the configured backend."""
-    if cfg.backend == "ffmpeg":
-        result = run_command([
-            cfg.ffprobe_cmd,
-            "-v",
-            "quiet",
-            "-print_format",
-            "json",
-            "-show_streams",
-            str(source),
-        ])
-        data = json.loads(result.stdout)
-        tracks: List[Track] = []
-        for i, t in enumerate(data.get("streams", [])):
-            tags = t.get("tags", {})
-            disp = t.get("disposition", {})
-            forced = bool(disp.get("forced", 0))
-            def_flag = bool(disp.get("default", 0))
-            tracks.append(
-                Track(
-                    idx=i,
-                    tid=int(t.get("index", i)),
-                    type="subtitles" if t.get("codec_type") == "subtitle" else t.get("codec_type", ""),
-                    codec=t.get("codec_name", ""),
-                    language=tags.get("language", "und"),
-                    forced=forced,
-                    name=tags.get("title", ""),
-                    default_audio=def_flag if t.get("codec_type") == "audio" else False,
-                    default_subtitle=def_flag if t.get("codec_type") == "subtitle" else False,
-                    orig_forced=forced,
-                    orig_default_audio=def_flag if t.get("codec_type") == "audio" else False,
-                    orig_default_subtitle=def_flag if t.get("codec_type") == "subtitle" else False,
-                )
+
+def _query_tracks_native(source: Path) -> List[Track]:
+    """Read tracks straight from the Matroska header of ``source``.
+
+    Track ids follow the order of the ``TrackEntry`` elements, which is how
+    both mkvmerge and ffprobe number them.
+    """
+    layout = read_layout(source)
+    tracks: List[Track] = []
+    for i, entry in enumerate(layout.entries):
+        def_audio = entry.flag_default if entry.type == "audio" else False
+        def_sub = entry.flag_default if entry.type == "subtitles" else False
+        tracks.append(
+            Track(
+                idx=i,
+                tid=i,
+                type=entry.type,
+                codec=entry.codec_id,
+                language=entry.language,
+                forced=entry.flag_forced,
+                name=entry.name,
+                default_audio=def_audio,
+                default_subtitle=def_sub,
+                orig_forced=entry.flag_forced,
+                orig_default_audio=def_audio,
+                orig_default_subtitle=def_sub,
             )
-        return tracks
-    else:
-        result = run_command([cfg.mkvmerge_cmd, "-J", str(source)])
-        data = json.loads(result.stdout)
-        tracks: List[Track] = []
-        for i, t in enumerate(data.get("tracks", [])):
-            p = t.get("properties", {})
-            forced = p.get("forced_track", False)
-            def_flag = p.get("default_track", False)
-            tracks.append(
-                Track(
-                    idx=i,
-                    tid=int(t["id"]),
-                    type=t.get("type", ""),
-                    codec=p.get("codec_id", ""),
-                    language=p.get("language", "und"),
-                    forced=forced,
-                    name=p.get("track_name", ""),
-                    default_audio=def_flag if t.get("type") == "audio" else False,
-                    default_subtitle=def_flag if t.get("type") == "subtitles" else False,
-                    orig_forced=forced,
-                    orig_default_audio=def_flag if t.get("type") == "audio" else False,
-                    orig_default_subtitle=def_flag if t.get("type") == "subtitles" else False,
-                )
+        )
+    return tracks
+
+
+# ffprobe ``codec_name`` of Matroska CodecIDs; see :func:`ffprobe_codec`
+_FFPROBE_CODECS = {
+    "V_MPEG4/ISO/AVC": "h264",
+    "V_MPEGH/ISO/HEVC": "hevc",
+    "V_AV1": "av1",
+    "V_VP8": "vp8",
+    "V_VP9": "vp9",
+    "V_MPEG1": "mpeg1video",
+    "V_MPEG2": "mpeg2video",
+    "V_MPEG4/ISO/SP": "mpeg4",
+    "V_MPEG4/ISO/ASP": "mpeg4",
+    "V_MPEG4/ISO/AP": "mpeg4",
+    "V_THEORA": "theora",
+    "V_PRORES": "prores",
+    "V_FFV1": "ffv1",
+    "A_AC3": "ac3",
+    "A_EAC3": "eac3",
+    "A_DTS": "dts",
+    "A_DTS/EXPRESS": "dts",
+    "A_DTS/LOSSLESS": "dts",
+    "A_TRUEHD": "truehd",
+    "A_MLP": "mlp",
+    "A_FLAC": "flac",
+    "A_OPUS": "opus",
+    "A_VORBIS": "vorbis",
+    "A_MPEG/L1": "mp1",
+    "A_MPEG/L2": "mp2",
+    "A_MPEG/L3": "mp3",
+    "A_ALAC": "alac",
+    "A_TTA1": "tta",
+    "A_WAVPACK4": "wavpack",
+    "S_TEXT/UTF8": "subrip",
+    "S_TEXT/ASS": "ass",
+    "S_TEXT/SSA": "ass",
+    "S_ASS": "ass",
+    "S_SSA": "ass",
+    "S_TEXT/WEBVTT": "webvtt",
+    "S_VOBSUB": "dvd_subtitle",
+    "S_HDMV/PGS": "hdmv_pgs_subtitle",
+    "S_HDMV/TEXTST": "hdmv_text_subtitle",
+    "S_DVBSUB": "dvb_subtitle",
+}
+
+
+def ffprobe_codec(codec_id: str) -> str:
+    """Return the ffprobe codec name of the Matroska ``codec_id``.
+
+    Unknown CodecIDs are returned unchanged.
+    """
+    if codec_id.startswith("A_AAC"):
+        return "aac"  # A_AAC/MPEG4/LC and friends
+    return _FFPROBE_CODECS.get(codec_id, codec_id)
+
+
+def _ffprobe_cmd(source: Path, cfg: AppConfig) -> list[str]:
+    return [cfg.ffprobe_cmd, "-v", "quiet", "-print_format", "json", "-show_streams", str(source)]
+
+
+def _query_tracks_ffprobe(source: Path, cfg: AppConfig) -> List[Track]:
+    return _parse_ffprobe(run_command(_ffprobe_cmd(source, cfg)).stdout)
+
+
+def _parse_ffprobe(output: str) -> List[Track]:
+    data = json.loads(output)
+    tracks: List[Track] = []
+    for i, t in enumerate(data.get("streams", [])):
+        tags = t.get("tags", {})
+        disp = t.get("disposition", {})
+        forced = bool(disp.get("forced", 0))
+        def_flag = bool(disp.get("default", 0))
+        tracks.append(
+            Track(
+                idx=i,
+                tid=int(t.get("index", i)),
+                type="subtitles" if t.get("codec_type") == "subtitle" else t.get("codec_type", ""),
+                codec=t.get("codec_name", ""),
+                language=tags.get("language", "und"),
+                forced=forced,
+                name=tags.get("title", ""),
+                default_audio=def_flag if t.get("codec_type") == "audio" else False,
+                default_subtitle=def_flag if t.get("codec_type") == "subtitle" else False,
+                orig_forced=forced,
+                orig_default_audio=def_flag if t.get("codec_type") == "audio" else False,
+                orig_default_subtitle=def_flag if t.get("codec_type") == "subtitle" else False,
             )
-        return tracks
+        )
+    return tracks
+
+
+def _mkvmerge_cmd(source: Path, cfg: AppConfig) -> list[str]:
+    return [cfg.mkvmerge_cmd, "-J", str(source)]
+
+
+def _query_tracks_mkvmerge(source: Path, cfg: AppConfig) -> List[Track]:
+    return _parse_mkvmerge(run_command(_mkvmerge_cmd(source, cfg)).stdout)
+
+
+def _parse_mkvmerge(output: str) -> List[Track]:
+    data = json.loads(output)
+    tracks: List[Track] = []
+    for i, t in enumerate(data.get("tracks", [])):
+        p = t.get("properties", {})
+        forced = p.get("forced_track", False)
+        def_flag = p.get("default_track", False)
+        tracks.append(
+            Track(
+                idx=i,
+                tid=int(t["id"]),
+                type=t.get("type", ""),
+                codec=p.get("codec_id", ""),
+                language=p.get("language", "und"),
+                forced=forced,
+                name=p.get("track_name", ""),
+                default_audio=def_flag if t.get("type") == "audio" else False,
+                default_subtitle=def_flag if t.get("type") == "subtitles" else False,
+                orig_forced=forced,
+                orig_default_audio=def_flag if t.get("type") == "audio" else False,
+                orig_default_subtitle=def_flag if t.get("type") == "subtitles" else False,
+            )
+        )
+    return tracks
+
+
+_PROBES = {
+    "native": lambda source, cfg: _query_tracks_native(source),
+    "ffmpeg": _query_tracks_ffprobe,
+    "mkvtoolnix": _query_tracks_mkvmerge,
+}
+
+
+def probe_command(source: Path, cfg: AppConfig, engine: str) -> list[str]:
+    """Return the command probing ``source`` with the ``ffmpeg`` or ``mkvtoolnix`` engine."""
+    return _ffprobe_cmd(source, cfg) if engine == "ffmpeg" else _mkvmerge_cmd(source, cfg)
+
+
+def parse_probe(output: str, engine: str) -> List[Track]:
+    """Parse the JSON written by :func:`probe_command` for ``engine``."""
+    return _parse_ffprobe(output) if engine == "ffmpeg" else _parse_mkvmerge(output)
+
+
+_tool_versions: dict[str, str] = {}
+
+
+def _tool_version(cfg: AppConfig, engine: str) -> str:
+    """Return the version string of the tool used by ``engine``."""
+    if engine == "native":
+        return f"native-{PARSER_VERSION}"
+    if engine == "ffmpeg":
+        return _command_version(cfg.ffprobe_cmd, "-version")
+    return _command_version(cfg.mkvmerge_cmd, "--version")
+
+
+def _command_version(cmd: str, flag: str) -> str:
+    if cmd not in _tool_versions:
+        try:
+            out = run_command([cmd, flag]).stdout
+            _tool_versions[cmd] = (out.splitlines() or ["unknown"])[0].strip()
+        except Exception:
+            _tool_versions[cmd] = "unknown"
+    return _tool_versions[cmd]
+
+
+def backend_version(cfg: AppConfig) -> str:
+    """Return the version string of the tool that writes the outputs."""
+    if cfg.backend == "ffmpeg":
+        return _command_version(cfg.ffmpeg_cmd, "-version")
+    return _tool_version(cfg, "native" if cfg.backend == "native" else "mkvtoolnix")
+
+
+def probe_cache_key(source: Path, cfg: AppConfig, engine: str) -> CacheKey:
+    """Return the probe cache key of ``source`` for ``engine``."""
+    return file_key(source, engine, _tool_version(cfg, engine))
+
+
+def _cached_probe(source: Path, cfg: AppConfig, engine: str) -> List[Track]:
+    probe = _PROBES[engine]
+    if not cfg.probe_cache:
+        return probe(source, cfg)
+    cache = usable_cache(cfg.probe_cache, cfg.probe_cache_size)
+    if cache is None:
+        return probe(source, cfg)
+    try:
+        key = probe_cache_key(source, cfg, engine)
+    except OSError:
+        return probe(source, cfg)
+    try:
+        tracks = cache.get(key)
+    except CACHE_ERRORS as exc:
+        cache_failed(cfg.probe_cache, exc)
+        return probe(source, cfg)
+    if tracks is None:
+        tracks = probe(source, cfg)
+        try:
+            cache.put(key, tracks)
+        except CACHE_ERRORS as exc:
+            cache_failed(cfg.probe_cache, exc)
+    return tracks
+
+
+def query_tracks(source: Path, cfg: AppConfig) -> List[Track]:
+    """Query tracks using the configured backend.
+
+    Results are served from the probe cache when ``cfg.probe_cache`` is set
+    and the file has not changed since it was last probed.
+    """
+    if (cfg.probe_backend or cfg.backend) == "native":
+        try:
+            tracks = _cached_probe(source, cfg, "native")
+        except (MatroskaError, OSError) as exc:
+            logger.info("Native probe failed for %s (%s), using %s", source, exc, cfg.backend)
+        else:
+            if cfg.backend == "ffmpeg":
+                # Name codecs like files falling back to ffprobe, so equal
+                # layouts end up in the same group
+                for t in tracks:
+                    t.codec = ffprobe_codec(t.codec)
+            return tracks
+    return _cached_probe(source, cfg, "ffmpeg" if cfg.backend == "ffmpeg" else "mkvtoolnix")
+
+
+def probe_file(source: Path, cfg: AppConfig, query=None) -> ProbeResult:
+    """Query the tracks of ``source`` and remember the file stamp.
+
+    The stamp is taken before probing so a file modified meanwhile is
+    reported as stale later on. A flag edit interrupted by a crash is
+    rolled back first so the torn header is never shown.
+    """
+    recover(source)
+    stamp = file_stamp(source)
+    tracks = (query or query_tracks)(source, cfg)
+    return ProbeResult(tracks, stamp)
+
+def apply_wipe_all(tracks: List[Track]) -> None:
+    """Remove every subtitle unless the user already removed some."""
+    if not any(t.type == "subtitles" and t.removed for t in tracks):
+        for t in tracks:
+            if t.type == "subtitles":
+                t.removed = True
+
 
 def build_cmd(
     source: Path,
@@ -128,17 +402,25 @@ def build_cmd(
     cfg: AppConfig,
     wipe_forced: bool = False,
     wipe_all: bool = False,
+    progress: bool = False,
 ) -> list[str]:
-    """Build command for the configured backend."""
+    """Build command for the configured backend.
+
+    With ``progress`` the command additionally reports machine readable
+    progress on stdout (``-progress pipe:1`` or ``--gui-mode``).
+    """
     if wipe_all:
-        if not any(t.type == "subtitles" and t.removed for t in tracks):
-            for t in tracks:
-                if t.type == "subtitles":
-                    t.removed = True
+        apply_wipe_all(tracks)
 
     if cfg.backend == "ffmpeg":
-        return _build_cmd_ffmpeg(source, destination, tracks, cfg, wipe_forced)
-    return _build_cmd_mkvmerge(source, destination, tracks, cfg, wipe_forced)
+        cmd = _build_cmd_ffmpeg(source, destination, tracks, cfg, wipe_forced)
+        if progress:
+            cmd[1:1] = ["-progress", "pipe:1", "-nostats"]
+        return cmd
+    cmd = _build_cmd_mkvmerge(source, destination, tracks, cfg, wipe_forced)
+    if progress:
+        cmd.insert(1, "--gui-mode")
+    return cmd
 
 
 def _build_cmd_mkvmerge(
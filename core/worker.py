@@ -0,0 +1,243 @@
+"""Distributed workers: ``mkv-cleaner worker``.
+
+Several machines work through one job queue, a SQLite database kept next
+to the media on a network share::
+
+    Q=/media/.mkv-cleaner-queue.sqlite3
+    mkv-cleaner worker --queue $Q --add-only --tracks "audio=jpn;subs=eng" /media/anime
+    mkv-cleaner worker --queue $Q --backend native --jobs 4    # on every node
+    mkv-cleaner worker --queue $Q --status > results.jsonl
+
+Workers claim one job per free slot with a lease and renew it while the
+job runs. When a worker dies its leases run out and other workers pick
+the jobs up again; a job whose lease expired ``--max-attempts`` times is
+marked failed instead, as it may be what kills the workers. Results are
+written to the queue, so ``--status`` shows the outcome of the whole
+batch on any machine.
+
+Paths below the directory of the queue are stored relative to it, so the
+share may be mounted at a different place on every node. The queue uses
+SQLite's rollback journal rather than WAL, which needs memory shared
+between the processes and does not work across machines; claims rely on
+the byte-range locks of the filesystem (NFSv4, or SMB with locking; not
+``nolock`` mounts).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List
+
+from core.cli import add_config_options, config_from_args, make_scheduler, sources_from_args
+from core.config import AppConfig, setup_logging
+from core.engine import CANCELLED, DONE, FAILED, QUEUED, Job, ProcessingEngine, execute_job
+from core.jobstore import JobStore
+from core.selection import TrackSpec, parse_spec
+from core.service import execute_with_spec
+
+logger = logging.getLogger("core.worker")
+
+LEASE_SECONDS = 120.0
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 5.0
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def open_queue(path: str | Path) -> JobStore:
+    """Open the shared queue at ``path``, creating it if needed."""
+    path = Path(path)
+    return JobStore(path, journal_mode="DELETE", root=path.parent)
+
+
+class Worker:
+    """Claim jobs from a shared ``store`` and run them.
+
+    Up to ``cfg.max_workers`` jobs are claimed at once, each for ``lease``
+    seconds; leases are renewed four times per period while the jobs run.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        cfg: AppConfig,
+        name: str | None = None,
+        lease: float = LEASE_SECONDS,
+        max_attempts: int = MAX_ATTEMPTS,
+    ):
+        self.store = store
+        self.cfg = cfg
+        self.name = name or worker_name()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._run = execute_job
+        if cfg.job_journal:
+            from core.journal import open_journal
+
+            self._run = open_journal(cfg.job_journal).wrap(execute_job)
+        self.engine = ProcessingEngine(self._execute, cfg.max_workers, make_scheduler(cfg))
+        self._jobs: dict[int, Job] = {}
+        self._specs: dict[int, TrackSpec] = {}
+        self._wake = threading.Event()
+        self._stopping = False
+        self.finished = {DONE: 0, FAILED: 0, CANCELLED: 0}
+
+    def _execute(self, job: Job) -> None:
+        self._wake.set()  # a slot was taken, the next job may be claimed
+        try:
+            execute_with_spec(job, self._specs.pop(job.id), self._run)
+        finally:
+            self._wake.set()
+
+    def _claim(self) -> None:
+        """Claim jobs while the engine can start them.
+
+        At most one claimed job waits here for a free slot, e.g. while its
+        device is busy; the rest stay in the queue for other workers.
+        """
+        while len(self._jobs) < self.engine.max_workers:
+            if any(job.state == QUEUED for job in self._jobs.values()):
+                return
+            row = self.store.claim(self.name, self.lease, self.max_attempts)
+            if row is None:
+                return
+            job = Job(
+                self.store.resolve(row["source"]),
+                [],
+                wipe_all=row["wipe_all"],
+                config=self.cfg,
+                id=row["id"],
+            )
+            logger.info("Claimed job %d: %s", job.id, job.source)
+            self._specs[job.id] = parse_spec(row["tracks"])
+            self._jobs[job.id] = job
+            self.engine.submit([job])
+
+    def _renew(self) -> None:
+        lost = [j for j in self._jobs.values() if not self.store.renew(j, self.name, self.lease)]
+        for job in lost:
+            logger.warning("Lost job %d (%s), stopping it", job.id, job.source)
+        self.engine.cancel(lost)
+
+    def _record(self) -> None:
+        for job in self.engine.clear_finished():
+            self._jobs.pop(job.id, None)
+            self._specs.pop(job.id, None)
+            if self.store.update(job, self.name):
+                self.finished[job.state] += 1
+
+    def stop(self) -> None:
+        """Make :meth:`run` return; may be called from any thread or a signal handler."""
+        self._stopping = True
+        self._wake.set()
+
+    def run(self, exit_when_idle: bool = False, poll: float = POLL_SECONDS) -> dict[str, int]:
+        """Process jobs until stopped, or until the queue is empty with
+        ``exit_when_idle``. Returns how many jobs finished in each state."""
+        renewed = time.monotonic()
+        try:
+            while not self._stopping:
+                self._wake.clear()
+                self._record()
+                self._claim()
+                if exit_when_idle and not self._jobs:
+                    break
+                if time.monotonic() - renewed >= self.lease / 4:
+                    self._renew()
+                    renewed = time.monotonic()
+                self._wake.wait(min(poll, self.lease / 4))
+        finally:
+            self.close()
+        return dict(self.finished)
+
+    def close(self, timeout: float = 10) -> None:
+        """Stop the running jobs and give them back to the queue."""
+        self.engine.cancel_all()
+        self.engine.wait(timeout)
+        self.engine.shutdown(wait=False)
+        for job in self.engine.clear_finished():
+            self._jobs.pop(job.id, None)
+            if job.state == CANCELLED:
+                self.store.release(job.id, self.name)
+            elif self.store.update(job, self.name):
+                self.finished[job.state] += 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="mkv-cleaner worker",
+        description="Process jobs from a queue shared by several machines.",
+    )
+    parser.add_argument("--queue", required=True, help="shared queue database")
+    parser.add_argument("inputs", nargs="*", help="files or directories to add to the queue")
+    parser.add_argument("--manifest", help="JSON Lines file with sources to add, - for stdin")
+    parser.add_argument(
+        "--tracks", default="", help="track selection spec of added files, e.g. 'audio=jpn'"
+    )
+    parser.add_argument("--wipe-subs", action="store_true", help="remove all subtitles")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--add-only", action="store_true", help="add the inputs, do not process")
+    mode.add_argument("--status", action="store_true", help="print the jobs of the queue")
+    parser.add_argument("--name", help="worker name, by default host:pid")
+    parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease in seconds")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    parser.add_argument(
+        "--exit-when-idle", action="store_true", help="stop once the queue is empty"
+    )
+    add_config_options(parser)
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    return parser
+
+
+def print_status(store: JobStore, out=None) -> None:
+    """Write every job of ``store`` as JSON Lines, then a summary line."""
+    out = out or sys.stdout
+    for job in store.jobs():
+        out.write(json.dumps(job) + "\n")
+    out.write(json.dumps({"summary": store.counts()}) + "\n")
+    out.flush()
+
+
+def main(argv: List[str] | None = None) -> int:
+    """Run ``mkv-cleaner worker`` with ``argv`` and return the exit status."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    levels = (logging.WARNING, logging.INFO, logging.DEBUG)
+    setup_logging(levels[min(args.verbose, 2)])
+    try:
+        spec = parse_spec(args.tracks)
+        cfg = config_from_args(args)
+        store = open_queue(args.queue)
+        if args.inputs or args.manifest:
+            ids = store.add(sources_from_args(args, cfg, spec))
+            print(json.dumps({"added": len(ids)}), flush=True)
+    except (ValueError, OSError) as exc:
+        parser.error(str(exc))
+    if args.status:
+        print_status(store)
+        return 0
+    if args.add_only:
+        return 0
+    worker = Worker(store, cfg, args.name, args.lease, args.max_attempts)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        finished = worker.run(args.exit_when_idle)
+    except KeyboardInterrupt:
+        return 130
+    print(json.dumps({"worker": worker.name, "summary": finished}), flush=True)
+    return 1 if finished[FAILED] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,12 +9,12 @@ Windows
 
 Widgets
     Toolbar and table classes such as ``GroupBar``, ``ActionBar``,
-    ``TrackTable`` and ``FileList`` plus delegates and helpers like
-    ``LogoSplash``.
+    ``TrackTable``, ``FileList`` and ``QueuePanel`` plus delegates and
+    helpers like ``LogoSplash``.
 
 Logic mixins
-    ``SettingsLogic``, ``GroupLogic``, ``TableLogic``, ``ActionsLogic``
-    and ``ShortcutLogic`` provide reusable behaviour combined in
-    ``MainWindow``.
+    ``SettingsLogic``, ``GroupLogic``, ``TableLogic``, ``ActionsLogic``,
+    ``ShortcutLogic`` and ``QueueLogic`` provide reusable behaviour
+    combined in ``MainWindow``.
 """
 
@@ -1,8 +1,7 @@
 from PySide6.QtCore import Qt
 from PySide6.QtWidgets import QMessageBox
-from core.tracks import query_tracks, build_cmd, run_command
+from core.tracks import run_command
 from .subtitle_preview import SubtitlePreviewWindow
-from .processing import process_files
 
 
 class ActionsLogic:
@@ -161,36 +160,20 @@ class ActionsLogic:
         if not files:
             QMessageBox.information(self, "No files", "No files in this group")
             return
-        jobs = [(f, self.groups[self.current_sig]) for f in files]
+        probes = getattr(self, "file_probes", {})
+        jobs = [(f, self.groups[self.current_sig], probes.get(f)) for f in files]
         wipe = self.action_bar.btn_wipe_all.isChecked() or getattr(self, "wipe_all_default", False)
-        process_files(
-            jobs,
-            self.app_config.max_workers,
-            lambda src: query_tracks(src, self.app_config),
-            lambda s, d, t, wipe_forced=False, wipe_all=False: build_cmd(s, d, t, self.app_config, wipe_forced, wipe_all),
-            run_command,
-            self.app_config.output_dir,
-            wipe,
-            parent=self,
-        )
+        self.enqueue_jobs(jobs, wipe)
 
     def process_all(self):
         if not self.groups:
             QMessageBox.information(self, "No files", "No files loaded")
             return
         jobs = []
+        probes = getattr(self, "file_probes", {})
         for sig, files in self.file_groups.items():
             tracks = self.groups[sig]
             for f in files:
-                jobs.append((f, tracks))
+                jobs.append((f, tracks, probes.get(f)))
         wipe = self.action_bar.btn_wipe_all.isChecked() or getattr(self, "wipe_all_default", False)
-        process_files(
-            jobs,
-            self.app_config.max_workers,
-            lambda src: query_tracks(src, self.app_config),
-            lambda s, d, t, wipe_forced=False, wipe_all=False: build_cmd(s, d, t, self.app_config, wipe_forced, wipe_all),
-            run_command,
-            self.app_config.output_dir,
-            wipe,
-            parent=self,
-        )
+        self.enqueue_jobs(jobs, wipe)
@@ -14,6 +14,8 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import QSettings
 from PySide6.QtGui import QKeySequence, QShortcut
 
+from core.config import user_cache_dir
+
 
 class HotkeysDialog(QDialog):
     def __init__(self, hotkeys: dict[str, list[str]], parent=None):
@@ -36,13 +38,24 @@ class PreferencesDialog(QDialog):
         layout = QFormLayout(self)
 
         self.backend = QComboBox(self)
-        self.backend.addItems(["mkvtoolnix", "ffmpeg"])
+        self.backend.addItems(["mkvtoolnix", "ffmpeg", "native"])
         self.backend.setCurrentText(self.settings.value("backend", "ffmpeg"))
         self.backend.setToolTip(
             "Select the underlying program used for processing your videos."
         )
         layout.addRow("Backend:", self.backend)
 
+        self.probe_backend = QComboBox(self)
+        self.probe_backend.addItem("Same as backend", "")
+        self.probe_backend.addItem("Native (built-in)", "native")
+        idx = self.probe_backend.findData(self.settings.value("probe_backend", ""))
+        self.probe_backend.setCurrentIndex(max(idx, 0))
+        self.probe_backend.setToolTip(
+            "Read track information directly from the Matroska header instead of "
+            "running ffprobe or mkvmerge. Falls back to the backend for other files."
+        )
+        layout.addRow("Track probe:", self.probe_backend)
+
         self.merge_path = QLineEdit(self)
         self.merge_path.setText(self.settings.value("mkvmerge_cmd", "mkvmerge"))
         btn_m = QPushButton("…", self)
@@ -78,6 +91,105 @@ class PreferencesDialog(QDialog):
         )
         layout.addRow("Default output folder:", self.output_dir)
 
+        self.inplace_flags = QCheckBox(self)
+        self.inplace_flags.setChecked(self.settings.value("inplace_flags", True, type=bool))
+        self.inplace_flags.setToolTip(
+            "When no track is removed, change default/forced flags by patching the "
+            "file header instead of remuxing the whole file."
+        )
+        layout.addRow("Patch flags without remuxing:", self.inplace_flags)
+
+        self.noop_policy = QComboBox(self)
+        self.noop_policy.addItem("Clone (reflink)", "reflink")
+        self.noop_policy.addItem("Hard link", "hardlink")
+        self.noop_policy.addItem("Copy", "copy")
+        self.noop_policy.addItem("Skip", "skip")
+        self.noop_policy.addItem("Remux anyway", "remux")
+        idx = self.noop_policy.findData(self.settings.value("noop_policy", "reflink"))
+        self.noop_policy.setCurrentIndex(max(idx, 0))
+        self.noop_policy.setToolTip(
+            "What to do with files that already have the requested tracks and flags. "
+            "Clones share disk blocks with the original where the filesystem allows "
+            "it and fall back to a copy."
+        )
+        layout.addRow("Unchanged files:", self.noop_policy)
+
+        self.replace_original = QCheckBox(self)
+        self.replace_original.setChecked(self.settings.value("replace_original", False, type=bool))
+        self.replace_original.setToolTip(
+            "Replace the original files instead of writing to the output folder. "
+            "Each file is written to a temporary file next to it and swapped in "
+            "only once complete."
+        )
+        layout.addRow("Replace original files:", self.replace_original)
+
+        self.backup_hours = QComboBox(self)
+        for label, hours in (("None", 0), ("1 hour", 1), ("1 day", 24), ("1 week", 168)):
+            self.backup_hours.addItem(label, hours)
+        idx = self.backup_hours.findData(int(float(self.settings.value("backup_hours", 24))))
+        self.backup_hours.setCurrentIndex(idx if idx >= 0 else 2)
+        self.backup_hours.setToolTip(
+            "How long replaced originals are kept as hidden backups next to the file."
+        )
+        layout.addRow("Keep backups of replaced files:", self.backup_hours)
+
+        self.autotune = QCheckBox(self)
+        self.autotune.setChecked(self.settings.value("autotune", False, type=bool))
+        self.autotune.setToolTip(
+            "Measure the throughput of finished jobs and adjust the number of files "
+            "processed at once. The best setting is remembered for the next run."
+        )
+        layout.addRow("Tune parallel jobs automatically:", self.autotune)
+
+        self.job_order = QComboBox(self)
+        self.job_order.addItem("Largest first", "largest")
+        self.job_order.addItem("Smallest first", "smallest")
+        self.job_order.addItem("Mixed", "mixed")
+        self.job_order.addItem("As queued", "fifo")
+        idx = self.job_order.findData(self.settings.value("job_order", "largest"))
+        self.job_order.setCurrentIndex(max(idx, 0))
+        self.job_order.setToolTip(
+            "Order in which queued files are processed. Largest first finishes a "
+            "batch soonest, smallest first shows results quickly, mixed alternates. "
+            "Takes effect after a restart."
+        )
+        layout.addRow("Processing order:", self.job_order)
+
+        self.disk_check = QCheckBox(self)
+        self.disk_check.setChecked(self.settings.value("disk_check", True, type=bool))
+        self.disk_check.setToolTip(
+            "Only start a file when its output fits on the destination drive with "
+            "some space to spare. Files that can never fit fail right away."
+        )
+        layout.addRow("Check free space first:", self.disk_check)
+
+        self.resume_jobs = QCheckBox(self)
+        self.resume_jobs.setChecked(self.settings.value("resume_jobs", True, type=bool))
+        self.resume_jobs.setToolTip(
+            "Remember finished files and skip them when the same files are processed "
+            "again with the same tracks and backend, e.g. after a crash."
+        )
+        layout.addRow("Skip already processed files:", self.resume_jobs)
+
+        self.engine_process = QCheckBox(self)
+        self.engine_process.setChecked(self.settings.value("engine_process", False, type=bool))
+        self.engine_process.setToolTip(
+            "Process files in a separate background program. The window stays responsive, "
+            "and the queue keeps running after the window is closed; it is shown again "
+            "when the window is reopened. Takes effect after a restart."
+        )
+        layout.addRow("Process in the background:", self.engine_process)
+
+        self.probe_cache = QLineEdit(self)
+        self.probe_cache.setText(
+            self.settings.value("probe_cache", str(user_cache_dir() / "probe_cache.sqlite3"))
+        )
+        self.probe_cache.setToolTip(
+            "File used to remember track information of already opened videos. "
+            "Leave empty to disable the cache."
+        )
+        layout.addRow("Probe cache file:", self.probe_cache)
+
         self.wipe_all_def = QCheckBox(self)
         self.wipe_all_def.setChecked(self.settings.value("wipe_all_default", False, type=bool))
         self.wipe_all_def.setToolTip(
@@ -137,11 +249,22 @@ class PreferencesDialog(QDialog):
 
     def accept(self) -> None:
         self.settings.setValue("backend", self.backend.currentText())
+        self.settings.setValue("probe_backend", self.probe_backend.currentData())
         self.settings.setValue("mkvmerge_cmd", self.merge_path.text())
         self.settings.setValue("mkvextract_cmd", self.extract_path.text())
         self.settings.setValue("ffmpeg_cmd", self.ffmpeg_path.text())
         self.settings.setValue("ffprobe_cmd", self.ffprobe_path.text())
         self.settings.setValue("output_dir", self.output_dir.text())
+        self.settings.setValue("inplace_flags", self.inplace_flags.isChecked())
+        self.settings.setValue("noop_policy", self.noop_policy.currentData())
+        self.settings.setValue("replace_original", self.replace_original.isChecked())
+        self.settings.setValue("backup_hours", self.backup_hours.currentData())
+        self.settings.setValue("autotune", self.autotune.isChecked())
+        self.settings.setValue("job_order", self.job_order.currentData())
+        self.settings.setValue("disk_check", self.disk_check.isChecked())
+        self.settings.setValue("resume_jobs", self.resume_jobs.isChecked())
+        self.settings.setValue("engine_process", self.engine_process.isChecked())
+        self.settings.setValue("probe_cache", self.probe_cache.text())
         self.settings.setValue("wipe_all_default", self.wipe_all_def.isChecked())
         self.settings.setValue("track_font_size", int(self.track_font_combo.currentText()))
         self.settings.setValue(
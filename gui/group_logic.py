@@ -2,14 +2,29 @@
 
 from pathlib import Path
 import copy
+from PySide6.QtCore import QTimer
 from PySide6.QtWidgets import QMessageBox
-from core.tracks import query_tracks
+from core.tracks import query_tracks, probe_file
+from core.probe_cache import usable_cache
+from core.probe_pool import ProbePool
+
+# Interval of the timer collecting background probe results
+IMPORT_POLL_MS = 100
+# Maximum number of probe results added to groups per timer tick
+IMPORT_BATCH = 200
+# Failed files listed by name in the summary dialog
+IMPORT_ERRORS_SHOWN = 20
 
 
 class GroupLogic:
     def _setup_group_logic(self):
         self.groups = {}  # {sig: [Track]}
         self.file_groups = {}  # {sig: [Path]}
+        self.file_probes = {}  # {Path: ProbeResult}
+        self._probe_pool = None
+        self._import_timer = None
+        self._import_pending = set()
+        self._import_errors = []
         self.wipe_sub_state = {}
         self.current_sig = None
         if hasattr(self, "file_list"):
@@ -19,6 +34,8 @@ class GroupLogic:
             self.group_bar.nextClicked.connect(self._on_next_group)
             self.group_bar.update_nav_buttons(None)
             self._update_process_buttons()
+        if hasattr(self, "import_progress"):
+            self.import_progress.cancelClicked.connect(self.cancel_import)
 
     def _on_group_button_clicked(self, btn):
         idx = None
@@ -47,32 +64,113 @@ class GroupLogic:
         self._update_process_buttons()
 
     def add_files_to_groups(self, paths):
+        """Probe ``paths`` on the calling thread and add them to their groups."""
+        errors = []
+        touched = set()
         for p in paths:
             path = Path(p)
             try:
-                tracks = query_tracks(path, self.app_config)
+                probe = probe_file(path, self.app_config, query_tracks)
             except Exception as exc:
-                QMessageBox.warning(
-                    self,
-                    "Failed to read file",
-                    f"{path.name}: {exc}",
-                )
+                errors.append((path, exc))
                 continue
-            sig = ";".join(t.signature() for t in tracks)
-            if sig not in self.groups:
-                self.groups[sig] = [copy.deepcopy(t) for t in tracks]
-                self.file_groups[sig] = []
-                tooltip = str(path.name)
-                btn = self.group_bar.add_group_button(sig, tooltip=tooltip)
-                btn.clicked.connect(
-                    lambda checked, b=btn: self._on_group_button_clicked(b)
-                )
-            if path not in self.file_groups[sig]:
-                self.file_groups[sig].append(path)
+            touched.add(self._add_probe_result(path, probe))
+        self._finish_group_update(touched)
+        self._report_import_errors(errors)
+
+    def import_files(self, paths):
+        """Probe ``paths`` in the background and add groups as probes finish.
+
+        Results are collected by a timer on the GUI thread in batches of
+        ``IMPORT_BATCH`` files so the window stays responsive.
+        """
+        paths = [Path(p) for p in paths if Path(p) not in self._import_pending]
+        if not paths:
+            return
+        if self._probe_pool is None:
+            cfg = self.app_config
+            self._probe_pool = ProbePool(
+                lambda p: probe_file(p, cfg, query_tracks), cfg.probe_workers
+            )
+            self._import_errors = []
+            if self._import_timer is None:
+                self._import_timer = QTimer(self)
+                self._import_timer.setInterval(IMPORT_POLL_MS)
+                self._import_timer.timeout.connect(self._poll_import)
+            self._import_timer.start()
+        self._import_pending.update(paths)
+        self._probe_pool.submit(paths)
+        self._update_import_progress()
+
+    def _poll_import(self):
+        pool = self._probe_pool
+        if pool is None:
+            return
+        touched = set()
+        for outcome in pool.drain(IMPORT_BATCH):
+            self._import_pending.discard(outcome.path)
+            if outcome.error is not None:
+                self._import_errors.append((outcome.path, outcome.error))
+            else:
+                touched.add(self._add_probe_result(outcome.path, outcome.result))
+        if touched:
+            self._finish_group_update(touched)
+        if pool.done:
+            self._end_import()
+        else:
+            self._update_import_progress()
+
+    def cancel_import(self):
+        """Stop a running background import, keeping groups found so far."""
+        if self._probe_pool is None:
+            return
+        self._probe_pool.cancel()
+        self._end_import(cancelled=True)
+
+    def _end_import(self, cancelled=False):
+        if self._import_timer is not None:
+            self._import_timer.stop()
+        pool, self._probe_pool = self._probe_pool, None
+        if pool is not None:
+            pool.shutdown()
+        self._import_pending.clear()
+        progress = getattr(self, "import_progress", None)
+        if progress is not None:
+            progress.hide()
+        if cancelled and hasattr(self, "status_bar"):
+            self.status_bar.showMessage("Import cancelled", 4000)
+        self._report_import_errors(self._import_errors)
+        self._import_errors = []
+
+    def _update_import_progress(self):
+        progress = getattr(self, "import_progress", None)
+        if progress is not None and self._probe_pool is not None:
+            progress.set_progress(self._probe_pool.finished, self._probe_pool.total)
+
+    def _add_probe_result(self, path, probe):
+        """Store ``probe`` for ``path`` and return the signature of its group."""
+        tracks = probe.tracks
+        self.file_probes[path] = probe
+        sig = ";".join(t.signature() for t in tracks)
+        if sig not in self.groups:
+            self.groups[sig] = [copy.deepcopy(t) for t in tracks]
+            self.file_groups[sig] = []
+            tooltip = str(path.name)
+            btn = self.group_bar.add_group_button(sig, tooltip=tooltip)
+            btn.clicked.connect(
+                lambda checked, b=btn: self._on_group_button_clicked(b)
+            )
+        if path not in self.file_groups[sig]:
+            self.file_groups[sig].append(path)
+        return sig
+
+    def _finish_group_update(self, sigs):
+        """Refresh tooltips, file list and navigation after adding files."""
+        for sig in sigs:
             filestr = "\n".join(str(x.name) for x in self.file_groups[sig])
             self.group_bar.update_button_tooltip(sig, filestr)
-            if sig == self.current_sig and hasattr(self, "file_list"):
-                self.file_list.update_files(self.file_groups[sig])
+        if self.current_sig in sigs and hasattr(self, "file_list"):
+            self.file_list.update_files(self.file_groups[self.current_sig])
         if self.group_bar.group_buttons:
             if self.current_sig is None:
                 self.group_bar.set_checked(0)
@@ -81,15 +179,48 @@ class GroupLogic:
                 idx = self._current_group_idx()
                 self.group_bar.update_nav_buttons(idx)
         self._update_process_buttons()
+        self._show_probe_cache_stats()
+
+    def _report_import_errors(self, errors):
+        """Show one summary dialog for all files that could not be read."""
+        if not errors:
+            return
+        shown = errors[:IMPORT_ERRORS_SHOWN]
+        msg = "\n".join(f"{path.name}: {exc}" for path, exc in shown)
+        if len(errors) > len(shown):
+            msg += f"\n… and {len(errors) - len(shown)} more"
+        QMessageBox.warning(
+            self,
+            "Failed to read files" if len(errors) > 1 else "Failed to read file",
+            msg,
+        )
+
+    def _show_probe_cache_stats(self):
+        cfg = getattr(self, "app_config", None)
+        if not getattr(cfg, "probe_cache", "") or not hasattr(self, "status_bar"):
+            return
+        cache = usable_cache(cfg.probe_cache, cfg.probe_cache_size)
+        if cache is None:
+            return
+        stats = cache.stats()
+        self.status_bar.showMessage(
+            f"Probe cache: {stats['hits']} hits, {stats['misses']} misses", 4000
+        )
 
     def _reload_all_groups(self):
         """Re-import already loaded files using the current backend."""
         all_paths = []
         for files in self.file_groups.values():
             all_paths.extend(files)
+        if self._probe_pool is not None:
+            all_paths.extend(self._import_pending)
+            self._probe_pool.cancel()
+            self._import_errors = []
+            self._end_import()
 
         self.groups.clear()
         self.file_groups.clear()
+        self.file_probes.clear()
         self.wipe_sub_state.clear()
         self.current_sig = None
         self.group_bar.clear()
@@ -99,7 +230,7 @@ class GroupLogic:
         self._update_process_buttons()
 
         if all_paths:
-            self.add_files_to_groups(all_paths)
+            self.import_files(all_paths)
 
     def _current_group_idx(self):
         for i, (sig, _) in enumerate(self.group_bar.group_buttons):
@@ -149,6 +280,8 @@ class GroupLogic:
         if sig is None:
             return
         if sig in self.file_groups:
+            for f in self.file_groups[sig]:
+                self.file_probes.pop(f, None)
             self.file_groups[sig] = []
         if hasattr(self, "file_list"):
             self.file_list.update_files([])
@@ -160,7 +293,8 @@ class GroupLogic:
         if sig not in self.groups:
             return
         self.groups.pop(sig, None)
-        self.file_groups.pop(sig, None)
+        for f in self.file_groups.pop(sig, None) or []:
+            self.file_probes.pop(f, None)
         self.wipe_sub_state.pop(sig, None)
 
         idx = None
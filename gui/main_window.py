@@ -6,23 +6,29 @@ from PySide6.QtWidgets import (
     QWidget,
     QFileDialog,
     QStatusBar,
+    QDockWidget,
 )
-from PySide6.QtCore import QSettings
+from PySide6.QtCore import QSettings, Qt
 import os
 
 from gui.widgets.group_bar import GroupBar
 from gui.widgets.action_bar import ActionBar
 from gui.widgets.track_table import TrackTable
 from gui.widgets.file_list import FileList
+from gui.widgets.import_progress import ImportProgress
+from gui.widgets.queue_panel import QueuePanel
 
 from .settings_logic import SettingsLogic
 from .group_logic import GroupLogic
 from .table_logic import TableLogic
 from .actions_logic import ActionsLogic
 from .shortcut_logic import ShortcutLogic
+from .queue_logic import QueueLogic
 
 
-class MainWindow(QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogic, ShortcutLogic):
+class MainWindow(
+    QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogic, ShortcutLogic, QueueLogic
+):
     """Main application window bundling all interface components."""
     def __init__(self):
         super().__init__()
@@ -38,6 +44,8 @@ class MainWindow(QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogi
         self.file_list = FileList(self)
         self.status_bar = QStatusBar(self)
         self.status_bar.setSizeGripEnabled(False)
+        self.import_progress = ImportProgress(self)
+        self.status_bar.addPermanentWidget(self.import_progress)
 
         main_vbox = QVBoxLayout()
         main_vbox.setContentsMargins(0, 0, 0, 0)
@@ -52,6 +60,12 @@ class MainWindow(QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogi
         container.setLayout(main_vbox)
         self.setCentralWidget(container)
 
+        self.queue_panel = QueuePanel(self)
+        self.queue_dock = QDockWidget("Queue", self)
+        self.queue_dock.setObjectName("QueueDock")
+        self.queue_dock.setWidget(self.queue_panel)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.queue_dock)
+        self.queue_dock.hide()
 
 
         self.group_bar.preferencesClicked.connect(self._open_preferences)
@@ -64,6 +78,7 @@ class MainWindow(QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogi
         self._setup_table_logic()
         self._setup_action_logic()
         self._setup_shortcut_logic()
+        self._setup_queue_logic()
 
     def _adjust_window_width(self):
         """Shrink the window horizontally to the width required by the action bar."""
@@ -79,4 +94,4 @@ class MainWindow(QMainWindow, SettingsLogic, GroupLogic, TableLogic, ActionsLogi
         if files:
             self.last_dir = os.path.dirname(files[0])
             self.settings.setValue("last_dir", self.last_dir)
-            self.add_files_to_groups(files)
+            self.import_files(files)
@@ -181,3 +181,102 @@ class TrackTableModel(QAbstractTableModel):
         if 0 <= row < len(self.tracks):
             return self.tracks[row]
         raise IndexError(row)
+
+
+class JobTableModel(QAbstractTableModel):
+    """Rows of the processing queue, one per :class:`~core.engine.Job`."""
+
+    HEADERS = ["File", "Status", "Progress", "Speed", "ETA", "Output"]
+
+    def __init__(self):
+        super().__init__()
+        self.jobs = []
+        self._rows = {}  # {job id: row}
+        self._state_colors = {
+            "running": QColor(COLORS['accent']),
+            "paused": QColor(COLORS['sub_tint']),
+            "done": QColor(COLORS['video_tint']),
+            "failed": QColor(COLORS['remove_tint']),
+        }
+        for col in self._state_colors.values():
+            col.setAlpha(60)
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.jobs)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self.jobs):
+            return None
+        job = self.jobs[index.row()]
+        c = index.column()
+        if role == Qt.DisplayRole:
+            if c == 0:
+                return job.source.name
+            if c == 1:
+                return job.state
+            if c == 2:
+                return f"{job.progress.percent:.0f}%" if job.progress else ""
+            if c == 3:
+                return self._speed(job)
+            if c == 4:
+                return self._eta(job)
+            if c == 5:
+                if job.error:
+                    return job.error
+                return str(job.destination) if job.destination else ""
+        if role == Qt.ToolTipRole:
+            return job.error or str(job.source)
+        if role == Qt.BackgroundRole and c == 1:
+            return self._state_colors.get(job.state)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    @staticmethod
+    def _speed(job):
+        if job.progress is None or job.state != "running" and not job.progress.finished:
+            return ""
+        return f"{job.progress.mb_per_s:.1f} MB/s"
+
+    @staticmethod
+    def _eta(job):
+        if job.progress is None or job.state != "running":
+            return ""
+        if job.progress.stalled:
+            return "stalled"
+        eta = job.progress.eta
+        if eta is None:
+            return "…"
+        minutes, seconds = divmod(int(eta), 60)
+        return f"{minutes}:{seconds:02d}"
+
+    def update_jobs(self, jobs):
+        """Insert new jobs and refresh rows of known ones."""
+        new = [j for j in jobs if j.id not in self._rows]
+        new_ids = {j.id for j in new}
+        if new:
+            first = len(self.jobs)
+            self.beginInsertRows(QModelIndex(), first, first + len(new) - 1)
+            for job in new:
+                self._rows[job.id] = len(self.jobs)
+                self.jobs.append(job)
+            self.endInsertRows()
+        rows = [self._rows[j.id] for j in jobs if j.id not in new_ids]
+        if rows:
+            self.dataChanged.emit(
+                self.index(min(rows), 0), self.index(max(rows), self.columnCount() - 1)
+            )
+
+    def remove_jobs(self, jobs):
+        """Drop ``jobs`` from the table."""
+        gone = {j.id for j in jobs}
+        self.beginResetModel()
+        self.jobs = [j for j in self.jobs if j.id not in gone]
+        self._rows = {j.id: i for i, j in enumerate(self.jobs)}
+        self.endResetModel()
@@ -0,0 +1,303 @@
+"""Logic mixin feeding processing jobs to the background engine."""
+
+import copy
+import itertools
+import logging
+from collections import deque
+from pathlib import Path
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QMessageBox
+
+from core.diskspace import DiskSpace
+from core.engine import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    QUEUED,
+    Job,
+    ProcessingEngine,
+    configure_engine,
+    execute_job,
+)
+from core.enginehost import EngineClient
+from core.inplace import recover_dirs
+from core.journal import RESUMED, open_journal, run_journaled
+from core.pipeline import QUEUE_SIZE
+from core.replace import prune_backups
+from core.scheduler import CostModel, DeviceScheduler
+from .processing import confirm_overwrite
+
+logger = logging.getLogger(__name__)
+
+# Refresh interval of the queue panel. Job updates arriving in between are
+# coalesced into a single model update.
+QUEUE_REFRESH_MS = 250
+
+
+def _execute(job):
+    """Run ``job``, recording it in the configured job journal."""
+    run_journaled(job, execute_job)
+
+
+class QueueLogic:
+    def _setup_queue_logic(self):
+        self.engine = None
+        self._queue_timer = None
+        # Generators of jobs not handed to the engine yet
+        self._feeds = deque()
+        self._batch_done = 0
+        self._batch_cancelled = 0
+        self._batch_avoided = 0
+        self._batch_resumed = 0
+        self._batch_failed = []
+        if hasattr(self, "queue_panel"):
+            self.queue_panel.clearClicked.connect(self._clear_finished_jobs)
+            self.queue_panel.pauseToggled.connect(self.set_queue_paused)
+            self.queue_panel.cancelAllClicked.connect(self.cancel_all_jobs)
+            self.queue_panel.jobActionRequested.connect(self._job_action)
+        cfg = getattr(self, "app_config", None)
+        if cfg is not None and cfg.engine_process:
+            # Show the queue of an engine process left running by an earlier session
+            self._connect_engine(spawn=False)
+
+    def _connect_engine(self, spawn):
+        """Use the engine process, starting it with ``spawn``; return whether it answered."""
+        try:
+            engine = EngineClient.connect(spawn=spawn)
+        except Exception as exc:
+            if spawn:
+                logger.warning("Engine process unavailable, processing in the window: %s", exc)
+            return False
+        self.engine = engine
+        self._make_queue_timer()
+        if engine.jobs:
+            if hasattr(self, "queue_panel"):
+                self.queue_panel.model.update_jobs(engine.jobs)
+            if hasattr(self, "queue_dock"):
+                self.queue_dock.show()
+            self._queue_timer.start()
+        return True
+
+    def _make_queue_timer(self):
+        if self._queue_timer is not None:
+            self._queue_timer.stop()
+        self._queue_timer = QTimer(self)
+        self._queue_timer.setInterval(QUEUE_REFRESH_MS)
+        self._queue_timer.timeout.connect(self._refresh_queue)
+
+    def _ensure_engine(self):
+        if isinstance(self.engine, EngineClient) and self.engine.lost:
+            self.engine = None
+        if self.engine is None and self.app_config.engine_process:
+            self._connect_engine(spawn=True)
+        if self.engine is None:
+            cfg = self.app_config
+            scheduler = DeviceScheduler(
+                cfg.device_workers,
+                cfg.device_limits,
+                cfg.output_dir,
+                cfg.job_order,
+                CostModel(cfg.job_costs or None),
+                DiskSpace(cfg.output_dir, cfg.disk_reserve << 20) if cfg.disk_check else None,
+            )
+            self.engine = ProcessingEngine(_execute, cfg.max_workers, scheduler)
+            self._make_queue_timer()
+        return self.engine
+
+    def enqueue_jobs(self, entries, wipe_all=False):
+        """Queue ``(source, tracks, probe)`` entries for processing.
+
+        The track selection and settings are copied so the groups can be
+        edited further while the jobs wait or run. Jobs are created and
+        handed to the engine as it makes room, with at most
+        :data:`~core.pipeline.QUEUE_SIZE` waiting, so a huge batch does not
+        build all of its jobs up front. Returns the jobs queued right away.
+        """
+        cfg = copy.deepcopy(self.app_config)
+        # One copy per group keeps memory flat for large groups
+        copies = {}
+
+        def make_job(src, tracks, probe):
+            key = id(tracks)
+            if key not in copies:
+                copies[key] = copy.deepcopy(tracks)
+            return Job(src, copies[key], probe, wipe_all=wipe_all, config=cfg)
+
+        pending = list(entries)
+        skipped = 0
+        if cfg.job_journal:
+            # Files finished by an earlier run are neither asked about nor queued
+            journal = open_journal(cfg.job_journal)
+            total = len(pending)
+            pending = [e for e in pending if not journal.is_done(make_job(*e), cfg)]
+            skipped = total - len(pending)
+        if not pending:
+            if skipped and hasattr(self, "status_bar"):
+                self.status_bar.showMessage(f"All {skipped} file(s) were already processed", 5000)
+            return []
+        sources = [src for src, *_ in pending]
+        # Roll back flag edits a crash interrupted before any job reads them
+        recover_dirs({Path(src).parent for src in sources})
+        if cfg.replace_original:
+            prune_backups({Path(src).parent for src in sources}, cfg.backup_hours * 3600)
+        elif not confirm_overwrite(self, sources, cfg.output_dir):
+            return []
+        self._configure(self._ensure_engine(), cfg)
+        self._feeds.append((cfg, (make_job(*entry) for entry in pending)))
+        jobs = self._feed_engine()
+        if hasattr(self, "queue_dock"):
+            self.queue_dock.show()
+        self._queue_timer.start()
+        self._refresh_queue()
+        if hasattr(self, "status_bar"):
+            msg = f"Queued {len(pending)} file(s)"
+            if skipped:
+                msg += f", skipped {skipped} already processed"
+            self.status_bar.showMessage(msg, 2000)
+        return jobs
+
+    @staticmethod
+    def _configure(engine, cfg):
+        if isinstance(engine, EngineClient):
+            engine.configure(cfg)
+        else:
+            configure_engine(engine, cfg)
+
+    def _feed_engine(self):
+        """Top the engine's queue up from the waiting feeds; return the new jobs."""
+        if isinstance(self.engine, EngineClient) and self.engine.lost and self._feeds:
+            # The rest of the batch goes to a new engine
+            self._configure(self._ensure_engine(), self._feeds[0][0])
+            self._queue_timer.start()
+        room = QUEUE_SIZE - self.engine.counts()[QUEUED]
+        jobs = []
+        while room > 0 and self._feeds:
+            chunk = list(itertools.islice(self._feeds[0][1], room))
+            if len(chunk) < room:
+                self._feeds.popleft()
+            if chunk:
+                jobs += self.engine.submit(chunk)
+                room -= len(chunk)
+        return jobs
+
+    def _refresh_queue(self):
+        engine = self.engine
+        if engine is None:
+            return
+        changed = engine.take_changes()
+        for job in changed:
+            if job.state == DONE and job.method == RESUMED:
+                self._batch_resumed += 1
+            elif job.state == DONE:
+                self._batch_done += 1
+                self._batch_avoided += job.bytes_avoided
+            elif job.state == FAILED:
+                self._batch_failed.append(job)
+            elif job.state == CANCELLED:
+                self._batch_cancelled += 1
+        if hasattr(self, "queue_panel"):
+            # Running jobs are refreshed every tick for their progress
+            ids = {j.id for j in changed}
+            rows = changed + [j for j in engine.running() if j.id not in ids]
+            if rows:
+                self.queue_panel.model.update_jobs(rows)
+            self.queue_panel.set_summary(engine.counts(), engine.throughput())
+        if self._feeds:
+            self._feed_engine()
+        elif engine.idle:
+            self._queue_timer.stop()
+            self._report_batch()
+
+    def _report_batch(self):
+        """Summarise jobs finished since the queue was last idle."""
+        done, failed = self._batch_done, self._batch_failed
+        cancelled, avoided = self._batch_cancelled, self._batch_avoided
+        resumed = self._batch_resumed
+        self._batch_done, self._batch_failed, self._batch_cancelled = 0, [], 0
+        self._batch_avoided = self._batch_resumed = 0
+        if failed:
+            shown = failed[:20]
+            msg = "\n".join(f"{job.source}: {job.error}" for job in shown)
+            if len(failed) > len(shown):
+                msg += f"\n… and {len(failed) - len(shown)} more"
+            QMessageBox.warning(self, "Some files failed", msg)
+        elif (done or cancelled or resumed) and hasattr(self, "status_bar"):
+            msg = f"Processing complete: {done} file(s)"
+            if resumed:
+                msg += f", {resumed} already processed"
+            if cancelled:
+                msg += f", {cancelled} cancelled"
+            if avoided:
+                msg += f", {avoided / 1e9:.1f} GB needed no remux"
+            self.status_bar.showMessage(msg, 5000)
+
+    def set_queue_paused(self, paused: bool):
+        """Suspend or resume the whole queue."""
+        if self.engine is None:
+            return
+        if paused:
+            self.engine.pause_all()
+        else:
+            self.engine.resume_all()
+        self._refresh_queue()
+
+    def cancel_all_jobs(self):
+        if self.engine is None:
+            return
+        self._feeds.clear()
+        self.engine.cancel_all()
+        self._refresh_queue()
+
+    def _job_action(self, action, jobs):
+        if self.engine is None:
+            return
+        {
+            "pause": self.engine.pause,
+            "resume": self.engine.resume,
+            "cancel": self.engine.cancel,
+        }[action](jobs)
+        self._refresh_queue()
+
+    def _clear_finished_jobs(self):
+        if self.engine is None:
+            return
+        finished = self.engine.clear_finished()
+        if hasattr(self, "queue_panel"):
+            self.queue_panel.model.remove_jobs(finished)
+            self.queue_panel.set_summary(self.engine.counts())
+
+    def _confirm_quit(self) -> bool:
+        """Ask before quitting while jobs are still queued or running."""
+        if self.engine is None or not self._feeds and (
+            self.engine.idle or isinstance(self.engine, EngineClient)
+        ):
+            # The engine process finishes its queue without the window, but
+            # files not handed to it yet are fed by the window
+            return True
+        res = QMessageBox.question(
+            self,
+            "Jobs still running",
+            "Some files are still being processed. Quit anyway?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No,
+        )
+        return res == QMessageBox.Yes
+
+    def _shutdown_queue(self):
+        """Kill running backends on quit so no child outlives the window.
+
+        Jobs of an engine process keep running; the next window shows them.
+        """
+        if self.engine is None:
+            return
+        if isinstance(self.engine, EngineClient):
+            self.engine.close()
+            return
+        self.engine.cancel_all()
+        self.engine.wait(5)
+        self.engine.shutdown(wait=False)
+        try:
+            self.engine.scheduler.costs.save()
+        except OSError as exc:
+            logger.warning("Could not save job costs: %s", exc)
@@ -1,6 +1,6 @@
 from PySide6.QtCore import QSettings
 from gui.dialogs import PreferencesDialog
-from core.config import load_config, AppConfig
+from core.config import load_config, AppConfig, user_cache_dir
 from gui.theme import FONT_SIZES
 
 class SettingsLogic:
@@ -23,11 +23,32 @@ class SettingsLogic:
     def _load_preferences(self):
         cfg = load_config()
         cfg.backend = self.settings.value("backend", cfg.backend)
+        cfg.probe_backend = self.settings.value("probe_backend", cfg.probe_backend)
         cfg.mkvmerge_cmd = self.settings.value("mkvmerge_cmd", cfg.mkvmerge_cmd)
         cfg.mkvextract_cmd = self.settings.value("mkvextract_cmd", cfg.mkvextract_cmd)
         cfg.ffmpeg_cmd = self.settings.value("ffmpeg_cmd", cfg.ffmpeg_cmd)
         cfg.ffprobe_cmd = self.settings.value("ffprobe_cmd", cfg.ffprobe_cmd)
         cfg.output_dir = self.settings.value("output_dir", cfg.output_dir)
+        cfg.inplace_flags = self.settings.value("inplace_flags", cfg.inplace_flags, type=bool)
+        cfg.noop_policy = self.settings.value("noop_policy", cfg.noop_policy)
+        cfg.replace_original = self.settings.value(
+            "replace_original", cfg.replace_original, type=bool
+        )
+        cfg.backup_hours = float(self.settings.value("backup_hours", cfg.backup_hours))
+        cfg.probe_cache = self.settings.value(
+            "probe_cache", str(user_cache_dir() / "probe_cache.sqlite3")
+        )
+        if self.settings.value("resume_jobs", True, type=bool):
+            cfg.job_journal = str(user_cache_dir() / "jobs.sqlite3")
+        else:
+            cfg.job_journal = ""
+        cfg.engine_process = self.settings.value("engine_process", cfg.engine_process, type=bool)
+        cfg.autotune = self.settings.value("autotune", cfg.autotune, type=bool)
+        cfg.autotune_history = str(user_cache_dir() / "autotune.json")
+        cfg.job_order = self.settings.value("job_order", cfg.job_order)
+        cfg.disk_check = self.settings.value("disk_check", cfg.disk_check, type=bool)
+        cfg.disk_reserve = int(self.settings.value("disk_reserve", cfg.disk_reserve))
+        cfg.job_costs = str(user_cache_dir() / "job_costs.json")
         cfg.track_font_size = int(
             self.settings.value("track_font_size", cfg.track_font_size)
         )
@@ -66,6 +87,13 @@ class SettingsLogic:
             self._reload_all_groups()
 
     def closeEvent(self, event):
+        if hasattr(self, "_confirm_quit") and not self._confirm_quit():
+            event.ignore()
+            return
+        if hasattr(self, "cancel_import"):
+            self.cancel_import()
+        if hasattr(self, "_shutdown_queue"):
+            self._shutdown_queue()
         if hasattr(self, "track_table") and hasattr(self.track_table, "horizontalHeader"):
             self.settings.setValue("header_state", self.track_table.horizontalHeader().saveState())
         if getattr(self, "last_input_dir", None):
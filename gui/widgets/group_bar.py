@@ -187,10 +187,11 @@ class GroupBar(QWidget):
             self.right_layout.addWidget(btn)
 
         self.backend_combo = QComboBox(self)
-        self.backend_combo.addItems(["mkvtoolnix", "ffmpeg"])
+        self.backend_combo.addItems(["mkvtoolnix", "ffmpeg", "native"])
         self.backend_combo.setCurrentText("ffmpeg")
         self.backend_combo.setToolTip(
-            "Choose which program is used for cleaning: MKVToolNix or FFmpeg."
+            "Choose which program is used for cleaning: MKVToolNix, FFmpeg or the "
+            "built-in Matroska remuxer."
         )
         self.backend_combo.currentTextChanged.connect(self.backendChanged.emit)
         self.backend_combo.setMinimumHeight(SIZES['button_height'])
@@ -236,7 +237,7 @@ class GroupBar(QWidget):
 
     def set_backend(self, backend: str):
         """Update dropdown to reflect the selected backend."""
-        if backend not in {"mkvtoolnix", "ffmpeg"}:
+        if backend not in {"mkvtoolnix", "ffmpeg", "native"}:
             return
         self.backend_combo.blockSignals(True)
         self.backend_combo.setCurrentText(backend)
@@ -0,0 +1,34 @@
+from PySide6.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton
+from PySide6.QtCore import Signal
+
+from ..theme import FONT_SIZES
+
+
+class ImportProgress(QWidget):
+    """Status bar widget showing the progress of a background file import."""
+
+    cancelClicked = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.label = QLabel("Reading files…", self)
+        self.bar = QProgressBar(self)
+        self.bar.setMaximumWidth(220)
+        self.bar.setTextVisible(True)
+        self.btn_cancel = QPushButton("Cancel", self)
+        self.btn_cancel.setStyleSheet(f"font-size: {FONT_SIZES['small']}px;")
+        self.btn_cancel.setToolTip("Stop reading the remaining files.")
+        self.btn_cancel.clicked.connect(self.cancelClicked.emit)
+        layout.addWidget(self.label)
+        layout.addWidget(self.bar)
+        layout.addWidget(self.btn_cancel)
+        self.hide()
+
+    def set_progress(self, done: int, total: int) -> None:
+        """Show ``done`` of ``total`` files as read."""
+        self.bar.setMaximum(max(total, 1))
+        self.bar.setValue(done)
+        self.bar.setFormat(f"{done} / {total}")
+        self.show()
@@ -0,0 +1,106 @@
+from PySide6.QtWidgets import (
+    QWidget,
+    QVBoxLayout,
+    QHBoxLayout,
+    QLabel,
+    QPushButton,
+    QTableView,
+    QHeaderView,
+    QAbstractItemView,
+    QMenu,
+)
+from PySide6.QtCore import Qt, Signal
+
+from gui.models import JobTableModel
+from ..theme import FONT_SIZES, SIZES
+
+
+class QueuePanel(QWidget):
+    """List of queued, running and finished processing jobs."""
+
+    clearClicked = Signal()
+    pauseToggled = Signal(bool)
+    cancelAllClicked = Signal()
+    # (action, jobs) with action one of "pause", "resume" or "cancel"
+    jobActionRequested = Signal(str, list)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.model = JobTableModel()
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(
+            SIZES['margin_h'], SIZES['margin_v'], SIZES['margin_h'], SIZES['margin_v']
+        )
+
+        top = QHBoxLayout()
+        self.summary = QLabel("Queue is empty", self)
+        self.summary.setStyleSheet(f"font-size: {FONT_SIZES['small']}px;")
+        self.btn_clear = QPushButton("Clear finished", self)
+        self.btn_clear.setToolTip("Remove finished and failed jobs from the list.")
+        self.btn_clear.clicked.connect(self.clearClicked.emit)
+        self.btn_pause = QPushButton("Pause", self)
+        self.btn_pause.setCheckable(True)
+        self.btn_pause.setToolTip("Suspend running jobs and hold the queue.")
+        self.btn_pause.toggled.connect(self._on_pause_toggled)
+        self.btn_cancel = QPushButton("Cancel all", self)
+        self.btn_cancel.setToolTip(
+            "Drop queued jobs and stop running ones. Partial outputs are deleted."
+        )
+        self.btn_cancel.clicked.connect(self.cancelAllClicked.emit)
+        top.addWidget(self.summary)
+        top.addStretch(1)
+        top.addWidget(self.btn_pause)
+        top.addWidget(self.btn_cancel)
+        top.addWidget(self.btn_clear)
+        layout.addLayout(top)
+
+        self.view = QTableView(self)
+        self.view.setModel(self.model)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.verticalHeader().setVisible(False)
+        header = self.view.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        header.setStretchLastSection(True)
+        self.view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.view.customContextMenuRequested.connect(self._show_menu)
+        layout.addWidget(self.view)
+
+    def _on_pause_toggled(self, checked: bool) -> None:
+        self.btn_pause.setText("Resume" if checked else "Pause")
+        self.pauseToggled.emit(checked)
+
+    def selected_jobs(self) -> list:
+        rows = sorted({i.row() for i in self.view.selectionModel().selectedRows()})
+        return [self.model.jobs[r] for r in rows]
+
+    def _show_menu(self, pos) -> None:
+        jobs = self.selected_jobs()
+        if not jobs:
+            return
+        menu = QMenu(self)
+        for action, label in (("pause", "Pause"), ("resume", "Resume"), ("cancel", "Cancel")):
+            act = menu.addAction(label)
+            act.triggered.connect(
+                lambda _=False, a=action: self.jobActionRequested.emit(a, jobs)
+            )
+        menu.exec(self.view.viewport().mapToGlobal(pos))
+
+    def set_summary(self, counts: dict[str, int], rate: float = 0.0) -> None:
+        """Show the number of jobs in each state and the batch throughput.
+
+        ``rate`` is given in bytes per second.
+        """
+        if not any(counts.values()):
+            self.summary.setText("Queue is empty")
+            return
+        text = (
+            f"{counts.get('queued', 0)} queued · {counts.get('running', 0)} running · "
+            f"{counts.get('done', 0)} done · {counts.get('failed', 0)} failed"
+        )
+        for state in ("paused", "cancelled"):
+            if counts.get(state):
+                text += f" · {counts[state]} {state}"
+        if rate:
+            text += f" · {rate / 1_000_000:.1f} MB/s"
+        self.summary.setText(text)
@@ -2,12 +2,23 @@
 
 This module starts a :class:`~PySide6.QtWidgets.QApplication`, applies a
 randomized modern style and opens the main window. Run the ``mkv-cleaner``
-console script or execute this module directly to launch the application.
+console script or execute this module directly to launch the application;
+``mkv-cleaner batch`` processes files without the GUI (see :mod:`core.cli`)
+and ``mkv-cleaner serve`` and ``mkv-cleaner worker`` take jobs from other
+hosts (see :mod:`core.service` and :mod:`core.worker`). ``mkv-cleaner
+engine-host`` is the background engine process the GUI starts itself
+(see :mod:`core.enginehost`).
 """
 
 import sys
 import random
 
+if __name__ == "__main__" and sys.argv[1:2] in (["batch"], ["serve"], ["worker"], ["engine-host"]):
+    # Headless modes must not pull in Qt
+    from core.cli import launch
+
+    launch()
+
 from core.bootstrap import ensure_python_package
 
 ensure_python_package("PySide6")
@@ -15,3 +15,121 @@ from core.config import AppConfig
 @pytest.fixture
 def defaults():
     return AppConfig()
+
+
+from core import ebml  # noqa: E402
+from core import matroska as mk  # noqa: E402
+
+_TYPE_CODES = {"video": 1, "audio": 2, "subtitles": 17}
+_DEFAULT_CODECS = {"video": "V_MPEG4/ISO/AVC", "audio": "A_AAC", "subtitles": "S_TEXT/UTF8"}
+
+
+def build_mkv(
+    tracks,
+    blocks_per_track=2,
+    doc_type="matroska",
+    seekhead=True,
+    order=("info", "tracks", "clusters", "cues"),
+    void_after_tracks=0,
+):
+    """Return the bytes of a small Matroska file.
+
+    ``tracks`` is a list of dicts with ``type`` and optional ``codec``,
+    ``language``, ``name``, ``default`` and ``forced`` keys.
+    """
+    header = ebml.element(
+        mk.EBML_ID,
+        ebml.uint_element(0x4286, 1) + ebml.string_element(mk.DOCTYPE_ID, doc_type),
+    )
+    entries = b""
+    for num, t in enumerate(tracks, start=1):
+        payload = (
+            ebml.uint_element(mk.TRACK_NUMBER_ID, num)
+            + ebml.uint_element(mk.TRACK_UID_ID, 1000 + num)
+            + ebml.uint_element(mk.TRACK_TYPE_ID, _TYPE_CODES[t["type"]])
+            + ebml.string_element(mk.CODEC_ID_ID, t.get("codec", _DEFAULT_CODECS[t["type"]]))
+        )
+        if "language" in t:
+            payload += ebml.string_element(mk.LANGUAGE_ID, t["language"])
+        if "name" in t:
+            payload += ebml.string_element(mk.NAME_ID, t["name"])
+        if "default" in t:
+            payload += ebml.uint_element(mk.FLAG_DEFAULT_ID, int(t["default"]))
+        if "forced" in t:
+            payload += ebml.uint_element(mk.FLAG_FORCED_ID, int(t["forced"]))
+        entries += ebml.element(mk.TRACK_ENTRY_ID, payload)
+    parts = {
+        "info": ebml.element(
+            mk.INFO_ID,
+            ebml.uint_element(mk.TIMESTAMP_SCALE_ID, 1_000_000)
+            + ebml.float_element(mk.DURATION_ID, 2000.0),
+        ),
+        "tracks": ebml.element(mk.TRACKS_ID, entries)
+        + (ebml.void_element(void_after_tracks) if void_after_tracks else b""),
+    }
+    clusters = []
+    for c in range(2):
+        blocks = ebml.uint_element(0xE7, c * 1000)
+        for b in range(blocks_per_track):
+            for num in range(1, len(tracks) + 1):
+                data = f"c{c}b{b}t{num}".encode() * 4
+                blocks += ebml.element(
+                    0xA3, ebml.encode_vint(num) + (b * 10).to_bytes(2, "big") + b"\x80" + data
+                )
+        clusters.append(ebml.element(mk.CLUSTER_ID, blocks))
+    parts["clusters"] = b"".join(clusters)
+    parts["cues"] = b""
+
+    ids = {"info": mk.INFO_ID, "tracks": mk.TRACKS_ID, "cues": mk.CUES_ID}
+
+    def seek_head(positions):
+        seeks = b""
+        for name, pos in positions.items():
+            seeks += ebml.element(
+                mk.SEEK_ID,
+                ebml.element(mk.SEEK_ID_ID, ebml.encode_id(ids[name]))
+                + ebml.uint_element(mk.SEEK_POSITION_ID, pos, 8),
+            )
+        return ebml.element(mk.SEEKHEAD_ID, seeks)
+
+    def layout(positions):
+        body = seek_head(positions) if seekhead else b""
+        offsets = {}
+        for name in order:
+            offsets[name] = len(body)
+            if name == "cues":
+                body += cues(offsets)
+            else:
+                body += parts[name]
+        return body, offsets
+
+    def cues(offsets):
+        points = b""
+        pos = offsets["clusters"]
+        for c, cluster in enumerate(clusters):
+            points += ebml.element(
+                0xBB,
+                ebml.uint_element(0xB3, c * 1000)
+                + ebml.element(
+                    0xB7,
+                    ebml.uint_element(0xF7, 1) + ebml.uint_element(0xF1, pos, 8),
+                ),
+            )
+            pos += len(cluster)
+        return ebml.element(mk.CUES_ID, points)
+
+    positions = {name: 0 for name in ("info", "tracks", "cues")}
+    _, offsets = layout(positions)
+    positions = {name: offsets[name] for name in positions}
+    body, _ = layout(positions)
+    return header + ebml.element(mk.SEGMENT_ID, body, 8)
+
+
+@pytest.fixture
+def make_mkv(tmp_path):
+    def _make(tracks, name="sample.mkv", **kwargs):
+        path = tmp_path / name
+        path.write_bytes(build_mkv(tracks, **kwargs))
+        return path
+
+    return _make
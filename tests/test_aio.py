@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import aio  # noqa: E402
+from core.config import AppConfig  # noqa: E402
+from core.engine import DONE, FAILED  # noqa: E402
+from core.matroska import read_layout  # noqa: E402
+from core.probe_cache import ProbeCache  # noqa: E402
+from core.tracks import CommandNotFoundError  # noqa: E402
+
+TRACKS = [
+    {"type": "video"},
+    {"type": "audio", "language": "eng"},
+    {"type": "audio", "language": "jpn"},
+    {"type": "subtitles", "language": "eng"},
+]
+
+
+def _native():
+    cfg = AppConfig()
+    cfg.backend = "native"
+    cfg.noop_policy = "remux"
+    return cfg
+
+
+def _fake_backend(tmp_path, body):
+    script = tmp_path / "fake-ffmpeg"
+    script.write_text(f"#!{sys.executable}\nimport sys, time\n{body}\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    cfg = AppConfig()
+    cfg.probe_backend = "native"
+    cfg.inplace_flags = False
+    cfg.noop_policy = "remux"
+    cfg.ffmpeg_cmd = str(script)
+    return cfg
+
+
+def test_run_command_async():
+    code = "import sys; print('a'); print('b'); print('oops', file=sys.stderr)"
+
+    async def main():
+        lines = []
+        await aio.run_command_async([sys.executable, "-c", code], on_line=lines.append)
+        captured = await aio.run_command_async([sys.executable, "-c", code], capture=True)
+        with pytest.raises(CommandNotFoundError):
+            await aio.run_command_async(["/nonexistent/tool"])
+        with pytest.raises(Exception) as err:
+            await aio.run_command_async([sys.executable, "-c", code + "; sys.exit(3)"])
+        return lines, captured, err.value
+
+    lines, captured, err = asyncio.run(main())
+    assert lines == ["a", "b"]
+    assert captured.stdout.split() == ["a", "b"] and captured.stderr == "oops"
+    assert err.returncode == 3 and err.stderr == "oops"
+
+
+def test_probe_plan_and_clean(make_mkv):
+    src = make_mkv(TRACKS)
+    cfg = _native()
+
+    async def main():
+        cleaner = aio.AsyncCleaner(cfg, max_jobs=2)
+        tracks = await cleaner.probe(src)
+        entry = await cleaner.plan(src, "audio=jpn")
+        job = await cleaner.clean(src, "audio=jpn;subs=none")
+        return tracks, entry, job
+
+    tracks, entry, job = asyncio.run(main())
+    assert [t.type for t in tracks] == ["video", "audio", "audio", "subtitles"]
+    assert entry.method == "native" and [t["removed"] for t in entry.tracks][1:3] == [True, False]
+    assert job.state == DONE and job.method == "native"
+    entries = read_layout(job.destination).entries
+    assert [(e.type, e.language) for e in entries[1:]] == [("audio", "jpn")]
+
+
+def test_probe_cache_is_used_off_the_event_loop(make_mkv, tmp_path, monkeypatch):
+    src = make_mkv(TRACKS)
+    output = {"tracks": [{"id": 0, "type": "video", "properties": {}}]}
+    script = tmp_path / "fake-mkvmerge"
+    script.write_text(f"#!{sys.executable}\nprint({json.dumps(json.dumps(output))})\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    cfg = AppConfig()
+    cfg.backend = "mkvtoolnix"
+    cfg.probe_backend = ""
+    cfg.mkvmerge_cmd = str(script)
+    cfg.probe_cache = str(tmp_path / "probe.db")
+    calls = []
+    for name in ("get", "put"):
+        real = getattr(ProbeCache, name)
+
+        def record(self, *args, _real=real, _name=name):
+            calls.append((_name, threading.current_thread() is threading.main_thread()))
+            return _real(self, *args)
+
+        monkeypatch.setattr(ProbeCache, name, record)
+
+    async def main():
+        cleaner = aio.AsyncCleaner(cfg)
+        return await cleaner.probe(src), await cleaner.probe(src)
+
+    first, second = asyncio.run(main())
+    assert [t.type for t in first] == [t.type for t in second] == ["video"]
+    assert calls == [("get", False), ("put", False), ("get", False)]
+
+
+def test_clean_many_bounds_concurrency(make_mkv, monkeypatch):
+    paths = [make_mkv(TRACKS, f"{i}.mkv") for i in range(12)]
+    running = []
+    peak = []
+    real_execute = aio.AsyncCleaner._execute
+
+    async def execute(self, job, tracks, on_progress):
+        running.append(job)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        await real_execute(self, job, tracks, on_progress)
+        running.remove(job)
+
+    monkeypatch.setattr(aio.AsyncCleaner, "_execute", execute)
+
+    async def main():
+        cleaner = aio.AsyncCleaner(_native(), max_jobs=3)
+        return [job async for job in cleaner.clean_many(paths, "subs=none", window=5)]
+
+    jobs = asyncio.run(main())
+    assert len(jobs) == 12 and all(j.state == DONE for j in jobs)
+    assert max(peak) == 3
+
+
+def test_failures_are_reported(make_mkv, tmp_path):
+    src = make_mkv(TRACKS)
+    cfg = _fake_backend(tmp_path, "print('broken', file=sys.stderr); sys.exit(1)")
+    job = asyncio.run(aio.clean(src, "subs=none", cfg))
+    assert job.state == FAILED and job.method == "remux"
+    assert not job.destination.exists()
+
+
+def test_cancel_kills_backend(make_mkv, tmp_path):
+    src = make_mkv(TRACKS)
+    cfg = _fake_backend(tmp_path, "open(sys.argv[-1], 'wb').write(b'x'); time.sleep(30)")
+
+    async def main():
+        cleaner = aio.AsyncCleaner(cfg)
+        task = asyncio.ensure_future(cleaner.clean(src, "subs=none"))
+        out = tmp_path / "cleaned" / src.name
+        while not out.exists():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return out
+
+    started = time.monotonic()
+    out = asyncio.run(main())
+    assert time.monotonic() - started < 10
+    assert not out.exists()
+
+
+def test_cancel_waits_for_the_replace_thread(make_mkv, monkeypatch):
+    src = make_mkv(TRACKS)
+    cfg = _native()
+    cfg.replace_original = True
+    cfg.backup_hours = 0
+    started = threading.Event()
+    returned = []
+    real_replace = aio.replace_original
+
+    def slow_replace(*args):
+        started.set()
+        time.sleep(0.2)
+        real_replace(*args)
+        returned.append(True)
+
+    monkeypatch.setattr(aio, "replace_original", slow_replace)
+
+    async def main():
+        task = asyncio.ensure_future(aio.AsyncCleaner(cfg).clean(src, "subs=none"))
+        await asyncio.to_thread(started.wait)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return list(returned)
+
+    # the cleanup ran after the source was replaced, not in the middle of it
+    assert asyncio.run(main()) == [True]
+    assert [e.type for e in read_layout(src).entries[1:]] == ["audio", "audio"]
+    assert sorted(p.name for p in src.parent.iterdir()) == [src.name]
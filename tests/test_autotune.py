@@ -0,0 +1,130 @@
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.autotune import ConcurrencyTuner  # noqa: E402
+from core.engine import Job, ProcessingEngine  # noqa: E402
+from core.progress import JobProgress  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _run_epoch(tuner, clock, rate):
+    """Finish enough jobs at ``tuner.concurrency`` to reach ``rate`` bytes/s."""
+    jobs = 2 * tuner.concurrency
+    tuner.job_started()
+    clock.now += 10.0
+    result = None
+    for _ in range(jobs):
+        result = tuner.job_finished(int(rate * 10.0 / jobs))
+    return result
+
+
+def _curve(level):
+    # Throughput grows until three jobs saturate the disks
+    return {1: 100e6, 2: 180e6, 3: 240e6, 4: 245e6, 5: 200e6}[level]
+
+
+def test_climbs_until_plateau_and_persists(tmp_path):
+    clock = Clock()
+    path = tmp_path / "autotune.json"
+    tuner = ConcurrencyTuner(8, path, "ffmpeg", clock=clock)
+    assert tuner.concurrency == 1
+    seen = [tuner.concurrency]
+    while not tuner.settled:
+        _run_epoch(tuner, clock, _curve(tuner.concurrency))
+        seen.append(tuner.concurrency)
+    assert seen == [1, 2, 3, 4, 3]
+
+    data = json.loads(path.read_text())["ffmpeg"]
+    assert data["best"] == 3
+    assert set(data["throughput"]) == {"1", "2", "3", "4"}
+
+    # The next run starts at the learned level and checks its neighbours
+    again = ConcurrencyTuner(8, path, "ffmpeg", clock=clock)
+    assert again.concurrency == 3 and not again.settled
+    assert ConcurrencyTuner(8, path, "mkvtoolnix").concurrency == 1
+    assert ConcurrencyTuner(2, path, "ffmpeg").concurrency == 2
+
+
+def test_steps_back_when_throughput_drops():
+    clock = Clock()
+    tuner = ConcurrencyTuner(8, clock=clock)
+    assert _run_epoch(tuner, clock, 100e6) == 2
+    assert _run_epoch(tuner, clock, 150e6) == 3
+    # Past the peak: back to two jobs
+    assert _run_epoch(tuner, clock, 90e6) == 2
+    assert tuner.settled
+
+
+def test_tries_fewer_jobs_when_first_step_is_worse(tmp_path):
+    path = tmp_path / "autotune.json"
+    path.write_text(json.dumps({"default": {"best": 3, "throughput": {}}}))
+    clock = Clock()
+    tuner = ConcurrencyTuner(8, path, clock=clock)
+    rates = {1: 100e6, 2: 230e6, 3: 200e6, 4: 150e6}
+    seen = [tuner.concurrency]
+    while not tuner.settled:
+        _run_epoch(tuner, clock, rates[tuner.concurrency])
+        seen.append(tuner.concurrency)
+    assert seen == [3, 4, 2, 1, 2]
+
+
+def test_stops_at_max_workers():
+    clock = Clock()
+    tuner = ConcurrencyTuner(2, clock=clock)
+    _run_epoch(tuner, clock, 100e6)
+    _run_epoch(tuner, clock, 200e6)
+    assert tuner.concurrency == 2 and tuner.settled
+
+
+def test_waits_for_enough_jobs_and_time():
+    clock = Clock()
+    tuner = ConcurrencyTuner(8, clock=clock, min_epoch_seconds=5)
+    tuner.job_started()
+    clock.now = 1.0
+    assert tuner.job_finished(10) is None
+    assert tuner.job_finished(10) is None  # two jobs, but too early
+    clock.now = 6.0
+    assert tuner.job_finished(10) == 2
+
+
+def test_damaged_history_is_ignored(tmp_path):
+    path = tmp_path / "autotune.json"
+    path.write_text("not json")
+    tuner = ConcurrencyTuner(4, path)
+    assert tuner.concurrency == 1 and not tuner.settled
+
+
+def test_engine_follows_tuner():
+    tuner = ConcurrencyTuner(4, min_epoch_seconds=0)
+    lock = threading.Lock()
+    active = []
+    peak = [0]
+
+    def execute(job):
+        job.progress = JobProgress(total_bytes=1000)
+        with lock:
+            active.append(job)
+            peak[0] = max(peak[0], len(active))
+        threading.Event().wait(0.01)
+        with lock:
+            active.remove(job)
+
+    engine = ProcessingEngine(execute, 16, tuner=tuner)
+    assert engine.max_workers == 1
+    engine.submit(Job(Path(f"/f{i}"), []) for i in range(12))
+    assert engine.wait(10)
+    assert engine.max_workers == tuner.concurrency > 1
+    assert peak[0] <= engine.max_workers
+    engine.shutdown()
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import cli  # noqa: E402
+from core.matroska import read_layout  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+TRACKS = [
+    {"type": "video"},
+    {"type": "audio", "language": "eng", "default": True},
+    {"type": "audio", "language": "jpn", "default": False},
+    {"type": "subtitles", "language": "eng"},
+]
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_batch_runs_and_resumes(make_mkv, tmp_path):
+    (tmp_path / "media").mkdir()
+    make_mkv(TRACKS, "media/a.mkv")
+    make_mkv(TRACKS, "media/b.mkv")
+    results = tmp_path / "results.jsonl"
+    args = [
+        str(tmp_path / "media"),
+        "--backend", "native",
+        "--tracks", "audio=jpn;subs=none;default-audio=jpn",
+        "--journal", str(tmp_path / "jobs.sqlite3"),
+        "--results", str(results),
+    ]
+    assert cli.main(args) == 0
+    *jobs, summary = _lines(results)
+    assert summary["summary"]["done"] == 2
+    assert {Path(j["source"]).name for j in jobs} == {"a.mkv", "b.mkv"}
+    assert all(j["state"] == "done" and j["method"] == "native" for j in jobs)
+    entries = read_layout(tmp_path / "media" / "cleaned" / "a.mkv").entries
+    assert [e.type for e in entries] == ["video", "audio"]
+    assert entries[1].language == "jpn" and entries[1].flag_default
+
+    assert cli.main(args) == 0
+    *jobs, summary = _lines(results)
+    assert [j["method"] for j in jobs] == ["resumed", "resumed"]
+
+
+def test_dry_run_and_saved_plan(make_mkv, tmp_path):
+    src = make_mkv(TRACKS, "a.mkv")
+    manifest = tmp_path / "files.jsonl"
+    manifest.write_text(json.dumps({"source": str(src), "tracks": "subs=none"}) + "\n")
+    plan = tmp_path / "plan.jsonl"
+    args = ["--manifest", str(manifest), "--backend", "native", "--no-journal"]
+    assert cli.main(args + ["--dry-run", "--results", str(plan)]) == 0
+    assert not (tmp_path / "cleaned").exists()
+    entry, summary = _lines(plan)
+    assert entry["method"] == "native" and summary["summary"]["files"] == 1
+
+    # The summary line is not part of the plan
+    plan.write_text(json.dumps(entry) + "\n")
+    results = tmp_path / "results.jsonl"
+    assert cli.main(args + ["--plan", str(plan), "--results", str(results)]) == 0
+    assert _lines(results)[0]["state"] == "done"
+    assert len(read_layout(tmp_path / "cleaned" / "a.mkv").entries) == 3
+
+
+def test_batch_does_not_import_qt():
+    code = (
+        "import sys, core.cli\n"
+        "assert not [m for m in sys.modules if m.startswith('PySide6')]\n"
+        "core.cli.build_parser()\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import diskspace, scheduler  # noqa: E402
+from core.diskspace import NEVER, WAIT, FITS, DiskSpace, free_space  # noqa: E402
+from core.engine import DONE, FAILED, Job, ProcessingEngine  # noqa: E402
+from core.scheduler import DeviceScheduler, FifoScheduler  # noqa: E402
+
+MB = 1 << 20
+
+
+def _fake_disk(monkeypatch, free):
+    """One device with ``free[0]`` bytes; sources are sized by their name."""
+    monkeypatch.setattr(diskspace, "free_space", lambda p: free[0])
+    monkeypatch.setattr(diskspace, "device_of", lambda p: 1)
+    monkeypatch.setattr(diskspace, "source_size", lambda job: int(job.source.stem) * MB)
+    monkeypatch.setattr(scheduler, "source_size", lambda job: int(job.source.stem) * MB)
+
+
+def test_free_space_uses_existing_parent(tmp_path):
+    assert free_space(tmp_path / "missing" / "dir") > 0
+
+
+def test_estimate_and_in_place_jobs():
+    space = DiskSpace("out", reserve=0)
+    job = Job(Path(__file__), [])
+    size = os.path.getsize(__file__)
+    assert space.destination(job) == Path(__file__).parent / "out" / Path(__file__).name
+    assert space.estimate(job) >= size
+    assert DiskSpace(str(Path(__file__).parent)).estimate(job) == 0
+
+
+def test_check_counts_running_jobs(monkeypatch, tmp_path):
+    free = [250 * MB]
+    _fake_disk(monkeypatch, free)
+    space = DiskSpace(str(tmp_path / "out"), reserve=50 * MB)
+    big, small, huge = (Job(tmp_path / f"{n}.mkv", []) for n in (150, 60, 400))
+    assert space.check(big) == FITS
+    space.reserve_for(big)
+    # 150 still to be written + 60 + 50 reserve > 250
+    assert space.check(small) == WAIT
+    assert space.check(huge) == WAIT
+    # Output already written is no longer pending
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out" / "150.mkv").write_bytes(b"\0" * 100 * MB)
+    free[0] -= 100 * MB
+    assert space.check(small) == WAIT
+    space.release(big)
+    assert space.check(small) == FITS
+    assert space.check(huge) == NEVER
+    assert "Not enough space for 400.mkv" in space.rejection(huge)
+
+
+def test_scheduler_skips_jobs_that_do_not_fit(monkeypatch, tmp_path):
+    _fake_disk(monkeypatch, [300 * MB])
+    sched = FifoScheduler("largest", space=DiskSpace(str(tmp_path / "out"), reserve=0))
+    jobs = [Job(tmp_path / f"{n}.mkv", []) for n in (200, 150, 50)]
+    for job in jobs:
+        sched.append(job)
+    first = sched.pick()
+    sched.started(first)
+    second = sched.pick()
+    sched.started(second)
+    # The 150 MB job waits for the 200 MB one; the 50 MB one fits beside it
+    assert [first, second] == [jobs[0], jobs[2]]
+    assert sched.pick() is None
+    sched.finished(first)
+    assert sched.pick() is jobs[1]
+
+
+def test_engine_fails_jobs_that_never_fit(monkeypatch, tmp_path):
+    _fake_disk(monkeypatch, [100 * MB])
+    ran = []
+    lock = threading.Lock()
+
+    def execute(job):
+        with lock:
+            ran.append(job)
+
+    space = DiskSpace(str(tmp_path / "out"), reserve=10 * MB)
+    engine = ProcessingEngine(execute, 4, FifoScheduler(space=space))
+    fits, too_big = Job(tmp_path / "50.mkv", []), Job(tmp_path / "95.mkv", [])
+    engine.submit([too_big, fits])
+    assert engine.wait(5)
+    engine.shutdown()
+    assert ran == [fits]
+    assert (fits.state, too_big.state) == (DONE, FAILED)
+    assert too_big.error.startswith("Not enough space")
+
+
+def test_rejected_jobs_leave_no_bookkeeping(monkeypatch, tmp_path):
+    _fake_disk(monkeypatch, [100 * MB])
+    monkeypatch.setattr(scheduler, "device_of", lambda p: 1)
+    sched = DeviceScheduler(order="largest", space=DiskSpace(str(tmp_path / "out"), reserve=0))
+    engine = ProcessingEngine(lambda job: None, 2, sched)
+    engine.submit([Job(tmp_path / f"{n}.mkv", []) for n in (10, 200, 300)])
+    assert engine.wait(5)
+    engine.shutdown()
+    assert engine.counts()[FAILED] == 2
+    assert not sched._sizes and not sched._devices and not sched.active
+
+
+def test_free_space_is_measured_once_per_pick(monkeypatch, tmp_path):
+    _fake_disk(monkeypatch, [300 * MB])
+    calls = []
+    monkeypatch.setattr(diskspace, "free_space", lambda p: calls.append(p) or 300 * MB)
+    sched = FifoScheduler("largest", space=DiskSpace(str(tmp_path / "out"), reserve=0))
+    sched.append(Job(tmp_path / "250.mkv", []))
+    sched.started(sched.pick())
+    for n in (200, 150, 120, 100):
+        sched.append(Job(tmp_path / f"{n}.mkv", []))
+    calls.clear()
+    # Every queued job waits for the running one and is checked
+    assert sched.pick() is None
+    assert len(calls) == 1
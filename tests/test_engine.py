@@ -0,0 +1,218 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import engine  # noqa: E402
+from core.engine import Job, ProcessingEngine  # noqa: E402
+from core import tracks  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+
+def _track(tid, type_="audio", **kw):
+    return Track(idx=tid, tid=tid, type=type_, codec="aac", language="eng", forced=False, name="", **kw)
+
+
+def test_jobs_run_and_changes_are_coalesced():
+    ran = []
+
+    def execute(job):
+        if job.source.name == "bad":
+            raise RuntimeError("boom")
+        ran.append(job.source)
+
+    eng = ProcessingEngine(execute, max_workers=2)
+    jobs = eng.submit(Job(Path(n), []) for n in ("a", "b", "bad"))
+    assert eng.wait(5)
+
+    assert sorted(map(str, ran)) == ["a", "b"]
+    assert [j.state for j in jobs] == [engine.DONE, engine.DONE, engine.FAILED]
+    assert jobs[2].error == "boom"
+    # Several transitions per job collapse into one entry per job
+    changed = eng.take_changes()
+    assert sorted(j.id for j in changed) == sorted(j.id for j in jobs)
+    assert eng.take_changes() == []
+    counts = eng.counts()
+    assert counts["done"] == 2 and counts["failed"] == 1
+    assert counts["queued"] == counts["running"] == counts["cancelled"] == 0
+    eng.shutdown()
+
+
+def test_submit_while_running_and_worker_limit():
+    gate = threading.Event()
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def execute(job):
+        with lock:
+            active.append(job)
+            peak.append(len(active))
+        gate.wait(5)
+        with lock:
+            active.remove(job)
+
+    eng = ProcessingEngine(execute, max_workers=2)
+    eng.submit([Job(Path("a"), []), Job(Path("b"), []), Job(Path("c"), [])])
+    assert not eng.idle
+    late = eng.submit([Job(Path("d"), [])])
+    gate.set()
+    assert eng.wait(5)
+    assert late[0].state == engine.DONE
+    assert max(peak) <= 2
+    assert len(eng.clear_finished()) == 4
+    assert eng.jobs == []
+    eng.shutdown()
+
+
+def test_run_job_applies_selection(tmp_path):
+    src = tmp_path / "in.mkv"
+    selected = [_track(1, removed=True), _track(2, default_audio=True)]
+    built = {}
+
+    def build_cmd(s, d, tracks, wipe_forced=False, wipe_all=False):
+        built.update(dst=d, tracks=tracks, wipe_all=wipe_all)
+        return ["cmd"]
+
+    job = Job(src, selected, wipe_all=True)
+    engine.run_job(
+        job,
+        lambda s: [_track(1), _track(2), _track(3)],
+        build_cmd,
+        lambda cmd, capture=True: None,
+        "out",
+    )
+    assert job.destination == tmp_path / "out" / "in.mkv"
+    assert built["dst"].parent.is_dir()
+    assert [t.removed for t in built["tracks"]] == [True, False, False]
+    assert [t.default_audio for t in built["tracks"]] == [False, True, False]
+    assert built["wipe_all"] is True
+
+
+def test_execute_job_reports_progress(tmp_path, monkeypatch, defaults):
+    src = tmp_path / "in.mkv"
+    src.write_bytes(b"x" * 1000)
+    ran = {}
+
+    def fake_run(cmd, capture=True, on_line=None, on_start=None):
+        ran["cmd"] = cmd
+        for line in ("#GUI#progress 40%", "#GUI#progress 100%"):
+            on_line(line)
+
+    monkeypatch.setattr(engine, "query_tracks", lambda s, cfg: [_track(1)])
+    monkeypatch.setattr(engine, "run_command", fake_run)
+    defaults.backend = "mkvtoolnix"
+    defaults.noop_policy = "remux"  # the job changes nothing, remux anyway
+    job = Job(src, [_track(1)], config=defaults)
+    engine.execute_job(job)
+    assert "--gui-mode" in ran["cmd"]
+    assert job.progress.total_bytes == 1000
+    assert job.progress.bytes_done == 1000
+    assert job.progress.finished is not None
+
+    eng = ProcessingEngine(lambda j: None)
+    eng.jobs.append(job)
+    assert eng.throughput() > 0
+
+
+def _sleeper(job):
+    """Execute callback running a child process that writes ``job.destination``."""
+    job.set_destination(job.source.with_suffix(".out"))
+    job.destination.write_bytes(b"partial")
+    code = "import time; print('started', flush=True); time.sleep(30)"
+    started = threading.Event()
+    job.started_event = started
+    tracks.run_command(
+        [sys.executable, "-c", code],
+        on_line=lambda line: started.set(),
+        on_start=job.attach_process,
+    )
+
+
+def test_cancel_drops_queued_and_kills_running(tmp_path):
+    eng = ProcessingEngine(_sleeper, max_workers=1)
+    first, second = eng.submit([Job(tmp_path / "a.mkv", []), Job(tmp_path / "b.mkv", [])])
+    deadline = time.monotonic() + 10
+    while not hasattr(first, "started_event") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert first.started_event.wait(10)
+    eng.cancel_all()
+    assert eng.wait(10)
+    assert first.state == second.state == engine.CANCELLED
+    assert first.error == ""
+    assert not first.destination.exists()
+    assert second.started is None
+    eng.shutdown()
+
+
+def test_pause_holds_queue_and_resume_continues(tmp_path):
+    ran = []
+    eng = ProcessingEngine(lambda job: ran.append(job), max_workers=1)
+    eng.pause_all()
+    jobs = eng.submit([Job(tmp_path / "a.mkv", [])])
+    time.sleep(0.05)
+    assert ran == [] and eng.counts()["queued"] == 1
+    eng.pause(jobs)
+    assert jobs[0].state == engine.PAUSED
+    eng.resume_all()
+    assert eng.wait(5)
+    assert ran == jobs
+    eng.shutdown()
+
+
+@pytest.mark.skipif(not engine.CAN_SUSPEND, reason="needs SIGSTOP")
+def test_pause_suspends_running_process(tmp_path):
+    eng = ProcessingEngine(_sleeper, max_workers=1)
+    (job,) = eng.submit([Job(tmp_path / "a.mkv", [])])
+    deadline = time.monotonic() + 10
+    while not hasattr(job, "started_event") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert job.started_event.wait(10)
+    eng.pause([job])
+    assert job.state == engine.PAUSED
+    stat = Path(f"/proc/{job.process.pid}/stat")
+    if stat.exists():
+        deadline = time.monotonic() + 5
+        while stat.read_text().split(") ")[1][0] != "T" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stat.read_text().split(") ")[1][0] == "T"
+    eng.resume([job])
+    assert job.state == engine.RUNNING
+    eng.cancel([job])
+    assert eng.wait(10)
+    assert job.state == engine.CANCELLED
+    eng.shutdown()
+
+
+def test_probe_results_reused_until_file_changes(tmp_path):
+    from core.tracks import ProbeResult, file_stamp
+
+    fresh = tmp_path / "fresh.mkv"
+    fresh.write_text("data")
+    stale = tmp_path / "stale.mkv"
+    stale.write_text("data")
+    stale_probe = ProbeResult([], file_stamp(stale))
+    stale.write_text("changed data")
+
+    track = Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")
+    jobs = [
+        Job(fresh, [track], ProbeResult([track], file_stamp(fresh))),
+        Job(stale, [track], stale_probe),
+        Job(tmp_path / "plain.mkv", [track]),
+    ]
+    probed = []
+
+    def query_tracks(src):
+        probed.append(src)
+        return [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+
+    results = [engine.probe_job(job, query_tracks) for job in jobs]
+    assert probed == [stale, tmp_path / "plain.mkv"]
+    assert [job.reused_probe for job in jobs] == [True, False, False]
+    # The stored probe result must not be modified by processing
+    assert results[0][0] is not track
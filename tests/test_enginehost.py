@@ -0,0 +1,113 @@
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import config  # noqa: E402
+from core.engine import DONE, FAILED, RUNNING, Job  # noqa: E402
+from core.enginehost import EngineClient, host_command, start_host  # noqa: E402
+from core.matroska import read_layout  # noqa: E402
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="uses a Unix socket in tmp_path")
+
+TRACKS = [
+    {"type": "video"},
+    {"type": "audio", "language": "eng"},
+    {"type": "subtitles", "language": "eng"},
+]
+
+
+@pytest.fixture
+def host(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    address = str(tmp_path / "engine.sock")
+    key = tmp_path / "engine.key"
+    procs = []
+
+    def start():
+        procs.append(start_host(address, key, idle_exit=0.5))
+        return procs[-1]
+
+    def connect():
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                return EngineClient.connect(address, key, spawn=False)
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    yield start, connect
+    for proc in procs:
+        proc.kill()
+        proc.wait()
+
+
+def test_queue_survives_client_restart(make_mkv, host):
+    start, connect = host
+    proc = start()
+    # looked up late: other tests reload core.config
+    cfg = config.AppConfig()
+    cfg.backend = "native"
+    cfg.noop_policy = "remux"
+    srcs = [make_mkv(TRACKS, f"{i}.mkv") for i in range(3)]
+
+    client = connect()
+    client.configure(cfg)
+    jobs = client.submit(Job(src, [], config=cfg) for src in srcs)
+    assert [j.id for j in jobs] == [1, 2, 3]
+    client.close()  # the window quits mid-batch
+
+    client = connect()
+    assert [j.source for j in client.jobs] == srcs
+    assert client.wait(10)
+    client.take_changes()
+    assert [j.id for j in client.jobs] == [1, 2, 3]
+    assert client.idle and client.counts()[DONE] == 3
+    job = client.jobs[0]
+    assert job.method == "native" and job.progress.percent == 100
+    assert len(read_layout(job.destination).entries) == 3
+    assert len(client.clear_finished()) == 3 and not client.jobs
+    client.close()
+    # nothing to do and no window: the engine process goes away
+    assert proc.wait(10) == 0
+
+
+def test_lost_engine_fails_unfinished_jobs(make_mkv, tmp_path, host):
+    start, connect = host
+    proc = start()
+    script = tmp_path / "fake-ffmpeg"
+    script.write_text(f"#!{sys.executable}\nimport sys, time\ntime.sleep(5)\n")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    cfg = config.AppConfig()
+    cfg.probe_backend = "native"
+    cfg.inplace_flags = False
+    cfg.noop_policy = "remux"
+    cfg.ffmpeg_cmd = str(script)
+
+    client = connect()
+    client.configure(cfg)
+    [job] = client.submit([Job(make_mkv(TRACKS), [], config=cfg)])
+    deadline = time.monotonic() + 10
+    while job.state != RUNNING and time.monotonic() < deadline:
+        client.take_changes()
+        time.sleep(0.02)
+    assert client.running() == [job]
+
+    proc.kill()
+    proc.wait()
+    assert client.take_changes() == [job]
+    assert job.state == FAILED and "stopped" in job.error
+    assert client.lost and client.idle and client.wait(1)
+
+
+def test_frozen_build_starts_itself_as_host(monkeypatch):
+    assert host_command()[1:] == ["-m", "core.enginehost"]
+    # a one-file executable ignores -m and would open another window
+    monkeypatch.setattr(sys, "frozen", True, raising=False)
+    assert host_command() == [sys.executable, "engine-host"]
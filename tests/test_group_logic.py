@@ -16,6 +16,31 @@ qtwidgets.QMessageBox = type(
     {"warning": staticmethod(lambda *a, **k: None)},
 )
 sys.modules["PySide6.QtWidgets"] = qtwidgets
+qtcore = types.ModuleType("PySide6.QtCore")
+
+
+class DummyTimer:
+    def __init__(self, parent=None):
+        self.timeout = DummySignalStub()
+        self.active = False
+
+    def setInterval(self, ms):
+        pass
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+
+class DummySignalStub:
+    def connect(self, cb):
+        pass
+
+
+qtcore.QTimer = DummyTimer
+sys.modules["PySide6.QtCore"] = qtcore
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -146,6 +171,10 @@ def test_add_files_no_duplicates(monkeypatch):
     sig = ";".join(t.signature() for t in tracks)
     assert len(logic.file_groups[sig]) == 1
     assert len(logic.group_bar.group_buttons) == 1
+    probe = logic.file_probes[Path("dup.mkv")]
+    assert probe.tracks == tracks
+    # The file does not exist so the probe can never be reused
+    assert not probe.is_current(Path("dup.mkv"))
 
 
 class DummyWipeButton:
@@ -202,8 +231,82 @@ def test_add_files_error_shows_warning(monkeypatch):
     logic.app_config = AppConfig()
     logic._setup_group_logic()
 
-    logic.add_files_to_groups(["bad.mkv"])
+    logic.add_files_to_groups(["bad.mkv", "worse.mkv"])
 
-    assert warnings
+    assert len(warnings) == 1
     assert "bad.mkv" in warnings[0][0][2]
+    assert "worse.mkv" in warnings[0][0][2]
+
+
+def _wait_for_import(logic):
+    import time
+
+    deadline = time.monotonic() + 5
+    while logic._probe_pool is not None and time.monotonic() < deadline:
+        logic._poll_import()
+        time.sleep(0.01)
+
+
+def test_import_files_in_background(monkeypatch):
+    warnings = []
+    video = [Track(idx=0, tid=0, type="video", codec="h264", language="und", forced=False, name="")]
+    audio = video + [Track(idx=1, tid=1, type="audio", codec="aac", language="eng", forced=False, name="")]
+
+    def fake_query(path, cfg):
+        if path.name.startswith("bad"):
+            raise RuntimeError("unreadable")
+        return audio if path.name.startswith("a") else video
+
+    monkeypatch.setattr(group_logic, "query_tracks", fake_query)
+    monkeypatch.setattr(
+        group_logic.QMessageBox, "warning", lambda *a, **k: warnings.append(a)
+    )
+
+    logic = GroupLogic()
+    logic.group_bar = DummyGroupBar()
+    logic.track_table = DummyTrackTable()
+    logic.app_config = AppConfig()
+    logic._setup_group_logic()
+
+    paths = [f"a{i}.mkv" for i in range(5)] + [f"v{i}.mkv" for i in range(5)]
+    paths += ["bad1.mkv", "bad2.mkv"]
+    logic.import_files(paths)
+    assert logic._import_timer.active
+    _wait_for_import(logic)
+
+    assert not logic._import_timer.active
+    assert len(logic.group_bar.group_buttons) == 2
+    assert sum(len(f) for f in logic.file_groups.values()) == 10
+    assert len(logic.file_probes) == 10
+    assert logic.current_sig is not None
+    # One summary for both failures
+    assert len(warnings) == 1
+    assert "bad1.mkv" in warnings[0][2] and "bad2.mkv" in warnings[0][2]
+
+
+def test_cancel_import(monkeypatch):
+    import threading
+
+    release = threading.Event()
+
+    def slow_query(path, cfg):
+        release.wait(5)
+        return []
+
+    monkeypatch.setattr(group_logic, "query_tracks", slow_query)
+
+    logic = GroupLogic()
+    logic.group_bar = DummyGroupBar()
+    logic.track_table = DummyTrackTable()
+    logic.app_config = AppConfig()
+    logic.app_config.probe_workers = 1
+    logic._setup_group_logic()
+
+    logic.import_files([f"{i}.mkv" for i in range(20)])
+    logic.cancel_import()
+    release.set()
+
+    assert logic._probe_pool is None
+    assert not logic._import_timer.active
+    assert not logic.file_groups
 
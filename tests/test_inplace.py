@@ -0,0 +1,193 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import engine, inplace  # noqa: E402
+from core.engine import Job  # noqa: E402
+from core.inplace import (  # noqa: E402
+    PatchError,
+    apply_patch,
+    patch_flags,
+    plan_file_patch,
+    recover,
+    recover_dirs,
+)
+from core.matroska import read_layout  # noqa: E402
+from core.tracks import Track, _query_tracks_native, probe_file  # noqa: E402
+
+SPEC = [
+    {"type": "video"},
+    {"type": "audio", "language": "jpn", "default": True},
+    {"type": "audio", "language": "eng", "default": False},
+    {"type": "subtitles", "language": "eng", "forced": True},
+]
+
+
+def _flags(path):
+    return [(e.flag_default, e.flag_forced) for e in read_layout(path).entries]
+
+
+def _clusters(path):
+    data = path.read_bytes()
+    return data[data.index(b"\x1f\x43\xb6\x75"):]
+
+
+def _select(path, **changes):
+    tracks = _query_tracks_native(path)
+    for tid, values in changes.items():
+        for key, value in values.items():
+            setattr(tracks[int(tid[1:])], key, value)
+    return tracks
+
+
+def test_overwrite_existing_flags(make_mkv):
+    path = make_mkv(SPEC)
+    before = path.read_bytes()
+    tracks = _select(path, t1={"default_audio": False}, t2={"default_audio": True})
+    assert patch_flags(path, tracks) == 2
+    assert len(path.read_bytes()) == len(before)
+    assert _flags(path)[1:3] == [(False, False), (True, False)]
+    assert _clusters(path) == before[before.index(b"\x1f\x43\xb6\x75"):]
+
+
+def test_adding_flags_uses_void(make_mkv):
+    path = make_mkv(SPEC, void_after_tracks=32)
+    size = path.stat().st_size
+    # The subtitle has no FlagDefault element yet, so one has to be added
+    tracks = _select(path, t3={"forced": False, "default_subtitle": False})
+    assert patch_flags(path, tracks) == 2
+    assert path.stat().st_size == size
+    assert _flags(path)[3] == (False, False)
+    layout = read_layout(path)
+    # SeekHead positions are still valid
+    assert layout.tracks.offset == layout.segment_data + layout.seek_positions[0x1654AE6B]
+
+
+def test_no_room_raises(make_mkv):
+    path = make_mkv(SPEC)
+    tracks = _select(path)
+    tracks[3].default_subtitle = False
+    with pytest.raises(PatchError):
+        plan_file_patch(path, tracks)
+
+
+def test_nothing_to_change(make_mkv):
+    path = make_mkv(SPEC)
+    tracks = _select(path)
+    tracks[3].default_subtitle = True
+    assert plan_file_patch(path, tracks) is None
+
+
+def test_recover_rolls_back_interrupted_patch(make_mkv, monkeypatch):
+    path = make_mkv(SPEC)
+    before = path.read_bytes()
+    tracks = _select(path, t1={"default_audio": False})
+    patch = plan_file_patch(path, tracks)
+
+    def crash(journal):
+        raise OSError("power loss")
+
+    # Simulate a crash after the new bytes were written
+    monkeypatch.setattr(inplace.Path, "unlink", crash)
+    with pytest.raises(OSError):
+        apply_patch(path, patch)
+    monkeypatch.undo()
+    assert path.read_bytes() != before
+    assert inplace.journal_path(path).exists()
+    assert recover(path)
+    assert path.read_bytes() == before
+    assert not inplace.journal_path(path).exists()
+
+
+def _tear(path, tracks):
+    """Crash a patch after its journal and half of its data were written."""
+    patch = plan_file_patch(path, tracks)
+    inplace._write_journal(inplace.journal_path(path), patch)
+    with open(path, "r+b") as fh:
+        fh.seek(patch.offset)
+        fh.write(patch.data[: len(patch.data) // 2])
+
+
+def test_next_job_recovers_torn_patch(make_mkv, defaults):
+    src = make_mkv(SPEC, void_after_tracks=16)
+    before = src.read_bytes()
+    selected = _select(src, t2={"default_audio": True})
+    _tear(src, _select(src, t1={"default_audio": False}, t3={"forced": False}))
+    assert src.read_bytes() != before
+
+    job = Job(src, selected)
+    engine.run_job(
+        job,
+        _query_tracks_native,
+        lambda *a, **kw: pytest.fail("remux must not run"),
+        lambda *a, **kw: None,
+        "out",
+        inplace=True,
+        replace=True,
+    )
+    assert job.method == "flags"
+    assert not inplace.journal_path(src).exists()
+    assert _flags(src)[1:] == [(True, False), (True, False), (True, True)]
+    # Only the requested flag was changed on top of the rolled back header
+    assert len(src.read_bytes()) == len(before)
+
+
+def test_import_and_queue_start_recover(make_mkv, defaults, tmp_path):
+    first = make_mkv(SPEC, "a.mkv")
+    second = make_mkv(SPEC, "b.mkv")
+    before = first.read_bytes(), second.read_bytes()
+    for path in (first, second):
+        _tear(path, _select(path, t1={"default_audio": False}))
+    inplace.journal_path(tmp_path / "gone.mkv").write_bytes(b"")
+
+    defaults.probe_backend = "native"
+    assert probe_file(first, defaults).tracks[1].default_audio
+    assert first.read_bytes() == before[0]
+    assert recover_dirs([tmp_path]) == 1
+    assert second.read_bytes() == before[1]
+    assert not list(tmp_path.glob("*" + inplace.JOURNAL_SUFFIX))
+
+
+def test_damaged_journal_is_discarded(make_mkv):
+    path = make_mkv(SPEC)
+    before = path.read_bytes()
+    inplace.journal_path(path).write_bytes(b"MKVCJ1\n{\"offset\": 0")
+    assert not recover(path)
+    assert path.read_bytes() == before
+
+
+def test_run_job_patches_flag_only_jobs(make_mkv):
+    src = make_mkv(SPEC, void_after_tracks=16)
+    selected = _select(src, t1={"default_audio": False}, t2={"default_audio": True})
+    job = Job(src, selected)
+    engine.run_job(
+        job,
+        _query_tracks_native,
+        lambda *a, **kw: pytest.fail("remux must not run"),
+        lambda *a, **kw: None,
+        "out",
+        inplace=True,
+    )
+    assert job.method == "flags"
+    assert _flags(job.destination)[1:3] == [(False, False), (True, False)]
+    assert _flags(src)[1:3] == [(True, False), (False, False)]
+
+
+def test_run_job_remuxes_when_tracks_removed(make_mkv):
+    src = make_mkv(SPEC)
+    selected = _select(src, t2={"removed": True})
+    ran = []
+    job = Job(src, selected)
+    engine.run_job(
+        job,
+        _query_tracks_native,
+        lambda *a, **kw: ["remux"],
+        lambda cmd, capture=True: ran.append(cmd),
+        "out",
+        inplace=True,
+    )
+    assert job.method == "remux"
+    assert ran == [["remux"]]
@@ -0,0 +1,133 @@
+import os
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import journal as journal_mod  # noqa: E402
+from core.config import AppConfig  # noqa: E402
+from core.engine import DONE, FAILED, Job, ProcessingEngine  # noqa: E402
+from core.journal import RESUMED, JobJournal  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def _version(monkeypatch):
+    monkeypatch.setattr(journal_mod, "backend_version", lambda cfg: f"{cfg.backend}-1")
+
+
+def _job(src, cfg, removed=True):
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    tracks[0].removed = removed
+    return Job(Path(src), tracks, config=cfg)
+
+
+def _copy(job):
+    cfg = job.config
+    if cfg.replace_original:
+        job.destination = job.source
+        job.source.write_bytes(job.source.read_bytes() + b"!")
+        return
+    job.destination = Path(job.source).parent / cfg.output_dir / Path(job.source).name
+    job.destination.parent.mkdir(exist_ok=True)
+    job.destination.write_bytes(job.source.read_bytes())
+
+
+def _run(journal, jobs, execute=_copy):
+    ran = []
+    engine = ProcessingEngine(journal.wrap(lambda job: ran.append(job) or execute(job)), 2)
+    engine.submit(jobs)
+    engine.wait()
+    engine.shutdown()
+    return ran
+
+
+def test_rerun_skips_finished_jobs(tmp_path):
+    cfg = AppConfig()
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    a, b = tmp_path / "a.mkv", tmp_path / "b.mkv"
+    a.write_bytes(b"a")
+    b.write_bytes(b"b")
+    assert len(_run(journal, [_job(a, cfg), _job(b, cfg)])) == 2
+    assert journal.counts() == {"done": 2}
+
+    # Nothing changed: both are skipped
+    jobs = [_job(a, cfg), _job(b, cfg)]
+    assert journal.pending(jobs) == []
+    assert _run(journal, jobs) == []
+    assert all(j.state == DONE and j.method == RESUMED for j in jobs)
+
+    # Changed source, output or selection and a new backend run again
+    a.write_bytes(b"a2")
+    assert journal.pending([_job(a, cfg)])
+    (tmp_path / "cleaned" / "b.mkv").write_bytes(b"other")
+    assert journal.pending([_job(b, cfg)])
+    _run(journal, [_job(a, cfg), _job(b, cfg)])
+    assert not journal.pending([_job(a, cfg), _job(b, cfg)])
+    assert journal.pending([_job(a, cfg, removed=False)])
+    cfg.backend = "mkvtoolnix"
+    assert journal.pending([_job(a, cfg)])
+
+
+def test_output_settings_are_part_of_the_fingerprint(tmp_path):
+    cfg = AppConfig()
+    cfg.replace_original = True
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"a")
+    _run(journal, [_job(src, cfg)])
+    assert not journal.pending([_job(src, cfg)])
+    for changed in (
+        replace(cfg, inplace_flags=False),
+        replace(cfg, noop_policy="remux"),
+        replace(cfg, backup_hours=0),
+    ):
+        assert journal.pending([_job(src, changed)])
+    # how long backups are kept does not change the output
+    assert not journal.pending([_job(src, replace(cfg, backup_hours=48))])
+
+
+def test_failed_jobs_run_again(tmp_path):
+    cfg = AppConfig()
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"a")
+
+    def fail(job):
+        raise RuntimeError("boom")
+
+    job = _job(src, cfg)
+    _run(journal, [job], fail)
+    assert job.state == FAILED
+    assert journal.counts() == {"failed": 1}
+    assert len(_run(journal, [_job(src, cfg)])) == 1
+
+
+def test_replaced_sources_are_recognised(tmp_path):
+    cfg = AppConfig()
+    cfg.replace_original = True
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"a")
+    _run(journal, [_job(src, cfg)])
+    assert src.read_bytes() == b"a!"
+    assert _run(journal, [_job(src, cfg)]) == []
+    src.write_bytes(b"new")
+    assert len(_run(journal, [_job(src, cfg)])) == 1
+
+
+def test_skipped_noop_is_remembered(tmp_path):
+    cfg = AppConfig()
+    journal = JobJournal(tmp_path / "jobs.sqlite3")
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"a")
+
+    def skip(job):
+        job.destination = tmp_path / "cleaned" / "a.mkv"
+        job.method = "skipped"
+
+    _run(journal, [_job(src, cfg)], skip)
+    assert not journal.pending([_job(src, cfg)])
@@ -0,0 +1,120 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import ebml  # noqa: E402
+from core.matroska import MatroskaError, read_layout  # noqa: E402
+import core.tracks as tracks  # noqa: E402
+
+SAMPLE = [
+    {"type": "video"},
+    {"type": "audio", "language": "jpn", "name": "Japanese", "default": True},
+    {"type": "audio", "language": "eng", "default": False},
+    {"type": "subtitles", "language": "eng", "name": "Signs", "forced": True, "default": False},
+    {"type": "subtitles", "language": "spa", "default": True},
+]
+
+
+def test_vint_roundtrip():
+    for value in (0, 1, 126, 127, 16382, 16383, 2**35):
+        data = ebml.encode_vint(value)
+        assert ebml.read_vint(data, 0) == (value, len(data))
+    assert ebml.read_vint(b"\xff", 0) == (ebml.UNKNOWN_SIZE, 1)
+    assert len(ebml.void_element(2)) == 2
+    assert len(ebml.void_element(500)) == 500
+
+
+def test_read_layout(make_mkv):
+    layout = read_layout(make_mkv(SAMPLE))
+    assert [e.type for e in layout.entries] == [
+        "video", "audio", "audio", "subtitles", "subtitles"
+    ]
+    assert layout.duration == pytest.approx(2.0)
+    # Language defaults to English, FlagDefault to on
+    assert layout.entries[0].language == "eng"
+    assert layout.entries[0].flag_default is True
+
+
+def test_native_probe_tracks(make_mkv, defaults):
+    defaults.probe_backend = "native"
+    result = tracks.query_tracks(make_mkv(SAMPLE), defaults)
+    assert [(t.tid, t.type, t.language) for t in result] == [
+        (0, "video", "eng"),
+        (1, "audio", "jpn"),
+        (2, "audio", "eng"),
+        (3, "subtitles", "eng"),
+        (4, "subtitles", "spa"),
+    ]
+    assert result[1].default_audio and result[1].orig_default_audio
+    assert not result[2].default_audio
+    assert result[3].forced and result[3].orig_forced and result[3].name == "Signs"
+    assert result[4].default_subtitle and not result[4].forced
+    # ffmpeg is the default backend, codecs are named like ffprobe does
+    assert [t.codec for t in result[:4]] == ["h264", "aac", "aac", "subrip"]
+
+
+def test_tracks_found_through_seekhead(make_mkv):
+    path = make_mkv(SAMPLE, order=("info", "clusters", "tracks", "cues"))
+    layout = read_layout(path)
+    assert len(layout.entries) == len(SAMPLE)
+    assert layout.tracks.offset > layout.segment_data
+
+
+def test_tracks_after_cluster_without_seekhead(make_mkv):
+    path = make_mkv(SAMPLE, order=("info", "clusters", "tracks", "cues"), seekhead=False)
+    with pytest.raises(MatroskaError):
+        read_layout(path)
+
+
+def test_unsupported_files(tmp_path, make_mkv):
+    empty = tmp_path / "empty.mkv"
+    empty.write_bytes(b"")
+    junk = tmp_path / "junk.mkv"
+    junk.write_bytes(b"RIFF....AVI LIST")
+    for path in (empty, junk, make_mkv(SAMPLE, name="x.mkv", doc_type="foo")):
+        with pytest.raises(MatroskaError):
+            read_layout(path)
+
+
+def test_native_probe_falls_back(monkeypatch, tmp_path, defaults):
+    junk = tmp_path / "junk.mkv"
+    junk.write_bytes(b"not matroska")
+    calls = []
+
+    def fake_run(cmd, capture=True):
+        calls.append(cmd)
+        return type("R", (), {"stdout": '{"tracks": []}'})()
+
+    monkeypatch.setattr(tracks, "run_command", fake_run)
+    defaults.backend = "mkvtoolnix"
+    defaults.probe_backend = "native"
+    assert tracks.query_tracks(junk, defaults) == []
+    assert calls and calls[0][:2] == ["mkvmerge", "-J"]
+
+
+def test_native_and_fallback_probes_group_alike(monkeypatch, tmp_path, make_mkv, defaults):
+    native = make_mkv([{"type": "video"}, {"type": "audio"}, {"type": "subtitles"}])
+    junk = tmp_path / "junk.mkv"
+    junk.write_bytes(b"not matroska")
+    streams = [
+        {"index": 0, "codec_type": "video", "codec_name": "h264", "tags": {"language": "eng"}},
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "tags": {"language": "eng"}},
+        {"index": 2, "codec_type": "subtitle", "codec_name": "subrip", "tags": {"language": "eng"}},
+    ]
+    output = json.dumps({"streams": streams})
+    monkeypatch.setattr(
+        tracks, "run_command", lambda cmd, capture=True: type("R", (), {"stdout": output})()
+    )
+    defaults.probe_backend = "native"
+    probed = tracks.query_tracks(native, defaults)
+    fallback = tracks.query_tracks(junk, defaults)
+    assert [t.signature() for t in probed] == [t.signature() for t in fallback]
+
+    # mkvmerge reports CodecIDs itself
+    defaults.backend = "mkvtoolnix"
+    assert tracks.query_tracks(native, defaults)[1].codec == "A_AAC"
@@ -0,0 +1,105 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import engine, noop  # noqa: E402
+from core.engine import Job, ProcessingEngine  # noqa: E402
+from core.noop import clone_file, is_noop, kernel_copy  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+
+def _track(tid, type_, forced=False, **kw):
+    return Track(idx=tid, tid=tid, type=type_, codec="x", language="eng", forced=forced, name="", **kw)
+
+
+def _file_tracks():
+    return [
+        _track(0, "video"),
+        _track(1, "audio", default_audio=True, orig_default_audio=True),
+        _track(2, "subtitles", forced=True, orig_forced=True),
+    ]
+
+
+def test_is_noop():
+    tracks = _file_tracks()
+    assert is_noop(tracks)
+    tracks[2].forced = False
+    assert not is_noop(tracks)
+    tracks = _file_tracks()
+    tracks[1].default_audio = False
+    assert not is_noop(tracks)
+    tracks = _file_tracks()
+    tracks[0].removed = True
+    assert not is_noop(tracks)
+
+
+@pytest.mark.parametrize("policy", ["reflink", "hardlink", "copy"])
+def test_clone_file(tmp_path, policy):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(os.urandom(200_000))
+    dst = tmp_path / "out" / "a.mkv"
+    dst.parent.mkdir()
+    # An old hard link at the destination must not be written through
+    os.link(src, dst)
+    method = clone_file(src, dst, policy)
+    assert dst.read_bytes() == src.read_bytes()
+    if policy == "hardlink":
+        assert method == "hardlink" and os.path.samefile(src, dst)
+    else:
+        assert method in ("reflink", "copy") and not os.path.samefile(src, dst)
+    with pytest.raises(ValueError):
+        clone_file(src, src)
+
+
+def test_kernel_copy_without_copy_file_range(tmp_path, monkeypatch):
+    monkeypatch.delattr(noop.os, "copy_file_range", raising=False)
+    src = tmp_path / "a"
+    src.write_bytes(b"abc" * 1000)
+    kernel_copy(src, tmp_path / "b")
+    assert (tmp_path / "b").read_bytes() == src.read_bytes()
+
+
+def _run(job, policy, commands):
+    engine.run_job(
+        job,
+        lambda s: _file_tracks(),
+        lambda *a, **k: ["cmd"],
+        lambda cmd, capture=True: commands.append(cmd),
+        "out",
+        noop=policy,
+    )
+
+
+def test_noop_jobs_skip_the_backend(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"x" * 5000)
+    selection = _file_tracks()
+    commands = []
+
+    job = Job(src, selection)
+    _run(job, "copy", commands)
+    assert commands == []
+    assert job.method == "copy" and job.bytes_avoided == 5000
+    assert (tmp_path / "out" / "a.mkv").read_bytes() == src.read_bytes()
+
+    skipped = Job(src, selection)
+    _run(skipped, "skip", commands)
+    assert skipped.method == "skipped" and commands == []
+
+    eng = ProcessingEngine(lambda j: None)
+    eng.jobs.extend([job, skipped])
+    assert eng.bytes_avoided() == 10_000
+
+    # Changing a flag makes it a real job again
+    changed = _file_tracks()
+    changed[2].forced = False
+    real = Job(src, changed)
+    _run(real, "copy", commands)
+    assert real.method == "remux" and commands == [["cmd"]]
+    remuxed = Job(src, selection)
+    _run(remuxed, "remux", commands)
+    assert remuxed.method == "remux" and remuxed.bytes_avoided == 0
@@ -0,0 +1,89 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.engine import CANCELLED, DONE, FAILED, Job, ProcessingEngine  # noqa: E402
+from core.pipeline import Pipeline  # noqa: E402
+
+
+def _source(count, made):
+    for i in range(count):
+        made.append(i)
+        yield Job(Path(f"/src/{i}.mkv"), [])
+
+
+def test_streams_jobs_with_bounded_queues():
+    made = []
+    ahead = []
+    lock = threading.Lock()
+    executed = []
+
+    def execute(job):
+        with lock:
+            # Sources created but not yet executed stay bounded
+            ahead.append(len(made) - len(executed))
+            executed.append(job)
+        time.sleep(0.001)
+
+    def probe(job):
+        return [job.source.name]
+
+    def plan(job, tracks):
+        job.destination = Path("/out") / job.source.name
+        return tracks + ["planned"]
+
+    seen = []
+    engine = ProcessingEngine(lambda job: seen.append(job.planned_tracks) or execute(job), 2)
+    pipeline = Pipeline(engine, probe, plan, probe_workers=3, queue_size=4)
+    finished = []
+    stats = pipeline.run(_source(200, made), finished.append)
+    engine.shutdown()
+
+    assert stats.total == stats.done == 200
+    assert len(finished) == 200 and all(j.state == DONE for j in finished)
+    assert all(t[-1] == "planned" for t in seen)
+    # 3 stage queues + probe/plan workers + engine queue and workers
+    assert max(ahead) <= 4 * 4 + 3 + 1 + 2 + 2
+    # Finished jobs are not kept by the engine
+    assert engine.jobs == []
+
+
+def test_probe_failures_are_reported_and_others_continue():
+    def probe(job):
+        if job.source.name == "1.mkv":
+            raise OSError("unreadable")
+        return []
+
+    engine = ProcessingEngine(lambda job: None, 2)
+    finished = []
+    stats = Pipeline(engine, probe, lambda job, t: t).run(_source(4, []), finished.append)
+    engine.shutdown()
+
+    failed = [j for j in finished if j.state == FAILED]
+    assert [j.source.name for j in failed] == ["1.mkv"]
+    assert failed[0].error == "unreadable"
+    assert (stats.done, stats.failed) == (3, 1)
+
+
+def test_cancel_stops_the_source():
+    made = []
+    started = threading.Event()
+
+    def execute(job):
+        started.set()
+        time.sleep(0.01)
+
+    engine = ProcessingEngine(execute, 1)
+    pipeline = Pipeline(engine, lambda job: [], lambda job, t: t, queue_size=2)
+    threading.Thread(target=lambda: started.wait(5) and pipeline.cancel()).start()
+    stats = pipeline.run(_source(10_000, made))
+    engine.shutdown()
+
+    assert stats.cancelled > 0
+    assert stats.done + stats.failed + stats.cancelled == stats.total
+    assert len(made) < 100
+    assert all(j.state in (DONE, CANCELLED) for j in engine.jobs)
@@ -0,0 +1,148 @@
+import io
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.config import AppConfig  # noqa: E402
+from core.engine import DONE, FAILED, Job, ProcessingEngine  # noqa: E402
+from core.inplace import journal_path  # noqa: E402
+from core.plan import (  # noqa: E402
+    execute_plan_job,
+    find_collisions,
+    make_plan,
+    plan_to_jobs,
+    read_plan,
+    summarize,
+    write_plan,
+)
+from core.tracks import Track  # noqa: E402
+
+
+def _track(tid, type_, **kw):
+    return Track(idx=tid, tid=tid, type=type_, codec="x", language="eng", forced=False, name="", **kw)
+
+
+def _probe(src):
+    return [
+        _track(0, "video"),
+        _track(1, "audio", default_audio=True, orig_default_audio=True),
+        _track(2, "audio"),
+    ]
+
+
+def _job(src, remove_audio=True):
+    tracks = _probe(src)
+    tracks[2].removed = remove_audio
+    return Job(Path(src), tracks)
+
+
+def _cfg(tmp_path, **kw):
+    cfg = AppConfig()
+    cfg.output_dir = str(tmp_path / "out")
+    cfg.noop_policy = "reflink"
+    for k, v in kw.items():
+        setattr(cfg, k, v)
+    return cfg
+
+
+def test_plan_writes_nothing_and_estimates_bytes(tmp_path):
+    a = tmp_path / "a.mkv"
+    b = tmp_path / "b.mkv"
+    a.write_bytes(b"x" * 1000)
+    b.write_bytes(b"y" * 500)
+    cfg = _cfg(tmp_path)
+    entries = make_plan([_job(a), _job(b, remove_audio=False)], cfg, workers=2, probe=_probe)
+    assert not (tmp_path / "out").exists()
+
+    remux, noop = entries
+    assert remux.ok and remux.method == "remux" and remux.backend == "ffmpeg"
+    assert remux.destination == str(tmp_path / "out" / "a.mkv")
+    assert remux.command[0] == cfg.ffmpeg_cmd and remux.command[-1] == remux.destination
+    assert remux.bytes_read == 1000 and remux.bytes_written >= 1000
+    assert remux.stamp[0] == 1000
+    assert [t["removed"] for t in remux.tracks] == [False, False, True]
+    assert noop.method == "noop" and noop.bytes_written == 0
+
+    summary = summarize(entries)
+    assert summary["files"] == 2 and summary["methods"] == {"remux": 1, "noop": 1}
+    assert summary["bytes_read"] == 1000
+
+
+def test_plan_reports_errors(tmp_path):
+    def broken(src):
+        raise RuntimeError("probe failed")
+
+    (entry,) = make_plan([_job(tmp_path / "a.mkv")], _cfg(tmp_path), probe=broken)
+    assert entry.error == "probe failed" and not entry.ok
+
+
+def test_plan_leaves_interrupted_flag_edits_alone(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"half patched")
+    journal_path(src).write_bytes(b"original bytes")
+    (entry,) = make_plan([_job(src)], _cfg(tmp_path), probe=_probe)
+    assert "interrupted flag edit" in entry.error and not entry.ok
+    # a dry run must not roll the patch back
+    assert src.read_bytes() == b"half patched" and journal_path(src).exists()
+
+
+def test_collisions(tmp_path):
+    cfg = _cfg(tmp_path, output_dir=str(tmp_path))
+    one = tmp_path / "one"
+    one.mkdir()
+    (one / "a.mkv").write_bytes(b"1")
+    entries = make_plan(
+        [_job(tmp_path / "one" / "a.mkv"), _job(tmp_path / "two" / "a.mkv"), _job(tmp_path / "b.mkv")],
+        cfg,
+        probe=_probe,
+    )
+    # Both a.mkv write tmp_path/a.mkv; b.mkv writes over its own source
+    assert "2 sources write" in entries[0].collision
+    assert "2 sources write" in entries[1].collision
+    assert "overwrites the source" in entries[2].collision
+    assert find_collisions(entries[:1]) == 0
+
+
+def test_round_trip(tmp_path):
+    (tmp_path / "a.mkv").write_bytes(b"x")
+    entries = make_plan([_job(tmp_path / "a.mkv")], _cfg(tmp_path), probe=_probe)
+    for fmt in ("jsonl", "json"):
+        buf = io.StringIO()
+        write_plan(entries, buf, fmt)
+        buf.seek(0)
+        assert read_plan(buf) == entries
+
+
+def test_execute_saved_plan(tmp_path):
+    src = tmp_path / "a.mkv"
+    changed = tmp_path / "b.mkv"
+    src.write_bytes(b"payload")
+    changed.write_bytes(b"old")
+    entries = make_plan([_job(src), _job(changed)], _cfg(tmp_path), probe=_probe)
+    for e in entries:
+        # Stand-in for the backend: copy the source to the planned output
+        e.command = [
+            sys.executable,
+            "-c",
+            "import shutil, sys; shutil.copyfile(sys.argv[1], sys.argv[2])",
+            e.source,
+            e.destination,
+        ]
+    buf = io.StringIO()
+    write_plan(entries, buf)
+    buf.seek(0)
+    changed.write_bytes(b"changed")
+    # A good output of an earlier run must survive a job failing before it writes
+    (tmp_path / "out").mkdir(exist_ok=True)
+    (tmp_path / "out" / "b.mkv").write_bytes(b"earlier run")
+
+    engine = ProcessingEngine(execute_plan_job, 2)
+    jobs = engine.submit(plan_to_jobs(read_plan(buf)))
+    engine.wait()
+    engine.shutdown()
+    assert jobs[0].state == DONE and jobs[0].method == "remux"
+    assert (tmp_path / "out" / "a.mkv").read_bytes() == b"payload"
+    assert jobs[1].state == FAILED and "changed since" in jobs[1].error
+    assert (tmp_path / "out" / "b.mkv").read_bytes() == b"earlier run"
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import core.tracks as tracks  # noqa: E402
+from core.probe_cache import ProbeCache, file_key  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+SAMPLE = [{"type": "video"}, {"type": "audio", "language": "ger"}]
+
+
+def _track(name):
+    return Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name=name)
+
+
+def test_hit_miss_and_invalidation(tmp_path):
+    media = tmp_path / "a.mkv"
+    media.write_bytes(b"x" * 10)
+    cache = ProbeCache(tmp_path / "cache.db")
+
+    key = file_key(media, "ffmpeg", "v1")
+    assert cache.get(key) is None
+    cache.put(key, [_track("one")])
+    assert cache.get(key)[0].name == "one"
+    # Different tool version or backend is a different entry
+    assert cache.get(file_key(media, "ffmpeg", "v2")) is None
+    assert cache.get(file_key(media, "mkvtoolnix", "v1")) is None
+
+    media.write_bytes(b"x" * 11)
+    assert cache.get(file_key(media, "ffmpeg", "v1")) is None
+    assert cache.stats() == {"hits": 1, "misses": 4}
+
+
+def test_wal_mode(tmp_path):
+    cache = ProbeCache(tmp_path / "cache.db")
+    mode = cache._conn().execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+def test_lru_eviction(tmp_path):
+    cache = ProbeCache(tmp_path / "cache.db", max_entries=2)
+    keys = []
+    for i in range(3):
+        media = tmp_path / f"{i}.mkv"
+        media.write_bytes(b"x")
+        keys.append(file_key(media, "ffmpeg", "v1"))
+        cache.put(keys[-1], [_track(str(i))])
+    # Touch the oldest entry so the second one becomes least recently used
+    assert cache.get(keys[0]) is not None
+    assert cache.evict() == 1
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_threads_share_cache(tmp_path):
+    cache = ProbeCache(tmp_path / "cache.db")
+    media = tmp_path / "a.mkv"
+    media.write_bytes(b"x")
+    key = file_key(media, "native", "1")
+    cache.put(key, [_track("t")])
+    results = []
+
+    def worker():
+        results.append(cache.get(key))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert all(r and r[0].name == "t" for r in results)
+
+
+def test_query_tracks_uses_cache(tmp_path, make_mkv, monkeypatch, defaults):
+    path = make_mkv(SAMPLE)
+    defaults.probe_backend = "native"
+    defaults.probe_cache = str(tmp_path / "probe.db")
+    calls = []
+    orig = tracks._PROBES["native"]
+
+    def counting(source, cfg):
+        calls.append(source)
+        return orig(source, cfg)
+
+    monkeypatch.setitem(tracks._PROBES, "native", counting)
+    first = tracks.query_tracks(path, defaults)
+    second = tracks.query_tracks(path, defaults)
+    assert len(calls) == 1
+    assert first == second
+    assert second[1].language == "ger"
+
+
+def test_corrupt_cache_falls_back_to_probing(tmp_path, make_mkv, defaults, caplog):
+    path = make_mkv(SAMPLE)
+    db = tmp_path / "probe.db"
+    db.write_bytes(b"not a database" * 100)
+    defaults.probe_backend = "native"
+    defaults.probe_cache = str(db)
+    with caplog.at_level("WARNING", logger="core.probe_cache"):
+        first = tracks.query_tracks(path, defaults)
+        second = tracks.query_tracks(path, defaults)
+    assert first == second and first[1].language == "ger"
+    assert len([r for r in caplog.records if "unusable" in r.message]) == 1
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.probe_pool import ProbePool  # noqa: E402
+
+
+def _drain_all(pool, limit=None):
+    out = []
+    deadline = time.monotonic() + 5
+    while not pool.done and time.monotonic() < deadline:
+        out.extend(pool.drain(limit))
+        time.sleep(0.005)
+    return out
+
+
+def test_results_and_errors_are_collected():
+    def probe(path):
+        if path.name == "bad":
+            raise ValueError("nope")
+        return path.name.upper()
+
+    pool = ProbePool(probe, max_workers=3)
+    pool.submit(["a", "b", "bad", "c"])
+    outcomes = _drain_all(pool, limit=1)
+    pool.shutdown()
+
+    assert {o.path for o in outcomes} == {Path("a"), Path("b"), Path("bad"), Path("c")}
+    assert {o.result for o in outcomes if o.error is None} == {"A", "B", "C"}
+    (failed,) = [o for o in outcomes if o.error is not None]
+    assert failed.path == Path("bad") and isinstance(failed.error, ValueError)
+    assert pool.finished == pool.total == 4
+
+
+def test_cancel_discards_pending():
+    calls = []
+
+    def probe(path):
+        calls.append(path)
+        time.sleep(0.01)
+        return path
+
+    pool = ProbePool(probe, max_workers=1)
+    pool.submit([str(i) for i in range(50)])
+    pool.cancel()
+    time.sleep(0.05)
+
+    assert pool.done
+    assert pool.drain() == []
+    assert len(calls) < 50
+    assert pool.submit(["late"]) == 0
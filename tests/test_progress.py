@@ -0,0 +1,96 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import core.progress as progress  # noqa: E402
+from core.progress import (  # noqa: E402
+    FFmpegProgressParser,
+    JobProgress,
+    MkvmergeProgressParser,
+    aggregate_rate,
+    make_parser,
+)
+
+
+def _feed(parser, text):
+    for line in text.strip().splitlines():
+        parser.feed(line)
+
+
+def test_ffmpeg_parser_uses_duration():
+    prog = JobProgress(total_bytes=1000)
+    parser = FFmpegProgressParser(prog, duration=10.0)
+    _feed(parser, "out_time_us=2500000\ntotal_size=100\nprogress=continue")
+    assert prog.percent == 25.0
+    assert prog.bytes_done == 250
+
+
+def test_ffmpeg_parser_waits_for_block_end():
+    prog = JobProgress(total_bytes=1000)
+    parser = FFmpegProgressParser(prog, duration=10.0)
+    parser.feed("out_time_us=5000000")
+    assert prog.percent == 0.0
+    parser.feed("progress=continue")
+    assert prog.percent == 50.0
+
+
+def test_ffmpeg_parser_falls_back_to_size():
+    prog = JobProgress(total_bytes=1000)
+    parser = FFmpegProgressParser(prog)
+    _feed(parser, "out_time_us=N/A\ntotal_size=400\nprogress=continue")
+    assert prog.bytes_done == 400
+    assert prog.percent == 40.0
+
+
+def test_mkvmerge_parser():
+    prog = JobProgress(total_bytes=200)
+    parser = MkvmergeProgressParser(prog)
+    _feed(parser, "#GUI#begin_scanning_playlists\n#GUI#progress 10%\nnoise\n#GUI#progress 60%")
+    assert prog.percent == 60.0
+    assert prog.bytes_done == 120
+
+
+def test_make_parser():
+    prog = JobProgress()
+    assert isinstance(make_parser("ffmpeg", prog), FFmpegProgressParser)
+    assert isinstance(make_parser("mkvtoolnix", prog), MkvmergeProgressParser)
+
+
+def test_progress_never_goes_backwards():
+    prog = JobProgress(total_bytes=100)
+    prog.update(50.0)
+    prog.update(30.0)
+    assert prog.percent == 50.0
+    prog.update(150.0)
+    assert prog.percent == 100.0
+
+
+def test_rate_eta_and_stall(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    prog = JobProgress(total_bytes=4_000_000)
+    now[0] = 102.0
+    prog.update(25.0)
+    assert prog.rate == 500_000
+    assert prog.mb_per_s == 0.5
+    assert prog.eta == 6.0
+    assert not prog.stalled
+    now[0] += progress.STALL_SECONDS + 1
+    assert prog.stalled
+    prog.finish()
+    assert prog.eta == 0.0
+    assert not prog.stalled
+
+
+def test_aggregate_rate(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    a = JobProgress(total_bytes=100)
+    now[0] = 1.0
+    b = JobProgress(total_bytes=100)
+    now[0] = 2.0
+    a.finish()
+    b.update(bytes_done=100)
+    assert aggregate_rate([a, b]) == 100.0
+    assert aggregate_rate([]) == 0.0
@@ -0,0 +1,194 @@
+import os
+import sys
+import time
+import types
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+sys.modules["PySide6"] = types.ModuleType("PySide6")
+qtcore = types.ModuleType("PySide6.QtCore")
+
+
+class DummySignal:
+    def connect(self, cb):
+        pass
+
+
+class DummyTimer:
+    def __init__(self, parent=None):
+        self.timeout = DummySignal()
+        self.active = False
+
+    def setInterval(self, ms):
+        pass
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+
+qtcore.QTimer = DummyTimer
+qtcore.QMetaObject = type("QMetaObject", (), {"invokeMethod": lambda *a, **k: None})
+qtcore.Q_ARG = lambda typ, val: val
+qtcore.Qt = type("Qt", (), {"QueuedConnection": 0})
+sys.modules["PySide6.QtCore"] = qtcore
+qtwidgets = types.ModuleType("PySide6.QtWidgets")
+qtwidgets.QMessageBox = type(
+    "QMessageBox",
+    (),
+    {
+        "warning": staticmethod(lambda *a, **k: None),
+        "information": staticmethod(lambda *a, **k: None),
+        "question": staticmethod(lambda *a, **k: 1),
+        "Yes": 1,
+        "No": 0,
+    },
+)
+sys.modules["PySide6.QtWidgets"] = qtwidgets
+
+import importlib  # noqa: E402
+import gui.queue_logic as queue_logic  # noqa: E402
+
+queue_logic = importlib.reload(queue_logic)
+
+from core.config import AppConfig  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+
+class DummyPanelModel:
+    def __init__(self):
+        self.updates = []
+
+    def update_jobs(self, jobs):
+        self.updates.append(list(jobs))
+
+
+class DummyPanel:
+    def __init__(self):
+        self.model = DummyPanelModel()
+        self.clearClicked = DummySignal()
+        self.pauseToggled = DummySignal()
+        self.cancelAllClicked = DummySignal()
+        self.jobActionRequested = DummySignal()
+        self.summary = None
+
+    def set_summary(self, counts, rate=0.0):
+        self.summary = counts
+
+
+class DummyWindow(queue_logic.QueueLogic):
+    def __init__(self):
+        self.app_config = AppConfig()
+        self.queue_panel = DummyPanel()
+        self._setup_queue_logic()
+
+
+def test_enqueue_copies_selection_and_reports(monkeypatch):
+    executed = []
+    monkeypatch.setattr(queue_logic, "execute_job", lambda job: executed.append(job))
+
+    win = DummyWindow()
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    jobs = win.enqueue_jobs([(Path("a.mkv"), tracks, None), (Path("b.mkv"), tracks, None)], True)
+    # Editing the group afterwards must not affect queued jobs
+    tracks[0].removed = True
+    assert win.engine.wait(5)
+    win._refresh_queue()
+
+    assert len(executed) == 2
+    assert jobs[0].tracks is jobs[1].tracks
+    assert jobs[0].tracks[0].removed is False
+    assert jobs[0].wipe_all is True
+    assert jobs[0].config is not win.app_config
+    assert win.queue_panel.summary["done"] == 2
+    assert not win._queue_timer.active
+    win.engine.shutdown()
+
+
+def test_pause_and_cancel_queue(monkeypatch):
+    executed = []
+    monkeypatch.setattr(queue_logic, "execute_job", lambda job: executed.append(job))
+
+    win = DummyWindow()
+    win._ensure_engine()
+    win.set_queue_paused(True)
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    jobs = win.enqueue_jobs([(Path("a.mkv"), tracks, None), (Path("b.mkv"), tracks, None)])
+    assert win.queue_panel.summary["queued"] == 2
+    win._job_action("cancel", jobs[:1])
+    win.set_queue_paused(False)
+    assert win.engine.wait(5)
+    win._refresh_queue()
+
+    assert executed == jobs[1:]
+    assert win.queue_panel.summary["cancelled"] == 1
+    assert win.queue_panel.summary["done"] == 1
+    win.engine.shutdown()
+
+
+def test_enqueue_skips_journaled_jobs(monkeypatch, tmp_path):
+    def execute(job):
+        job.destination = tmp_path / "cleaned" / job.source.name
+        job.destination.parent.mkdir(exist_ok=True)
+        job.destination.write_bytes(b"out")
+
+    monkeypatch.setattr(queue_logic, "execute_job", execute)
+    asked = []
+    monkeypatch.setattr(queue_logic, "confirm_overwrite", lambda p, s, o: asked.append(s) or True)
+
+    win = DummyWindow()
+    win.app_config.job_journal = str(tmp_path / "jobs.sqlite3")
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"a")
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    assert len(win.enqueue_jobs([(src, tracks, None)])) == 1
+    assert win.engine.wait(5)
+    win._refresh_queue()
+
+    assert win.enqueue_jobs([(src, tracks, None)]) == []
+    assert asked == [[src]]
+    win.engine.shutdown()
+
+
+def test_large_batches_are_fed_as_the_engine_makes_room(monkeypatch):
+    executed = []
+    monkeypatch.setattr(queue_logic, "execute_job", lambda job: executed.append(job))
+
+    win = DummyWindow()
+    win._ensure_engine()
+    win.set_queue_paused(True)
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    entries = [(Path(f"{i}.mkv"), tracks, None) for i in range(3 * queue_logic.QUEUE_SIZE)]
+    jobs = win.enqueue_jobs(entries)
+    assert len(jobs) == len(win.engine.jobs) == queue_logic.QUEUE_SIZE
+
+    win.set_queue_paused(False)
+    deadline = time.monotonic() + 10
+    while win._queue_timer.active and time.monotonic() < deadline:
+        win._refresh_queue()
+        time.sleep(0.01)
+    assert [j.source for j in executed] == [src for src, *_ in entries]
+    assert win.queue_panel.summary["done"] == len(entries)
+    win.engine.shutdown()
+
+
+def test_falls_back_to_local_engine(monkeypatch):
+    executed = []
+    monkeypatch.setattr(queue_logic, "execute_job", lambda job: executed.append(job))
+
+    def connect(spawn=True):
+        raise OSError("no engine process")
+
+    monkeypatch.setattr(queue_logic.EngineClient, "connect", staticmethod(connect))
+    win = DummyWindow()
+    win.app_config.engine_process = True
+    tracks = [Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")]
+    jobs = win.enqueue_jobs([(Path("a.mkv"), tracks, None)])
+    assert isinstance(win.engine, queue_logic.ProcessingEngine)
+    assert win.engine.wait(5)
+    assert executed == jobs
+    assert win._confirm_quit()
+    win._shutdown_queue()
@@ -0,0 +1,107 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import ebml  # noqa: E402
+from core import matroska as mk  # noqa: E402
+from core import engine  # noqa: E402
+from core.engine import Job  # noqa: E402
+from core.remux import remux_file  # noqa: E402
+from core.tracks import _query_tracks_native  # noqa: E402
+
+SPEC = [
+    {"type": "video"},
+    {"type": "audio", "language": "jpn", "default": True},
+    {"type": "audio", "language": "eng", "default": False},
+    {"type": "subtitles", "language": "eng", "forced": True},
+]
+
+
+def _blocks(path):
+    """Return the track numbers of all SimpleBlocks, cluster by cluster."""
+    data = path.read_bytes()
+    layout = mk.parse_layout(data)
+    out = []
+    for el in ebml.iter_elements(data, layout.segment.data_start, layout.segment.end):
+        if el.id == mk.CLUSTER_ID:
+            out.append([
+                ebml.read_vint(data, c.data_start)[0]
+                for c in ebml.children(data, el)
+                if c.id == mk.SIMPLE_BLOCK_ID
+            ])
+    return out
+
+
+def _cue_targets(path):
+    data = path.read_bytes()
+    layout = mk.parse_layout(data)
+    cues = ebml.read_element(data, layout.segment_data + layout.seek_positions[mk.CUES_ID])
+    assert cues.id == mk.CUES_ID
+    targets = []
+    for point in ebml.children(data, cues):
+        for pos in ebml.children(data, point):
+            if pos.id == mk.CUE_TRACK_POSITIONS_ID:
+                fields = {c.id: ebml.read_uint(data, c) for c in ebml.children(data, pos)}
+                cluster = ebml.read_element(
+                    data, layout.segment_data + fields[mk.CUE_CLUSTER_POSITION_ID]
+                )
+                targets.append((fields[mk.CUE_TRACK_ID], cluster.id))
+    return targets
+
+
+def test_remux_drops_tracks_and_blocks(make_mkv, tmp_path):
+    src = make_mkv(SPEC, blocks_per_track=3)
+    tracks = _query_tracks_native(src)
+    tracks[2].removed = True
+    tracks[3].removed = True
+    tracks[1].default_audio = False
+    dst = tmp_path / "out.mkv"
+    done = []
+    stats = remux_file(src, dst, tracks, checkpoint=done.append)
+
+    layout = mk.read_layout(dst)
+    assert [e.number for e in layout.entries] == [1, 2]
+    assert layout.entries[1].flag_default is False
+    assert layout.duration == pytest.approx(2.0)
+    assert _blocks(dst) == [[1, 2] * 3, [1, 2] * 3]
+    assert _cue_targets(dst) == [(1, mk.CLUSTER_ID), (1, mk.CLUSTER_ID)]
+    assert stats.blocks_dropped == 12
+    assert stats.bytes_written == dst.stat().st_size
+    assert done[-1] <= src.stat().st_size
+    # Segment size covers the whole file
+    assert layout.segment.end == dst.stat().st_size
+
+
+def test_remux_without_changes_keeps_everything(make_mkv, tmp_path):
+    src = make_mkv(SPEC, seekhead=False, order=("tracks", "info", "clusters", "cues"))
+    dst = tmp_path / "out.mkv"
+    remux_file(src, dst, _query_tracks_native(src))
+    assert _blocks(dst) == _blocks(src)
+    assert [e.language for e in mk.read_layout(dst).entries] == ["eng", "jpn", "eng", "eng"]
+
+
+def test_native_backend_job(make_mkv, defaults):
+    src = make_mkv(SPEC)
+    selected = _query_tracks_native(src)
+    selected[3].removed = True
+    defaults.backend = "native"
+    defaults.probe_backend = "native"
+    job = Job(src, selected, config=defaults)
+    engine.execute_job(job)
+    assert job.method == "native"
+    assert len(mk.read_layout(job.destination).entries) == 3
+    assert job.progress.percent == 100.0
+
+
+def test_native_backend_cancel(make_mkv, defaults):
+    src = make_mkv(SPEC)
+    selected = _query_tracks_native(src)
+    selected[3].removed = True
+    defaults.backend = "native"
+    job = Job(src, selected, config=defaults)
+    job.cancel_requested = True
+    with pytest.raises(engine.JobCancelled):
+        engine.execute_job(job)
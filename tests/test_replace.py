@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+from dataclasses import replace as copy_with
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import engine  # noqa: E402
+from core.config import AppConfig  # noqa: E402
+from core.diskspace import DiskSpace  # noqa: E402
+from core.engine import Job  # noqa: E402
+from core.replace import (  # noqa: E402
+    STALE_TEMP_SECONDS,
+    backup_path,
+    prune_backups,
+    replace_original,
+    temp_path,
+)
+from core.tracks import Track  # noqa: E402
+
+
+def _copy_cmd(s, d, tracks, wipe_forced=False, wipe_all=False):
+    return ["copy", str(s), str(d)]
+
+
+def _run_copy(cmd, capture=True):
+    # Stands in for a backend: writes the "cleaned" file
+    Path(cmd[2]).write_bytes(b"cleaned " + Path(cmd[1]).read_bytes())
+
+
+def test_replace_keeps_backup(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"old")
+    tmp = temp_path(src)
+    tmp.write_bytes(b"new")
+    kept = replace_original(src, tmp)
+    assert src.read_bytes() == b"new"
+    assert kept == backup_path(src) and kept.read_bytes() == b"old"
+    assert not tmp.exists()
+
+    # A second replace refreshes the backup; without backup none is made
+    tmp.write_bytes(b"newer")
+    replace_original(src, tmp)
+    assert kept.read_bytes() == b"new"
+    kept.unlink()
+    tmp.write_bytes(b"newest")
+    assert replace_original(src, tmp, backup=False) is None
+    assert src.read_bytes() == b"newest" and not kept.exists()
+
+
+def test_run_job_replaces_source(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"data")
+    job = Job(src, [])
+    engine.run_job(
+        job, lambda s: [], _copy_cmd, _run_copy, "out", replace=True, backup=True
+    )
+    assert job.destination == src
+    assert src.read_bytes() == b"cleaned data"
+    assert backup_path(src).read_bytes() == b"data"
+    assert not (tmp_path / "out").exists()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".a.mkv.mkvc-backup", "a.mkv"]
+
+
+def test_failed_replace_leaves_source_alone(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"data")
+
+    def run_fail(cmd, capture=True):
+        Path(cmd[2]).write_bytes(b"partial")
+        raise RuntimeError("backend crashed")
+
+    with pytest.raises(RuntimeError):
+        engine.run_job(Job(src, []), lambda s: [], _copy_cmd, run_fail, "out", replace=True)
+    assert src.read_bytes() == b"data"
+    assert [p.name for p in tmp_path.iterdir()] == ["a.mkv"]
+
+
+def test_prune_backups(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"x")
+    os.link(src, backup_path(src))
+    stale = temp_path(tmp_path / "b.mkv")
+    stale.write_bytes(b"partial")
+    old = time.time() - STALE_TEMP_SECONDS - 10
+    os.utime(stale, (old, old))
+    fresh = temp_path(tmp_path / "c.mkv")
+    fresh.write_bytes(b"writing")
+
+    assert prune_backups([tmp_path], 3600) == 1
+    assert backup_path(src).exists() and not stale.exists() and fresh.exists()
+    assert prune_backups([tmp_path, tmp_path / "missing"], 0) == 1
+    assert not backup_path(src).exists() and src.exists()
+
+
+def test_disk_space_counts_temp_file(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"x" * 1000)
+    job = Job(src, [], config=AppConfig(replace_original=True))
+    space = DiskSpace()
+    assert space.destination(job) == temp_path(src)
+    assert space.estimate(job) > 1000
+
+
+def test_disk_space_of_flag_edits_over_the_source(tmp_path):
+    src = tmp_path / "a.mkv"
+    src.write_bytes(b"x" * 1000)
+    track = Track(idx=0, tid=0, type="audio", codec="aac", language="eng", forced=False, name="")
+    cfg = AppConfig(replace_original=True)
+    space = DiskSpace()
+    assert space.estimate(Job(src, [track], config=cfg)) == 0
+    track.removed = True
+    assert space.estimate(Job(src, [track], config=cfg)) > 1000
+    cfg.inplace_flags = False
+    assert space.estimate(Job(src, [copy_with(track, removed=False)], config=cfg)) > 1000
@@ -34,30 +34,45 @@ def test_run_command_capture(monkeypatch):
     assert res.stdout == "out"
 
 
-def test_run_command_no_capture(monkeypatch):
-    called = {}
-
+def test_run_command_no_capture_streams(monkeypatch):
     def fake_run(cmd, **kw):
-        called.update(kw)
-        return subprocess.CompletedProcess(cmd, 0, stdout="out", stderr="")
+        raise AssertionError("remux commands must not be captured")
 
     monkeypatch.setattr(tracks.subprocess, "run", fake_run)
-    res = tracks.run_command(["echo", "hi"], capture=False)
-    assert called.get("capture_output") is True
+    res = tracks.run_command([sys.executable, "-c", "print('x' * 1000)"], capture=False)
+    assert res.returncode == 0
     assert res.stdout == ""
 
 
-def test_run_command_error_no_stderr(monkeypatch, caplog):
-    called = {}
+def test_run_command_error_no_stderr(caplog):
+    caplog.set_level(logging.ERROR)
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        tracks.run_command([sys.executable, "-c", "raise SystemExit(1)"], capture=False)
+    assert info.value.stderr == ""
+    assert "Command failed" in caplog.text
 
-    def fake_run(cmd, **kw):
-        called.update(kw)
-        raise subprocess.CalledProcessError(1, cmd, stderr=None)
 
-    monkeypatch.setattr(tracks.subprocess, "run", fake_run)
+def test_run_command_streams_lines():
+    lines = []
+    code = "import sys; print('a'); print('b'); print('err', file=sys.stderr)"
+    res = tracks.run_command([sys.executable, "-c", code], on_line=lines.append)
+    assert lines == ["a", "b"]
+    assert "err" in res.stderr
+
+
+def test_run_command_streaming_error(caplog):
     caplog.set_level(logging.ERROR)
-    with pytest.raises(subprocess.CalledProcessError):
-        tracks.run_command(["bad"], capture=False)
-    assert called.get("capture_output") is True
-    assert "Command failed" in caplog.text
+    code = "import sys; print('boom', file=sys.stderr); sys.exit(3)"
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        tracks.run_command([sys.executable, "-c", code], on_line=lambda line: None)
+    assert info.value.returncode == 3
+    assert "boom" in info.value.stderr
 
+
+def test_run_command_streaming_missing(monkeypatch):
+    def fake_popen(*a, **kw):
+        raise FileNotFoundError()
+
+    monkeypatch.setattr(tracks.subprocess, "Popen", fake_popen)
+    with pytest.raises(tracks.CommandNotFoundError):
+        tracks.run_command(["ffmpeg"], on_line=lambda line: None)
@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import runner  # noqa: E402
+from core.runner import LineBuffer, stream_command  # noqa: E402
+
+
+def test_line_buffer_splits_chunks():
+    lines = []
+    buf = LineBuffer(lines.append)
+    for chunk in (b"one\ntw", b"o\r\nthree\rfo", "ü".encode()[:1], "ü".encode()[1:], b"r"):
+        buf.feed(chunk)
+    buf.close()
+    assert lines == ["one", "two", "three", "foür"]
+
+
+def test_line_buffer_caps_partial_line(monkeypatch):
+    monkeypatch.setattr(runner, "MAX_LINE", 10)
+    lines = []
+    buf = LineBuffer(lines.append)
+    buf.feed(b"x" * 25)
+    assert lines == ["x" * 25]
+    buf.close()
+    assert lines == ["x" * 25]
+
+
+def test_stream_command_keeps_stderr_tail():
+    code = (
+        "import sys\n"
+        "for i in range(1000): print('err', i, file=sys.stderr)\n"
+        "print('out')\n"
+        "sys.exit(2)\n"
+    )
+    out, err = [], []
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        stream_command(
+            [sys.executable, "-c", code], on_line=out.append, on_stderr=err.append, tail_lines=5
+        )
+    assert out == ["out"]
+    assert len(err) == 1000
+    assert info.value.stderr.splitlines() == [f"err {i}" for i in range(995, 1000)]
+
+
+def test_stream_command_large_output_without_reader():
+    code = "import sys; sys.stdout.write('y' * 5_000_000); sys.stderr.write('z' * 500_000)"
+    res = stream_command([sys.executable, "-c", code], tail_lines=2)
+    assert res.returncode == 0
+    assert res.stdout == ""
+    assert len(res.stderr) <= 2 * (runner.MAX_LINE + runner.READ_SIZE)
+
+
+def test_stream_command_on_start():
+    started = []
+    stream_command([sys.executable, "-c", "pass"], on_start=started.append)
+    assert isinstance(started[0], subprocess.Popen)
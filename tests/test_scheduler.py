@@ -0,0 +1,184 @@
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import scheduler  # noqa: E402
+from core.config import AppConfig  # noqa: E402
+from core.engine import Job, ProcessingEngine  # noqa: E402
+from core.scheduler import (  # noqa: E402
+    CostModel,
+    DeviceScheduler,
+    FifoScheduler,
+    device_of,
+)
+
+
+def _fake_devices(monkeypatch):
+    # /hdd/... lives on device 1, /nvme/... on device 2
+    monkeypatch.setattr(
+        scheduler, "device_of", lambda p: {"hdd": 1, "nvme": 2}.get(Path(p).parts[1])
+    )
+
+
+def _jobs(*paths):
+    return [Job(Path(p), []) for p in paths]
+
+
+def test_device_of_uses_existing_parent(tmp_path):
+    assert device_of(tmp_path / "missing" / "file") == os.stat(tmp_path).st_dev
+
+
+def test_fifo_skips_paused():
+    sched = FifoScheduler()
+    a, b = _jobs("/a", "/b")
+    a.paused = True
+    sched.append(a)
+    sched.append(b)
+    assert sched.pick() is b
+    assert sched.pick() is None
+    assert len(sched) == 1 and a in sched
+
+
+def test_interleaves_devices_and_caps_each(monkeypatch):
+    _fake_devices(monkeypatch)
+    sched = DeviceScheduler(per_device=1)
+    jobs = _jobs("/hdd/1", "/hdd/2", "/hdd/3", "/nvme/1", "/nvme/2")
+    for job in jobs:
+        sched.append(job)
+
+    first = sched.pick()
+    sched.started(first)
+    second = sched.pick()
+    sched.started(second)
+    assert [first.source, second.source] == [Path("/hdd/1"), Path("/nvme/1")]
+    # Both devices are busy
+    assert sched.pick() is None
+    sched.finished(first)
+    third = sched.pick()
+    assert third.source == Path("/hdd/2")
+    assert sched.load() == {2: 1}
+
+
+def test_per_device_limits_and_output_device(monkeypatch):
+    _fake_devices(monkeypatch)
+    sched = DeviceScheduler(per_device=1, limits={"/nvme": 2}, output_dir="/nvme/out")
+    a, b, c = _jobs("/nvme/1", "/nvme/2", "/hdd/1")
+    assert sched.devices(a) == (2,)
+    assert sched.devices(c) == (1, 2)
+    for job in (a, b, c):
+        sched.append(job)
+    picked = []
+    while (job := sched.pick()) is not None:
+        sched.started(job)
+        picked.append(job)
+    # Device pairs are served round-robin; the hdd job also writes to the
+    # nvme device, which is then full
+    assert picked == [a, c]
+    assert sched.load() == {1: 1, 2: 2}
+    sched.remove(b)
+    assert len(sched) == 0
+
+
+def test_engine_runs_devices_in_parallel(monkeypatch):
+    _fake_devices(monkeypatch)
+    running = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def execute(job):
+        dev = job.source.parts[1]
+        with lock:
+            running[dev] = running.get(dev, 0) + 1
+            peak[dev] = max(peak.get(dev, 0), running[dev])
+        time.sleep(0.02)
+        with lock:
+            running[dev] -= 1
+
+    eng = ProcessingEngine(execute, max_workers=8, scheduler=DeviceScheduler(per_device=2))
+    eng.submit(_jobs(*[f"/hdd/{i}" for i in range(6)], *[f"/nvme/{i}" for i in range(6)]))
+    assert eng.wait(5)
+    eng.shutdown()
+    assert peak == {"hdd": 2, "nvme": 2}
+
+
+def _sized_jobs(tmp_path, sizes):
+    jobs = []
+    for i, size in enumerate(sizes):
+        path = tmp_path / f"{i}.mkv"
+        path.write_bytes(b"\0" * size)
+        jobs.append(Job(path, []))
+    return jobs
+
+
+def _drain(sched):
+    picked = []
+    while (job := sched.pick()) is not None:
+        picked.append(job)
+    return picked
+
+
+def test_size_orders(tmp_path):
+    jobs = _sized_jobs(tmp_path, [30, 10, 50, 20, 40])
+    s10, s20, s30, s40, s50 = sorted(jobs, key=lambda j: j.source.stat().st_size)
+    expected = {
+        "fifo": jobs,
+        "largest": [s50, s40, s30, s20, s10],
+        "smallest": [s10, s20, s30, s40, s50],
+        "mixed": [s50, s10, s40, s20, s30],
+    }
+    for order, want in expected.items():
+        for sched in (FifoScheduler(order), DeviceScheduler(per_device=9, order=order)):
+            for job in jobs:
+                sched.append(job)
+            assert _drain(sched) == want, (order, type(sched).__name__)
+
+
+def test_largest_first_across_devices(monkeypatch):
+    _fake_devices(monkeypatch)
+    monkeypatch.setattr(scheduler, "source_size", lambda job: int(job.source.name))
+    sched = DeviceScheduler(per_device=1, order="largest")
+    jobs = _jobs("/hdd/5", "/hdd/1", "/nvme/9", "/nvme/3")
+    for job in jobs:
+        sched.append(job)
+    first = sched.pick()
+    sched.started(first)
+    second = sched.pick()
+    assert [first.source.name, second.source.name] == ["9", "5"]
+
+
+def test_cost_model_weights_backends(tmp_path):
+    costs = CostModel(tmp_path / "costs.json")
+    fast, slow = _jobs("/a", "/b")
+    fast.config = AppConfig(backend="native")
+    slow.config = AppConfig(backend="ffmpeg")
+    fast.method, slow.method = "native", "remux"
+    costs.record(fast, 1000, 1.0)
+    costs.record(slow, 1000, 10.0)
+    flags = Job(Path("/c"), [], config=AppConfig(backend="native"), method="flags")
+    costs.record(flags, 1000, 100.0)  # size does not matter for flag edits
+    assert costs.estimate(slow, 100) > costs.estimate(fast, 500)
+    assert costs.rate("mkvtoolnix") == costs.rate("")  # average of known ones
+    costs.save()
+    assert CostModel(tmp_path / "costs.json").rates == costs.rates
+
+    # A slow backend makes the smaller file the longer job
+    sched = FifoScheduler("largest", costs)
+    sched._sizes.update({fast.id: 500, slow.id: 100})
+    sched.append(fast)
+    sched.append(slow)
+    assert sched.pick() is slow
+
+
+def test_finished_jobs_teach_costs(tmp_path):
+    (job,) = _sized_jobs(tmp_path, [1000])
+    job.config = AppConfig(backend="ffmpeg")
+    sched = FifoScheduler("largest")
+    sched.append(job)
+    assert sched.pick() is job
+    job.state, job.method, job.started, job.finished = "done", "remux", 10.0, 12.0
+    sched.finished(job)
+    assert sched.costs.rates == {"ffmpeg": 2.0 / 1000}
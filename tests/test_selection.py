@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.selection import TrackSpec, apply_spec, parse_spec  # noqa: E402
+from core.tracks import Track  # noqa: E402
+
+
+def _tracks():
+    def t(tid, type_, lang, **kw):
+        return Track(idx=tid, tid=tid, type=type_, codec="x", language=lang, forced=False, name="", **kw)
+
+    return [
+        t(0, "video", "und"),
+        t(1, "audio", "eng", default_audio=True),
+        t(2, "audio", "jpn"),
+        t(3, "subtitles", "eng", default_subtitle=True),
+        t(4, "subtitles", "ger"),
+    ]
+
+
+def test_parse_spec():
+    spec = parse_spec("audio=jpn,ENG; subs=eng default-audio=jpn forced=eng")
+    assert spec == TrackSpec(("jpn", "eng"), ("eng",), "jpn", None, ("eng",))
+    assert parse_spec(str(spec)) == spec
+    assert parse_spec("") == TrackSpec()
+    with pytest.raises(ValueError):
+        parse_spec("video=eng")
+    with pytest.raises(ValueError):
+        parse_spec("audio")
+
+
+def test_apply_spec():
+    tracks = apply_spec(_tracks(), parse_spec("audio=jpn;subs=eng;default-audio=jpn;forced=eng"))
+    assert [t.removed for t in tracks] == [False, True, False, False, True]
+    assert [t.default_audio for t in tracks[1:3]] == [False, True]
+    assert tracks[3].forced and tracks[3].default_subtitle
+
+
+def test_apply_spec_keeps_unmatched_audio_and_untouched_flags():
+    tracks = apply_spec(_tracks(), parse_spec("audio=fre;subs=none;default-audio=fre"))
+    assert [t.removed for t in tracks] == [False, False, False, True, True]
+    # No French track: the existing default stays
+    assert tracks[1].default_audio
+    assert apply_spec(_tracks(), TrackSpec()) == _tracks()
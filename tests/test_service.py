@@ -0,0 +1,125 @@
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import service  # noqa: E402
+from core.config import AppConfig  # noqa: E402
+from core.engine import CANCELLED, DONE, QUEUED, RUNNING, Job  # noqa: E402
+from core.jobstore import JobStore  # noqa: E402
+from core.matroska import read_layout  # noqa: E402
+
+TRACKS = [
+    {"type": "video"},
+    {"type": "audio", "language": "eng"},
+    {"type": "audio", "language": "jpn"},
+    {"type": "subtitles", "language": "eng"},
+]
+
+
+@pytest.fixture
+def serve(tmp_path):
+    running = []
+
+    def start(cfg, roots=()):
+        svc = service.JobService(JobStore(tmp_path / "queue.sqlite3"), cfg, roots)
+        svc.start()
+        server = service.make_server(svc, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        running.append((server, svc))
+        return service.ServiceClient(f"http://127.0.0.1:{server.server_address[1]}", timeout=10)
+
+    yield start
+    for server, svc in running:
+        server.shutdown()
+        server.server_close()
+        svc.close()
+
+
+def _native():
+    cfg = AppConfig()
+    cfg.backend = "native"
+    cfg.noop_policy = "remux"
+    return cfg
+
+
+def test_jobs_run_and_report(make_mkv, tmp_path, serve):
+    a = make_mkv(TRACKS, "a.mkv")
+    b = make_mkv(TRACKS, "b.mkv")
+    client = serve(_native(), [tmp_path])
+    ids = client.submit([a, {"source": str(b), "tracks": "subs=none"}], tracks="audio=jpn")
+    jobs = [client.wait(i) for i in ids]
+    assert [j["state"] for j in jobs] == [DONE, DONE]
+    assert jobs[0]["percent"] == 100 and jobs[0]["method"] == "native"
+    layouts = [read_layout(j["destination"]).entries for j in jobs]
+    assert [(e.type, e.language) for e in layouts[0][1:]] == [("audio", "jpn"), ("subtitles", "eng")]
+    assert [(e.type, e.language) for e in layouts[1][1:]] == [("audio", "eng"), ("audio", "jpn")]
+    assert client.status() == {DONE: 2}
+    assert [j["id"] for j in client.jobs(DONE)] == ids
+
+    with pytest.raises(service.ServiceError) as err:
+        client.submit(["relative.mkv"])
+    assert err.value.status == 400
+    with pytest.raises(service.ServiceError) as err:
+        client.submit(["/elsewhere/c.mkv"])
+    assert "outside" in str(err.value)
+    with pytest.raises(service.ServiceError) as err:
+        client.job(999)
+    assert err.value.status == 404
+
+
+def test_cancel_running_job(make_mkv, tmp_path, serve):
+    src = make_mkv(TRACKS)
+    script = tmp_path / "fake-ffmpeg"
+    script.write_text(
+        f"#!{sys.executable}\nimport sys, time\n"
+        "open(sys.argv[-1], 'wb').write(b'x'); time.sleep(30)\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    cfg = AppConfig()
+    cfg.probe_backend = "native"
+    cfg.inplace_flags = False
+    cfg.noop_policy = "remux"
+    cfg.ffmpeg_cmd = str(script)
+    client = serve(cfg)
+    [job_id] = client.submit([src], tracks="subs=none")
+    out = tmp_path / "cleaned" / src.name
+    deadline = time.monotonic() + 10
+    while not out.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert client.job(job_id)["state"] in (QUEUED, RUNNING)
+    client.cancel(job_id)
+    assert client.wait(job_id)["state"] == CANCELLED
+    assert not out.exists()
+
+
+def test_interrupted_jobs_are_requeued(tmp_path):
+    store = JobStore(tmp_path / "queue.sqlite3")
+    first, second = store.add([("/m/a.mkv", "audio=jpn", False), ("/m/b.mkv", "", True)])
+    job = Job("/m/a.mkv", [], id=first)
+    job.state = RUNNING
+    job.started = time.time()
+    store.update(job)
+    assert store.counts() == {QUEUED: 1, RUNNING: 1}
+    assert JobStore(store.path).requeue_interrupted() == 1
+    assert [j["state"] for j in store.jobs()] == [QUEUED, QUEUED]
+    assert store.get(second)["wipe_all"] and store.get(first)["tracks"] == "audio=jpn"
+    assert store.set_state(second, CANCELLED) and not store.set_state(second, QUEUED)
+
+
+def test_parse_submission():
+    items = service.parse_submission(b'"/m/a.mkv"\n{"source": "/m/b.mkv", "wipe_all": true}\n')
+    assert [(str(p), str(s), w) for p, s, w in items] == [
+        ("/m/a.mkv", "", False),
+        ("/m/b.mkv", "", True),
+    ]
+    items = service.parse_submission(b'{"jobs": ["/m/a.mkv"], "tracks": "audio=jpn"}')
+    assert str(items[0][1]) == "audio=jpn"
+    for body in (b"", b'{"jobs": "x"}', b'{"source": 1}', b'{"jobs": [], "tracks": "bad"}'):
+        with pytest.raises(ValueError):
+            service.parse_submission(body)
@@ -1,5 +1,8 @@
+from dataclasses import asdict
 from pathlib import Path
+import copy
 import os
+import pickle
 import sys
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -433,3 +436,52 @@ def test_build_cmd_wipe_all_keep_one_mkvmerge(defaults):
     ]
 
     assert cmd == expected
+
+
+def test_build_cmd_progress_flags(defaults):
+    src = Path("in.mkv")
+    dst = Path("out.mkv")
+    tracks = [Track(idx=0, tid=1, type="audio", codec="aac", language="eng", forced=False, name="")]
+    defaults.backend = "mkvtoolnix"
+    plain = build_cmd(src, dst, tracks, defaults)
+    cmd = build_cmd(src, dst, tracks, defaults, progress=True)
+    assert cmd == [plain[0], "--gui-mode"] + plain[1:]
+
+    defaults.backend = "ffmpeg"
+    plain = build_cmd(src, dst, tracks, defaults)
+    cmd = build_cmd(src, dst, tracks, defaults, progress=True)
+    assert cmd == [plain[0], "-progress", "pipe:1", "-nostats"] + plain[1:]
+
+
+def _probed(name):
+    # Decoding makes new string objects, like the probe parsers do
+    text = [s.encode().decode() for s in ("audio", "A_AAC", "eng", name)]
+    return Track(0, 2, *text[:3], False, text[3])
+
+
+def test_track_copies_are_independent():
+    tracks = [_probed("English"), _probed("Commentary")]
+    copies = copy.deepcopy(tracks)
+    assert copies == tracks
+    assert all(c is not t for c, t in zip(copies, tracks))
+    copies[0].removed = True
+    copies[1].default_audio = True
+    assert not tracks[0].removed and not tracks[1].default_audio
+    assert copy.copy(tracks[0]) == tracks[0]
+
+
+def test_track_round_trips_through_dict_and_pickle():
+    track = _probed("English")
+    track.default_audio = track.orig_default_audio = True
+    assert Track(**asdict(track)) == track
+    restored = pickle.loads(pickle.dumps(track))
+    assert restored == track
+    assert restored.language is sys.intern("eng")
+
+
+def test_track_strings_are_interned():
+    first, second = _probed("English"), _probed("English")
+    assert first.type is second.type
+    assert first.codec is second.codec
+    assert first.language is second.language
+    assert first.name is second.name
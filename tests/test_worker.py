@@ -0,0 +1,120 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.config import AppConfig  # noqa: E402
+from core.engine import CANCELLED, DONE, FAILED, QUEUED, RUNNING, Job  # noqa: E402
+from core.matroska import read_layout  # noqa: E402
+from core.worker import Worker, main, open_queue  # noqa: E402
+
+ROOT = Path(__file__).resolve().parents[1]
+TRACKS = [
+    {"type": "video"},
+    {"type": "audio", "language": "eng"},
+    {"type": "audio", "language": "jpn"},
+    {"type": "subtitles", "language": "eng"},
+]
+
+
+def test_workers_share_a_queue(make_mkv, tmp_path, capsys):
+    (tmp_path / "media").mkdir()
+    for i in range(6):
+        make_mkv(TRACKS, f"media/{i}.mkv")
+    queue = tmp_path / "media" / "queue.sqlite3"
+    args = ["--queue", str(queue), "--no-journal", "--backend", "native", "--jobs", "1"]
+    assert main(args + ["--add-only", "--tracks", "audio=jpn", str(tmp_path / "media")]) == 0
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "core.worker", *args, "--name", f"w{i}", "--exit-when-idle"],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for i in range(3)
+    ]
+    summaries = [json.loads(p.communicate(timeout=60)[0]) for p in procs]
+    assert [p.returncode for p in procs] == [0, 0, 0]
+    assert sum(s["summary"][DONE] for s in summaries) == 6
+
+    store = open_queue(queue)
+    jobs = store.jobs()
+    assert {j["state"] for j in jobs} == {DONE} and {j["attempts"] for j in jobs} == {1}
+    assert {j["worker"] for j in jobs} <= {"w0", "w1", "w2"}
+    # paths next to the queue are stored relative to it
+    assert sorted(j["source"] for j in jobs) == [f"{i}.mkv" for i in range(6)]
+    out = store.resolve(jobs[0]["destination"])
+    assert [(e.type, e.language) for e in read_layout(out).entries[1:]] == [
+        ("audio", "jpn"),
+        ("subtitles", "eng"),
+    ]
+    capsys.readouterr()
+    assert main(["--queue", str(queue), "--status"]) == 0
+    *lines, summary = capsys.readouterr().out.splitlines()
+    assert len(lines) == 6 and json.loads(summary) == {"summary": {DONE: 6}}
+
+
+def test_expired_leases_are_taken_over(tmp_path):
+    store = open_queue(tmp_path / "queue.sqlite3")
+    [job_id] = store.add([(tmp_path / "a.mkv", "", False)])
+    assert store.claim("dead", lease=0.01)["worker"] == "dead"
+    assert store.claim("alive", lease=60) is None
+    time.sleep(0.05)
+    row = store.claim("alive", lease=60)
+    assert row["id"] == job_id and row["attempts"] == 2
+
+    # the dead worker cannot renew or record the job any more
+    job = Job(tmp_path / "a.mkv", [], id=job_id)
+    assert not store.renew(job, "dead", 60)
+    job.state = DONE
+    assert not store.update(job, "dead")
+    assert store.renew(job, "alive", 0.01)
+    time.sleep(0.05)
+    assert store.claim("third", lease=60, max_attempts=2) is None
+    assert store.get(job_id)["state"] == FAILED
+
+
+def test_stopped_worker_releases_its_jobs(make_mkv, tmp_path, monkeypatch):
+    store = open_queue(tmp_path / "queue.sqlite3")
+    store.add([(make_mkv(TRACKS, f"{i}.mkv"), "", False) for i in range(3)])
+    cfg = AppConfig()
+    cfg.backend = "native"
+    cfg.max_workers = 2
+    worker = Worker(store, cfg, "w")
+
+    def execute(job):
+        worker.stop()
+        while not job.cancel_requested:
+            time.sleep(0.01)
+        raise RuntimeError("cancelled")
+
+    monkeypatch.setattr(worker, "_run", execute)
+    assert worker.run() == {DONE: 0, FAILED: 0, CANCELLED: 0}
+    states = [j["state"] for j in store.jobs()]
+    assert states == [QUEUED, QUEUED, QUEUED] and RUNNING not in states
+
+
+def test_worker_claims_only_jobs_it_can_start(make_mkv, tmp_path, monkeypatch):
+    store = open_queue(tmp_path / "queue.sqlite3")
+    store.add([(make_mkv(TRACKS, f"{i}.mkv"), "", False) for i in range(5)])
+    cfg = AppConfig()
+    cfg.backend = "native"
+    cfg.max_workers = 4
+    cfg.device_workers = 1  # every file is on the same device
+    worker = Worker(store, cfg, "w")
+    leased = []
+
+    def execute(job):
+        time.sleep(0.3)  # leave the worker time to claim more
+        leased.append(sum(j["state"] == RUNNING for j in store.jobs()))
+        if len(leased) >= 2:
+            worker.stop()
+
+    monkeypatch.setattr(worker, "_run", execute)
+    worker.run(poll=0.05)
+    # one job runs and one waits for the device; the others stay claimable
+    assert set(leased) == {2}